@@ -9,6 +9,7 @@ visible, with the background removed.
 """
 
 import asyncio
+import io
 import os
 import shutil
 import tempfile
@@ -19,27 +20,84 @@ from typing import Optional
 
 import torch
 from fastapi import BackgroundTasks, FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
+from PIL import Image
 
 from api.models.schemas import (
     BackgroundMode,
+    BatchingMetricsResponse,
     HealthCheckResponse,
+    ImageSegmentationResponse,
     OutputFormat,
     SegmentationProgressResponse,
     VideoSegmentationRequest,
     VideoSegmentationResponse,
 )
+from api.services.batch_scheduler import BatchQueueFullError, DynamicBatcher
+from api.services.image_service import sam3_image_service
 from api.services.sam3_service import sam3_service
+from api.services.task_queue import TaskQueue, TaskQueueFullError
 
 
-# Store for tracking async tasks
-task_store: dict = {}
-
 # Output directory for processed videos
 OUTPUT_DIR = Path("outputs")
 
+# Number of tasks allowed to wait for a worker before new ones get HTTP 429
+MAX_PENDING_TASKS = int(os.environ.get("SAM3_API_MAX_PENDING_TASKS", "8"))
+
+# Seconds after which the records of finished tasks are forgotten
+TASK_TTL_SECONDS = float(os.environ.get("SAM3_API_TASK_TTL_SECONDS", "3600"))
+
+# SAM3 holds a single model on the GPU, so segmentation jobs run one at a time
+NUM_TASK_WORKERS = 1
+
+# Retry-After hint (seconds) sent along with HTTP 429
+QUEUE_FULL_RETRY_AFTER_SECONDS = 30
+
+# Comma-separated text prompts whose embeddings are computed at startup
+WARM_TEXT_PROMPTS = [
+    prompt.strip()
+    for prompt in os.environ.get("SAM3_API_WARM_PROMPTS", "dog").split(",")
+    if prompt.strip()
+]
+
+# Chunk size used when saving uploads to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Set to 1 to load the SAM3 image model at startup and serve /segment/image
+# (it is a second model on the GPU, next to the video one)
+IMAGE_SEGMENTATION_ENABLED = (
+    os.environ.get("SAM3_API_ENABLE_IMAGE_SEGMENTATION", "0") == "1"
+)
+
+# Image requests are batched until this many images are queued...
+IMAGE_MAX_BATCH_SIZE = int(os.environ.get("SAM3_API_IMAGE_MAX_BATCH_SIZE", "8"))
+
+# ...or the oldest queued request has waited this long (milliseconds)
+IMAGE_MAX_WAIT_MS = float(os.environ.get("SAM3_API_IMAGE_MAX_WAIT_MS", "10"))
+
+# Number of image requests allowed to wait for a batch before new ones get HTTP 429
+IMAGE_MAX_QUEUE_SIZE = int(os.environ.get("SAM3_API_IMAGE_MAX_QUEUE_SIZE", "64"))
+
+# Queue running segmentation jobs off the event loop
+task_queue = TaskQueue(
+    max_pending=MAX_PENDING_TASKS,
+    max_workers=NUM_TASK_WORKERS,
+    finished_ttl_seconds=TASK_TTL_SECONDS,
+)
+
+# Micro-batching scheduler for image segmentation requests
+image_batcher = DynamicBatcher(
+    sam3_image_service.segment_image_batch,
+    max_batch_size=IMAGE_MAX_BATCH_SIZE,
+    max_wait_ms=IMAGE_MAX_WAIT_MS,
+    max_queue_size=IMAGE_MAX_QUEUE_SIZE,
+    name="sam3-image-batcher",
+)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -59,14 +117,27 @@ async def lifespan(app: FastAPI):
     try:
         sam3_service.load_model()
         print("SAM3 model loaded successfully!")
+        if WARM_TEXT_PROMPTS:
+            sam3_service.warm_text_cache(WARM_TEXT_PROMPTS)
+            print(f"Text embeddings cached for prompts: {WARM_TEXT_PROMPTS}")
     except Exception as e:
         print(f"Warning: Failed to load SAM3 model on startup: {e}")
         print("Model will be loaded on first request.")
     
+    # Load the SAM3 image model (not lazily, so that the batcher thread never blocks on it)
+    if IMAGE_SEGMENTATION_ENABLED:
+        try:
+            sam3_image_service.load_model()
+        except Exception as e:
+            print(f"Warning: Failed to load SAM3 image model on startup: {e}")
+            print("Image segmentation requests will be rejected.")
+    
     yield
     
     # Shutdown
     print("Shutting down SAM3 service...")
+    task_queue.shutdown(wait=True)
+    image_batcher.shutdown(wait=True)
     sam3_service.shutdown()
     print("Cleanup complete.")
 
@@ -88,7 +159,8 @@ app = FastAPI(
     ### Example Usage:
     1. Upload a video with a dog
     2. Set prompt to "dog"
-    3. Get back a video with only the dog visible
+    3. Poll `/tasks/{task_id}` until the task is completed
+    4. Get back a video with only the dog visible
     """,
     version="1.0.0",
     lifespan=lifespan,
@@ -127,6 +199,7 @@ async def health_check():
     Returns GPU availability, model loading status, and CUDA information.
     """
     gpu_info = sam3_service.get_gpu_info()
+    queue_stats = task_queue.get_stats()
     
     return HealthCheckResponse(
         status="healthy" if sam3_service.is_loaded else "model_not_loaded",
@@ -134,10 +207,17 @@ async def health_check():
         model_loaded=sam3_service.is_loaded,
         cuda_version=gpu_info.get("cuda_version"),
         gpu_name=gpu_info.get("gpu_name"),
+        pending_tasks=queue_stats["pending"],
+        running_tasks=queue_stats["running"],
     )
 
 
-@app.post("/segment/dog", response_model=VideoSegmentationResponse, tags=["Segmentation"])
+@app.post(
+    "/segment/dog",
+    response_model=SegmentationProgressResponse,
+    status_code=202,
+    tags=["Segmentation"],
+)
 async def segment_dog_from_video(
     video: UploadFile = File(..., description="Video file to process"),
     background_mode: BackgroundMode = Form(
@@ -171,10 +251,12 @@ async def segment_dog_from_video(
     - **include_overlay**: Include a visualization video with colored mask overlay
     
     **Returns:**
-    - Processed video with only the dog(s) visible
-    - Optional overlay video for visualization
+    - A task ID to poll with `GET /tasks/{task_id}`; the completed task
+      holds the processed video with only the dog(s) visible and the
+      optional overlay video
+    - HTTP 429 if too many tasks are already queued
     """
-    return await _process_video_segmentation(
+    return await _submit_video_segmentation(
         video=video,
         prompt="dog",
         background_mode=background_mode,
@@ -183,7 +265,12 @@ async def segment_dog_from_video(
     )
 
 
-@app.post("/segment", response_model=VideoSegmentationResponse, tags=["Segmentation"])
+@app.post(
+    "/segment",
+    response_model=SegmentationProgressResponse,
+    status_code=202,
+    tags=["Segmentation"],
+)
 async def segment_from_video(
     video: UploadFile = File(..., description="Video file to process"),
     prompt: str = Form(
@@ -217,9 +304,11 @@ async def segment_from_video(
     - **include_overlay**: Include visualization video
     
     **Returns:**
-    - Processed video with only the specified object(s) visible
+    - A task ID to poll with `GET /tasks/{task_id}`; the completed task
+      holds the processed video with only the specified object(s) visible
+    - HTTP 429 if too many tasks are already queued
     """
-    return await _process_video_segmentation(
+    return await _submit_video_segmentation(
         video=video,
         prompt=prompt,
         background_mode=background_mode,
@@ -228,20 +317,116 @@ async def segment_from_video(
     )
 
 
-async def _process_video_segmentation(
+@app.post(
+    "/segment/image",
+    response_model=ImageSegmentationResponse,
+    tags=["Segmentation"],
+)
+async def segment_image(
+    image: UploadFile = File(..., description="Image file to process"),
+    prompt: str = Form(
+        default="dog",
+        description="Text prompt describing what to segment"
+    ),
+):
+    """
+    Segment objects matching a text prompt in an image.
+    
+    Concurrent requests are batched together (up to `SAM3_API_IMAGE_MAX_BATCH_SIZE`
+    images, waiting at most `SAM3_API_IMAGE_MAX_WAIT_MS` ms for a batch to fill)
+    and run through the model in a single forward pass.
+    
+    Only available when the server is started with `SAM3_API_ENABLE_IMAGE_SEGMENTATION=1`.
+    
+    **Parameters:**
+    - **image**: The input image file (JPEG, PNG, etc.)
+    - **prompt**: Text describing what to segment (e.g., "dog", "person with red shirt")
+    
+    **Returns:**
+    - The boxes, scores and RLE masks of the detected objects
+    - HTTP 429 if too many image requests are already queued
+    - HTTP 503 if image segmentation is disabled or its model failed to load
+    """
+    if not sam3_image_service.is_loaded:
+        raise HTTPException(
+            status_code=503,
+            detail=(
+                "Image segmentation is not available; start the server with "
+                "SAM3_API_ENABLE_IMAGE_SEGMENTATION=1"
+                if not IMAGE_SEGMENTATION_ENABLED
+                else "SAM3 image model failed to load"
+            ),
+        )
+    
+    data = await image.read()
+    try:
+        pil_image = await run_in_threadpool(_decode_image, data)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image file: {str(e)}")
+    
+    try:
+        future = image_batcher.submit((pil_image, prompt))
+    except BatchQueueFullError:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many image requests in flight, please retry later",
+            headers={"Retry-After": "1"},
+        )
+    
+    try:
+        result = await asyncio.wrap_future(future)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing image: {str(e)}"
+        )
+    
+    num_objects = len(result["scores"])
+    return ImageSegmentationResponse(
+        success=num_objects > 0,
+        message=(
+            f"Successfully segmented {num_objects} object(s) matching '{prompt}'"
+            if num_objects > 0
+            else f"No objects matching '{prompt}' detected in the image"
+        ),
+        objects_detected=num_objects,
+        **result,
+    )
+
+
+def _decode_image(data: bytes) -> Image.Image:
+    """Decode uploaded image bytes into an RGB PIL image"""
+    with Image.open(io.BytesIO(data)) as pil_image:
+        return pil_image.convert("RGB")
+
+
+@app.get(
+    "/metrics/batching",
+    response_model=BatchingMetricsResponse,
+    tags=["Health"],
+)
+async def batching_metrics():
+    """
+    Get queue depth and batch size metrics of image segmentation requests.
+    """
+    return BatchingMetricsResponse(**image_batcher.get_stats())
+
+
+async def _submit_video_segmentation(
     video: UploadFile,
     prompt: str,
     background_mode: BackgroundMode,
     output_format: OutputFormat,
     include_overlay: bool,
-) -> VideoSegmentationResponse:
+) -> SegmentationProgressResponse:
     """
-    Internal function to process video segmentation.
+    Internal function to validate and save an upload, then enqueue the
+    segmentation job. Returns as soon as the job is queued.
     """
     # Validate file type
     if not video.filename:
         raise HTTPException(status_code=400, detail="No filename provided")
-    
+
     allowed_extensions = {".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v"}
     file_ext = Path(video.filename).suffix.lower()
     if file_ext not in allowed_extensions:
@@ -249,71 +434,155 @@ async def _process_video_segmentation(
             status_code=400,
             detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
         )
-    
-    # Ensure model is loaded
-    if not sam3_service.is_loaded:
-        try:
-            sam3_service.load_model()
-        except Exception as e:
-            raise HTTPException(
-                status_code=503,
-                detail=f"Failed to load SAM3 model: {str(e)}"
-            )
-    
+
+    # Reject early so we don't spend time saving an upload we can't run
+    if task_queue.is_full:
+        _raise_queue_full()
+
     # Create unique task ID and directories
     task_id = str(uuid.uuid4())
     task_output_dir = OUTPUT_DIR / task_id
     task_output_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Save uploaded video
+
+    # Save uploaded video (file I/O runs off the event loop)
     input_video_path = task_output_dir / f"input{file_ext}"
     try:
-        with open(input_video_path, "wb") as f:
-            content = await video.read()
-            f.write(content)
+        await run_in_threadpool(_save_upload, video, input_video_path)
     except Exception as e:
+        shutil.rmtree(task_output_dir, ignore_errors=True)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to save uploaded video: {str(e)}"
         )
-    
+
+    try:
+        record = task_queue.submit(
+            task_id,
+            _process_video_segmentation,
+            task_id=task_id,
+            input_video_path=str(input_video_path),
+            prompt=prompt,
+            background_mode=background_mode,
+            output_format=output_format,
+            include_overlay=include_overlay,
+        )
+    except TaskQueueFullError:
+        shutil.rmtree(task_output_dir, ignore_errors=True)
+        _raise_queue_full()
+
+    return _build_progress_response(record)
+
+
+def _save_upload(video: UploadFile, path: Path):
+    """Copy an uploaded file to disk in chunks"""
+    video.file.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(video.file, f, UPLOAD_CHUNK_SIZE)
+
+
+def _raise_queue_full():
+    """Reject a request because the task queue is at capacity"""
+    raise HTTPException(
+        status_code=429,
+        detail="Too many segmentation tasks in flight, please retry later",
+        headers={"Retry-After": str(QUEUE_FULL_RETRY_AFTER_SECONDS)},
+    )
+
+
+def _process_video_segmentation(
+    task_id: str,
+    input_video_path: str,
+    prompt: str,
+    background_mode: BackgroundMode,
+    output_format: OutputFormat,
+    include_overlay: bool,
+    progress_callback=None,
+) -> VideoSegmentationResponse:
+    """
+    Internal function to process video segmentation.
+    Runs on a task queue worker thread.
+    """
+    task_output_dir = OUTPUT_DIR / task_id
+
+    # Ensure model is loaded
+    if not sam3_service.is_loaded:
+        if progress_callback:
+            progress_callback("Loading SAM3 model...", 0.0, 0, 0)
+        try:
+            sam3_service.load_model()
+        except Exception as e:
+            shutil.rmtree(task_output_dir, ignore_errors=True)
+            raise RuntimeError(f"Failed to load SAM3 model: {str(e)}")
+
     try:
         # Process video
         result = sam3_service.segment_video(
-            video_path=str(input_video_path),
+            video_path=input_video_path,
             prompt=prompt,
             background_mode=background_mode.value,
             output_dir=str(task_output_dir),
             include_overlay=include_overlay,
+            progress_callback=progress_callback,
         )
-        
-        # Build response
-        output_video_path = None
-        overlay_video_path = None
-        
-        if result["output_video_path"]:
-            output_video_path = f"/outputs/{task_id}/{Path(result['output_video_path']).name}"
-        
-        if result["overlay_video_path"]:
-            overlay_video_path = f"/outputs/{task_id}/{Path(result['overlay_video_path']).name}"
-        
-        return VideoSegmentationResponse(
-            success=result["success"],
-            message=result["message"],
-            output_video_path=output_video_path,
-            overlay_video_path=overlay_video_path,
-            total_frames=result["total_frames"],
-            objects_detected=result["objects_detected"],
-            processing_time_seconds=result["processing_time_seconds"],
-        )
-        
     except Exception as e:
         # Cleanup on error
         shutil.rmtree(task_output_dir, ignore_errors=True)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error processing video: {str(e)}"
-        )
+        raise RuntimeError(f"Error processing video: {str(e)}")
+
+    # Build response
+    output_video_path = None
+    overlay_video_path = None
+
+    if result["output_video_path"]:
+        output_video_path = f"/outputs/{task_id}/{Path(result['output_video_path']).name}"
+
+    if result["overlay_video_path"]:
+        overlay_video_path = f"/outputs/{task_id}/{Path(result['overlay_video_path']).name}"
+
+    return VideoSegmentationResponse(
+        success=result["success"],
+        message=result["message"],
+        output_video_path=output_video_path,
+        overlay_video_path=overlay_video_path,
+        total_frames=result["total_frames"],
+        objects_detected=result["objects_detected"],
+        processing_time_seconds=result["processing_time_seconds"],
+    )
+
+
+def _build_progress_response(record: dict) -> SegmentationProgressResponse:
+    """Convert a task queue record into a progress response"""
+    return SegmentationProgressResponse(
+        task_id=record["task_id"],
+        status=record["status"],
+        progress=record["progress"],
+        current_frame=record["current_frame"],
+        total_frames=record["total_frames"],
+        message=record["message"],
+        result=record["result"],
+    )
+
+
+@app.get(
+    "/tasks/{task_id}",
+    response_model=SegmentationProgressResponse,
+    tags=["Tasks"],
+)
+async def get_task_status(task_id: str):
+    """
+    Get the status and progress of a segmentation task.
+
+    Poll this endpoint after submitting a video to `/segment`. Once `status`
+    is `completed`, `result` holds the segmentation response with the output
+    video paths.
+
+    **Parameters:**
+    - **task_id**: The task ID returned when the video was submitted
+    """
+    record = task_queue.get(task_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return _build_progress_response(record)
 
 
 @app.get("/download/{task_id}/{filename}", tags=["Download"])
@@ -360,7 +629,14 @@ async def cleanup_task(task_id: str):
     """
     task_dir = OUTPUT_DIR / task_id
     
+    try:
+        task_known = task_queue.remove(task_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
     if not task_dir.exists():
+        if task_known:
+            return {"success": True, "message": f"Task {task_id} cleaned up successfully"}
         raise HTTPException(status_code=404, detail="Task not found")
     
     try:
@@ -386,8 +662,10 @@ async def list_tasks():
         for task_dir in OUTPUT_DIR.iterdir():
             if task_dir.is_dir():
                 files = list(task_dir.iterdir())
+                record = task_queue.get(task_dir.name)
                 tasks.append({
                     "task_id": task_dir.name,
+                    "status": record["status"] if record else None,
                     "files": [f.name for f in files],
                     "size_mb": sum(f.stat().st_size for f in files) / (1024 * 1024),
                 })
@@ -5,7 +5,7 @@ Pydantic models for SAM3 Video Segmentation API
 """
 
 from enum import Enum
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -63,14 +63,58 @@ class HealthCheckResponse(BaseModel):
     model_loaded: bool
     cuda_version: Optional[str] = None
     gpu_name: Optional[str] = None
+    pending_tasks: int = 0
+    running_tasks: int = 0
 
 
 class SegmentationProgressResponse(BaseModel):
     """Response model for segmentation progress"""
     task_id: str
-    status: str  # "pending", "processing", "completed", "failed"
+    status: str  # "pending", "processing", "completed", "failed", "cancelled"
     progress: float  # 0.0 to 1.0
     current_frame: int = 0
     total_frames: int = 0
     message: Optional[str] = None
+    result: Optional[VideoSegmentationResponse] = None  # set once completed
 
+
+
+class ImageSegmentationResponse(BaseModel):
+    """Response model for image segmentation"""
+    success: bool
+    message: str
+    prompt: str
+    width: int
+    height: int
+    objects_detected: int = 0
+    boxes: List[List[float]] = Field(
+        default_factory=list,
+        description="Boxes of the detected objects in [x0, y0, x1, y1] pixel coordinates"
+    )
+    scores: List[float] = Field(default_factory=list)
+    masks_rle: List[Dict] = Field(
+        default_factory=list,
+        description="Masks of the detected objects in COCO RLE format"
+    )
+    batch_size: int = Field(
+        default=1,
+        description="Number of requests that were processed together with this one"
+    )
+    processing_time_seconds: float = 0.0
+
+
+class BatchingMetricsResponse(BaseModel):
+    """Response model for image request batching metrics"""
+    queue_depth: int
+    max_queue_size: int
+    max_batch_size: int
+    max_wait_ms: float
+    total_requests: int
+    rejected_requests: int
+    total_batches: int
+    failed_batches: int
+    last_batch_size: int
+    avg_batch_size: float
+    batch_size_histogram: Dict[int, int]
+    avg_queue_wait_ms: float
+    avg_batch_time_ms: float
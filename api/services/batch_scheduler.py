@@ -0,0 +1,188 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
+
+"""
+Dynamic (micro-)batching scheduler for SAM3 API requests
+"""
+
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+
+class BatchQueueFullError(RuntimeError):
+    """Raised when a request is submitted while the batching queue is at capacity"""
+
+
+class DynamicBatcher:
+    """
+    Collects concurrent requests into batches and runs them together.
+
+    A single worker thread waits for the first queued request, then keeps
+    collecting requests until either `max_batch_size` requests are queued or
+    `max_wait_ms` milliseconds have passed since the first one arrived. The
+    whole batch is passed to `batch_fn`, which must return one result per
+    request (in the same order); each result is delivered to the future
+    returned by `submit`.
+
+    Admission control: at most `max_queue_size` requests can wait for a
+    batch. Submitting beyond that raises `BatchQueueFullError`, which the API
+    maps to HTTP 429.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_queue_size: int = 64,
+        name: str = "sam3-batcher",
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be non-negative")
+        if max_queue_size < 1:
+            raise ValueError("max_queue_size must be at least 1")
+
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_size = max_queue_size
+
+        self._cond = threading.Condition()
+        self._queue = deque()  # (item, future, enqueue time)
+        self._shutdown = False
+
+        # metrics
+        self._num_requests = 0
+        self._num_rejected = 0
+        self._num_failed_batches = 0
+        self._batch_size_counts = Counter()
+        self._total_queue_wait = 0.0
+        self._total_batch_time = 0.0
+        self._last_batch_size = 0
+
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests waiting for a batch"""
+        with self._cond:
+            return len(self._queue)
+
+    def submit(self, item: Any) -> Future:
+        """
+        Enqueue a request.
+
+        Args:
+            item: Request passed to `batch_fn` as part of a batch
+
+        Returns:
+            A future holding the result of the request
+
+        Raises:
+            BatchQueueFullError: If the queue is at capacity
+        """
+        future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Batcher has been shut down")
+            if len(self._queue) >= self.max_queue_size:
+                self._num_rejected += 1
+                raise BatchQueueFullError(
+                    f"Batch queue is full ({self.max_queue_size} requests waiting)"
+                )
+            self._queue.append((item, future, time.monotonic()))
+            self._num_requests += 1
+            self._cond.notify()
+        return future
+
+    def _next_batch(self) -> list:
+        """Wait for the next batch of requests (empty on shutdown)"""
+        with self._cond:
+            while not self._queue and not self._shutdown:
+                self._cond.wait()
+            if not self._queue:
+                return []
+
+            # wait for more requests until the batch is full or the oldest one is due
+            deadline = self._queue[0][2] + self.max_wait_ms / 1000.0
+            while len(self._queue) < self.max_batch_size and not self._shutdown:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                self._cond.wait(timeout)
+
+            num_items = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(num_items)]
+
+    def _run(self):
+        """Worker loop that runs batches until shutdown"""
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+
+            # skip requests whose caller is no longer waiting
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            start_time = time.monotonic()
+            try:
+                results = self.batch_fn([item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"batch_fn returned {len(results)} results for {len(batch)} requests"
+                    )
+            except Exception as e:
+                traceback.print_exc()
+                with self._cond:
+                    self._num_failed_batches += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            end_time = time.monotonic()
+
+            with self._cond:
+                self._batch_size_counts[len(batch)] += 1
+                self._last_batch_size = len(batch)
+                self._total_queue_wait += sum(start_time - t for _, _, t in batch)
+                self._total_batch_time += end_time - start_time
+
+    def get_stats(self) -> dict:
+        """Get queue depth and batch size statistics"""
+        with self._cond:
+            num_batches = sum(self._batch_size_counts.values())
+            num_batched = sum(
+                size * count for size, count in self._batch_size_counts.items()
+            )
+            return {
+                "queue_depth": len(self._queue),
+                "max_queue_size": self.max_queue_size,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "total_requests": self._num_requests,
+                "rejected_requests": self._num_rejected,
+                "total_batches": num_batches,
+                "failed_batches": self._num_failed_batches,
+                "last_batch_size": self._last_batch_size,
+                "avg_batch_size": num_batched / max(num_batches, 1),
+                "batch_size_histogram": dict(sorted(self._batch_size_counts.items())),
+                "avg_queue_wait_ms": 1000.0 * self._total_queue_wait / max(num_batched, 1),
+                "avg_batch_time_ms": 1000.0 * self._total_batch_time / max(num_batches, 1),
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting new requests; queued ones are still run"""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            self._worker.join()
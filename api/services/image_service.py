@@ -0,0 +1,120 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
+
+"""
+SAM3 Image Segmentation Service
+"""
+
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import torch
+from PIL import Image
+
+
+class Sam3ImageService:
+    """Service for batched image segmentation using the SAM3 image model"""
+
+    _instance = None
+
+    def __new__(cls):
+        """Singleton pattern to ensure only one model instance"""
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """Initialize the service"""
+        if not hasattr(self, '_initialized'):
+            self._initialized = True
+            self._processor = None
+            self._model_loaded = False
+            self._load_lock = threading.Lock()
+
+    def load_model(self) -> bool:
+        """
+        Load the SAM3 image model.
+
+        Returns:
+            True if model loaded successfully
+        """
+        with self._load_lock:
+            if self._model_loaded:
+                return True
+
+            try:
+                from sam3.model.sam3_image_processor import Sam3Processor
+                from sam3.model_builder import build_sam3_image_model
+
+                if not torch.cuda.is_available():
+                    raise RuntimeError("CUDA is required for SAM3")
+
+                print("Loading SAM3 image model...")
+                model = build_sam3_image_model(device="cuda")
+                self._processor = Sam3Processor(model, device="cuda")
+                self._model_loaded = True
+                print("SAM3 image model loaded successfully!")
+                return True
+
+            except Exception as e:
+                print(f"Error loading SAM3 image model: {e}")
+                self._model_loaded = False
+                raise
+
+    @property
+    def is_loaded(self) -> bool:
+        """Check if model is loaded"""
+        return self._model_loaded
+
+    def segment_image_batch(self, requests: List[Tuple[Image.Image, str]]) -> List[Dict]:
+        """
+        Segment a batch of images, each with its own text prompt.
+
+        All images are run through the backbone together, and each image is
+        grounded with its own prompt in a single forward pass (one query per
+        request).
+
+        The model must have been loaded with `load_model` beforehand.
+
+        Args:
+            requests: List of (RGB image, text prompt) pairs
+
+        Returns:
+            One result dict per request with the detected boxes (xyxy in
+            pixels), scores and COCO RLE masks
+        """
+        from sam3.perflib.rle import robust_rle_encode
+
+        if not self._model_loaded:
+            raise RuntimeError("SAM3 image model is not loaded")
+
+        start_time = time.time()
+        images = [image for image, _ in requests]
+        # each distinct prompt is encoded once, but only grounded on its own images
+        prompts = list(dict.fromkeys(prompt for _, prompt in requests))
+        pairs = [(i, prompts.index(prompt)) for i, (_, prompt) in enumerate(requests)]
+
+        with torch.autocast(device_type="cuda", dtype=torch.bfloat16):
+            state = self._processor.set_image_batch(images)
+            state = self._processor.set_text_prompt_batch(prompts, state, pairs=pairs)
+        processing_time = time.time() - start_time
+
+        results = []
+        for (image, prompt), image_result in zip(requests, state["batch_results"]):
+            masks = image_result["masks"].squeeze(1)
+            results.append({
+                "prompt": prompt,
+                "width": image.width,
+                "height": image.height,
+                "boxes": image_result["boxes"].float().cpu().tolist(),
+                "scores": image_result["scores"].float().cpu().tolist(),
+                "masks_rle": robust_rle_encode(masks) if len(masks) > 0 else [],
+                "batch_size": len(requests),
+                "processing_time_seconds": processing_time,
+            })
+
+        return results
+
+
+# Global service instance
+sam3_image_service = Sam3ImageService()
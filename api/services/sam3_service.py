@@ -6,7 +6,6 @@ SAM3 Video Segmentation Service
 
 import gc
 import os
-import shutil
 import tempfile
 import time
 from typing import Dict, List, Optional, Tuple
@@ -16,11 +15,9 @@ import numpy as np
 import torch
 
 from api.utils.video_utils import (
+    VideoFrameWriter,
     apply_mask_to_frame,
     combine_masks,
-    create_video_from_frames,
-    create_video_with_alpha,
-    extract_frames_from_video,
     load_video_frames,
 )
 
@@ -97,6 +94,24 @@ class Sam3VideoService:
         
         return info
     
+    def warm_text_cache(self, prompts: List[str]) -> dict:
+        """
+        Pre-compute the text embeddings of common prompts so that requests using
+        them skip the text encoder.
+        
+        Args:
+            prompts: Text prompts to encode
+            
+        Returns:
+            Text embedding cache statistics
+        """
+        if not self._model_loaded:
+            self.load_model()
+        
+        return self._predictor.handle_request(
+            request=dict(type="warm_text_cache", prompts=prompts)
+        )
+    
     def segment_video(
         self,
         video_path: str,
@@ -130,187 +145,218 @@ class Sam3VideoService:
             output_dir = tempfile.mkdtemp(prefix="sam3_output_")
         os.makedirs(output_dir, exist_ok=True)
         
-        # Create temp directory for extracted frames
-        temp_frames_dir = tempfile.mkdtemp(prefix="sam3_frames_")
+        # Decode the video once; the same RGB frames feed SAM3 and the compositing
+        if progress_callback:
+            progress_callback("Decoding video frames...", 0.0, 0, 0)
         
-        try:
-            # Extract frames from video
-            if progress_callback:
-                progress_callback("Extracting video frames...", 0.0, 0, 0)
-            
-            frame_paths, fps, (width, height) = extract_frames_from_video(
-                video_path, temp_frames_dir
+        video_frames, fps = load_video_frames(video_path)
+        total_frames = len(video_frames)
+        
+        if progress_callback:
+            progress_callback("Starting SAM3 session...", 0.05, 0, total_frames)
+        
+        # Start SAM3 session directly on the decoded frames
+        response = self._predictor.handle_request(
+            request=dict(
+                type="start_session",
+                resource_path=video_frames,
             )
-            total_frames = len(frame_paths)
-            
+        )
+        session_id = response["session_id"]
+        
+        output_writer = None
+        overlay_writer = None
+        try:
+            # Add text prompt on first frame
             if progress_callback:
-                progress_callback("Starting SAM3 session...", 0.05, 0, total_frames)
+                progress_callback(f"Adding prompt: '{prompt}'...", 0.1, 0, total_frames)
             
-            # Start SAM3 session
             response = self._predictor.handle_request(
                 request=dict(
-                    type="start_session",
-                    resource_path=temp_frames_dir,
+                    type="add_prompt",
+                    session_id=session_id,
+                    frame_index=0,
+                    text=prompt,
                 )
             )
-            session_id = response["session_id"]
             
-            try:
-                # Add text prompt on first frame
-                if progress_callback:
-                    progress_callback(f"Adding prompt: '{prompt}'...", 0.1, 0, total_frames)
-                
-                response = self._predictor.handle_request(
-                    request=dict(
-                        type="add_prompt",
-                        session_id=session_id,
-                        frame_index=0,
-                        text=prompt,
-                    )
+            initial_output = response["outputs"]
+            objects_detected = len(initial_output.get("out_obj_ids", []))
+            
+            if objects_detected == 0:
+                return {
+                    "success": False,
+                    "message": f"No objects matching '{prompt}' detected in the video",
+                    "output_video_path": None,
+                    "overlay_video_path": None,
+                    "total_frames": total_frames,
+                    "objects_detected": 0,
+                    "processing_time_seconds": time.time() - start_time,
+                }
+            
+            # Open the output video(s); frames are encoded as soon as they are ready
+            has_alpha = background_mode == "transparent"
+            output_ext = ".webm" if has_alpha else ".mp4"
+            output_video_path = os.path.join(output_dir, f"segmented{output_ext}")
+            output_writer = VideoFrameWriter(output_video_path, fps, has_alpha=has_alpha)
+            
+            overlay_video_path = None
+            if include_overlay:
+                overlay_video_path = os.path.join(output_dir, "overlay.mp4")
+                overlay_writer = VideoFrameWriter(overlay_video_path, fps)
+            
+            # Propagate through video, compositing and encoding each frame as it
+            # is yielded instead of collecting all outputs first
+            if progress_callback:
+                progress_callback("Propagating segmentation...", 0.15, 0, total_frames)
+            
+            # Outputs are normally yielded in frame order; this only holds frames
+            # that arrive ahead of the next frame to write
+            pending_outputs = {}
+            next_frame_idx = 0
+            for response in self._predictor.handle_stream_request(
+                request=dict(
+                    type="propagate_in_video",
+                    session_id=session_id,
+                    propagation_direction="forward",
+                    start_frame_index=0,
                 )
-                
-                initial_output = response["outputs"]
-                objects_detected = len(initial_output.get("out_obj_ids", []))
-                
-                if objects_detected == 0:
-                    return {
-                        "success": False,
-                        "message": f"No objects matching '{prompt}' detected in the video",
-                        "output_video_path": None,
-                        "overlay_video_path": None,
-                        "total_frames": total_frames,
-                        "objects_detected": 0,
-                        "processing_time_seconds": time.time() - start_time,
-                    }
-                
-                # Propagate through video
-                if progress_callback:
-                    progress_callback("Propagating segmentation...", 0.15, 0, total_frames)
-                
-                outputs_per_frame = {}
-                for response in self._predictor.handle_stream_request(
-                    request=dict(
-                        type="propagate_in_video",
-                        session_id=session_id,
+            ):
+                pending_outputs[response["frame_index"]] = response["outputs"]
+                while next_frame_idx in pending_outputs:
+                    self._write_output_frame(
+                        video_frames,
+                        next_frame_idx,
+                        pending_outputs.pop(next_frame_idx),
+                        background_mode,
+                        output_writer,
+                        overlay_writer,
                     )
-                ):
-                    frame_idx = response["frame_index"]
-                    outputs_per_frame[frame_idx] = response["outputs"]
+                    next_frame_idx += 1
                     
                     if progress_callback:
-                        progress = 0.15 + (0.6 * (frame_idx + 1) / total_frames)
+                        progress = 0.15 + (0.8 * next_frame_idx / total_frames)
                         progress_callback(
-                            f"Processing frame {frame_idx + 1}/{total_frames}",
+                            f"Processing frame {next_frame_idx}/{total_frames}",
                             progress,
-                            frame_idx + 1,
+                            next_frame_idx,
                             total_frames
                         )
-                
-                # Process frames with masks
-                if progress_callback:
-                    progress_callback("Applying masks to frames...", 0.75, 0, total_frames)
-                
-                processed_frames = []
-                overlay_frames = []
-                
-                # Load original video frames
-                video_frames, _ = load_video_frames(video_path)
-                
-                for frame_idx in sorted(outputs_per_frame.keys()):
-                    frame = video_frames[frame_idx]
-                    output = outputs_per_frame[frame_idx]
-                    
-                    # Get all masks for this frame
-                    masks = output.get("out_binary_masks", [])
-                    
-                    if len(masks) > 0:
-                        # Combine all detected object masks
-                        combined_mask = combine_masks(list(masks))
-                        
-                        # Apply mask to remove background
-                        processed_frame = apply_mask_to_frame(
-                            frame, combined_mask, background_mode
-                        )
-                        processed_frames.append(processed_frame)
-                        
-                        # Create overlay version if requested
-                        if include_overlay:
-                            overlay = self._create_overlay_frame(
-                                frame, masks, output.get("out_obj_ids", [])
-                            )
-                            overlay_frames.append(overlay)
-                    else:
-                        # No mask for this frame, use transparent/background
-                        if background_mode == "transparent":
-                            alpha = np.zeros((*frame.shape[:2], 1), dtype=np.uint8)
-                            processed_frames.append(np.dstack([frame, alpha]))
-                        else:
-                            bg_frame = apply_mask_to_frame(
-                                frame,
-                                np.zeros(frame.shape[:2], dtype=np.uint8),
-                                background_mode
-                            )
-                            processed_frames.append(bg_frame)
-                        
-                        if include_overlay:
-                            overlay_frames.append(frame)
-                    
-                    if progress_callback:
-                        progress = 0.75 + (0.2 * (frame_idx + 1) / total_frames)
-                        progress_callback(
-                            f"Applying mask to frame {frame_idx + 1}/{total_frames}",
-                            progress,
-                            frame_idx + 1,
-                            total_frames
-                        )
-                
-                # Create output video
-                if progress_callback:
-                    progress_callback("Creating output video...", 0.95, total_frames, total_frames)
-                
-                has_alpha = background_mode == "transparent"
-                output_ext = ".webm" if has_alpha else ".mp4"
-                output_video_path = os.path.join(output_dir, f"segmented{output_ext}")
-                
-                if has_alpha:
-                    create_video_with_alpha(processed_frames, output_video_path, fps)
-                else:
-                    create_video_from_frames(processed_frames, output_video_path, fps)
-                
-                # Create overlay video if requested
-                overlay_video_path = None
-                if include_overlay and overlay_frames:
-                    overlay_video_path = os.path.join(output_dir, "overlay.mp4")
-                    create_video_from_frames(overlay_frames, overlay_video_path, fps)
-                
-                if progress_callback:
-                    progress_callback("Complete!", 1.0, total_frames, total_frames)
-                
-                return {
-                    "success": True,
-                    "message": f"Successfully segmented {objects_detected} object(s) matching '{prompt}'",
-                    "output_video_path": output_video_path,
-                    "overlay_video_path": overlay_video_path,
-                    "total_frames": total_frames,
-                    "objects_detected": objects_detected,
-                    "processing_time_seconds": time.time() - start_time,
-                }
-                
-            finally:
-                # Close session
-                self._predictor.handle_request(
-                    request=dict(
-                        type="close_session",
-                        session_id=session_id,
-                    )
+            
+            # Flush any frames left behind a gap in the yielded frame indices
+            for frame_idx in sorted(pending_outputs.keys()):
+                self._write_output_frame(
+                    video_frames,
+                    frame_idx,
+                    pending_outputs.pop(frame_idx),
+                    background_mode,
+                    output_writer,
+                    overlay_writer,
                 )
-                gc.collect()
-                if torch.cuda.is_available():
-                    torch.cuda.empty_cache()
-        
+            
+            # Finish the output video
+            if progress_callback:
+                progress_callback("Finalizing output video...", 0.95, total_frames, total_frames)
+            
+            output_writer.close()
+            output_writer = None
+            
+            if overlay_writer is not None:
+                overlay_writer.close()
+                overlay_writer = None
+            
+            if progress_callback:
+                progress_callback("Complete!", 1.0, total_frames, total_frames)
+            
+            return {
+                "success": True,
+                "message": f"Successfully segmented {objects_detected} object(s) matching '{prompt}'",
+                "output_video_path": output_video_path,
+                "overlay_video_path": overlay_video_path,
+                "total_frames": total_frames,
+                "objects_detected": objects_detected,
+                "processing_time_seconds": time.time() - start_time,
+            }
+            
         finally:
-            # Cleanup temp frames directory
-            shutil.rmtree(temp_frames_dir, ignore_errors=True)
+            # Release partially written videos on error
+            for writer in (output_writer, overlay_writer):
+                if writer is not None:
+                    writer.abort()
+            
+            # Close session
+            self._predictor.handle_request(
+                request=dict(
+                    type="close_session",
+                    session_id=session_id,
+                )
+            )
+            del video_frames
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+    
+    def _write_output_frame(
+        self,
+        video_frames: List[Optional[np.ndarray]],
+        frame_idx: int,
+        output: Dict,
+        background_mode: str,
+        output_writer: VideoFrameWriter,
+        overlay_writer: Optional[VideoFrameWriter],
+    ):
+        """
+        Apply the masks of one frame and write it to the output video(s).
+        
+        The decoded frame is released afterwards, so memory held by the frame
+        buffer shrinks as propagation progresses.
+        
+        Args:
+            video_frames: Decoded RGB frames of the whole video
+            frame_idx: Index of the frame to write
+            output: SAM3 outputs for this frame
+            background_mode: How to handle background
+            output_writer: Writer for the segmented video
+            overlay_writer: Writer for the overlay video, if requested
+        """
+        frame = video_frames[frame_idx]
+        video_frames[frame_idx] = None
+        
+        # Get all masks for this frame
+        masks = output.get("out_binary_masks", [])
+        
+        if len(masks) > 0:
+            # Combine all detected object masks
+            combined_mask = combine_masks(list(masks))
+            
+            # Apply mask to remove background
+            output_writer.write(
+                apply_mask_to_frame(frame, combined_mask, background_mode)
+            )
+            
+            # Create overlay version if requested
+            if overlay_writer is not None:
+                overlay_writer.write(
+                    self._create_overlay_frame(
+                        frame, masks, output.get("out_obj_ids", [])
+                    )
+                )
+        else:
+            # No mask for this frame, use transparent/background
+            if background_mode == "transparent":
+                alpha = np.zeros((*frame.shape[:2], 1), dtype=np.uint8)
+                output_writer.write(np.dstack([frame, alpha]))
+            else:
+                output_writer.write(
+                    apply_mask_to_frame(
+                        frame,
+                        np.zeros(frame.shape[:2], dtype=np.uint8),
+                        background_mode
+                    )
+                )
+            
+            if overlay_writer is not None:
+                overlay_writer.write(frame)
     
     def _create_overlay_frame(
         self,
@@ -0,0 +1,245 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
+
+"""
+Bounded background task queue for SAM3 API jobs
+"""
+
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+
+class TaskQueueFullError(RuntimeError):
+    """Raised when a task is submitted while the queue is at capacity"""
+
+
+class TaskQueue:
+    """
+    Runs long jobs (e.g. video segmentation) on a dedicated executor so that
+    they never block the asyncio event loop.
+
+    Admission control: at most `max_workers` jobs run concurrently and at most
+    `max_pending` more wait for a worker. Submitting beyond that raises
+    `TaskQueueFullError`, which the API maps to HTTP 429.
+
+    Each task has a status record ("pending", "processing", "completed",
+    "failed", or "cancelled" if the queue was shut down before it started)
+    that is updated from the job's progress callback and can be polled with
+    `get`. Records of finished tasks are forgotten `finished_ttl_seconds`
+    after they finish (never if None).
+    """
+
+    FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+    def __init__(
+        self,
+        max_pending: int = 8,
+        max_workers: int = 1,
+        finished_ttl_seconds: Optional[float] = 3600.0,
+    ):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_pending < 0:
+            raise ValueError("max_pending must be non-negative")
+
+        self.max_pending = max_pending
+        self.max_workers = max_workers
+        self.finished_ttl_seconds = finished_ttl_seconds
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sam3-task"
+        )
+        self._lock = threading.Lock()
+        self._tasks: Dict[str, dict] = {}
+        # futures of the tasks that haven't started yet, to cancel them at shutdown
+        self._pending_futures: Dict[str, Future] = {}
+        self._num_pending = 0
+        self._num_running = 0
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of tasks that can be admitted at the same time"""
+        return self.max_pending + self.max_workers
+
+    @property
+    def is_full(self) -> bool:
+        """Whether a new task would currently be rejected"""
+        with self._lock:
+            return self._num_pending + self._num_running >= self.capacity
+
+    def submit(self, task_id: str, fn: Callable[..., Any], /, **kwargs) -> dict:
+        """
+        Enqueue a job.
+
+        `fn` is called on a worker thread as `fn(progress_callback=..., **kwargs)`
+        and its return value is stored as the task result.
+
+        Args:
+            task_id: Unique ID of the task
+            fn: Job function
+            **kwargs: Keyword arguments passed to `fn`
+
+        Returns:
+            A snapshot of the newly created task record
+
+        Raises:
+            TaskQueueFullError: If the queue is at capacity
+        """
+        with self._lock:
+            self._expire_finished()
+            if task_id in self._tasks:
+                raise ValueError(f"Task {task_id} already exists")
+            if self._num_pending + self._num_running >= self.capacity:
+                raise TaskQueueFullError(
+                    f"Task queue is full ({self.capacity} tasks in flight)"
+                )
+            future = self._executor.submit(self._run_task, task_id, fn, kwargs)
+            record = {
+                "task_id": task_id,
+                "status": "pending",
+                "progress": 0.0,
+                "current_frame": 0,
+                "total_frames": 0,
+                "message": "Waiting in queue",
+                "result": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+            }
+            # the task can't start before its record and future are stored, since
+            # it needs the lock to do so
+            self._tasks[task_id] = record
+            self._pending_futures[task_id] = future
+            self._num_pending += 1
+            snapshot = dict(record)
+
+        return snapshot
+
+    def _run_task(self, task_id: str, fn: Callable[..., Any], kwargs: dict):
+        """Worker-side wrapper that keeps the task record up to date"""
+        with self._lock:
+            self._pending_futures.pop(task_id, None)
+            self._num_pending -= 1
+            self._num_running += 1
+            self._update(
+                task_id,
+                status="processing",
+                message="Processing",
+                started_at=time.time(),
+            )
+
+        def progress_callback(
+            message: str, progress: float, current_frame: int, total_frames: int
+        ):
+            with self._lock:
+                self._update(
+                    task_id,
+                    message=message,
+                    progress=float(progress),
+                    current_frame=int(current_frame),
+                    total_frames=int(total_frames),
+                )
+
+        try:
+            result = fn(progress_callback=progress_callback, **kwargs)
+            with self._lock:
+                self._update(
+                    task_id,
+                    status="completed",
+                    progress=1.0,
+                    message="Complete",
+                    result=result,
+                )
+        except Exception as e:
+            traceback.print_exc()
+            with self._lock:
+                self._update(task_id, status="failed", message=str(e))
+        finally:
+            with self._lock:
+                self._num_running -= 1
+                self._update(task_id, finished_at=time.time())
+
+    def _update(self, task_id: str, **fields):
+        """Update a task record (caller must hold the lock)"""
+        record = self._tasks.get(task_id)
+        # the record may have been removed while the job was running
+        if record is not None:
+            record.update(fields)
+
+    def _expire_finished(self):
+        """Forget the tasks finished more than the TTL ago (caller must hold the lock)"""
+        if self.finished_ttl_seconds is None:
+            return
+        expire_before = time.time() - self.finished_ttl_seconds
+        expired = [
+            task_id
+            for task_id, record in self._tasks.items()
+            if record["status"] in self.FINISHED_STATUSES
+            and record["finished_at"] is not None
+            and record["finished_at"] < expire_before
+        ]
+        for task_id in expired:
+            del self._tasks[task_id]
+
+    def get(self, task_id: str) -> Optional[dict]:
+        """Get a snapshot of a task record, or None if the task is unknown"""
+        with self._lock:
+            self._expire_finished()
+            record = self._tasks.get(task_id)
+            return dict(record) if record is not None else None
+
+    def list_tasks(self) -> List[dict]:
+        """Get snapshots of all task records"""
+        with self._lock:
+            self._expire_finished()
+            return [dict(record) for record in self._tasks.values()]
+
+    def remove(self, task_id: str) -> bool:
+        """
+        Forget a finished task.
+
+        Returns:
+            True if the task was removed, False if it is unknown
+
+        Raises:
+            RuntimeError: If the task is still pending or processing
+        """
+        with self._lock:
+            record = self._tasks.get(task_id)
+            if record is None:
+                return False
+            if record["status"] in ("pending", "processing"):
+                raise RuntimeError(f"Task {task_id} is still {record['status']}")
+            del self._tasks[task_id]
+            return True
+
+    def get_stats(self) -> dict:
+        """Get queue depth and capacity statistics"""
+        with self._lock:
+            self._expire_finished()
+            return {
+                "pending": self._num_pending,
+                "running": self._num_running,
+                "capacity": self.capacity,
+                "total_tasks": len(self._tasks),
+            }
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop accepting new tasks, cancel the pending ones (marking them as
+        "cancelled") and optionally wait for the running ones
+        """
+        # cancel the pending futures by hand (`cancel_futures` needs Python 3.9)
+        with self._lock:
+            for task_id, future in list(self._pending_futures.items()):
+                if future.cancel():
+                    del self._pending_futures[task_id]
+                    self._num_pending -= 1
+                    self._update(
+                        task_id,
+                        status="cancelled",
+                        message="Cancelled at shutdown",
+                        finished_at=time.time(),
+                    )
+        self._executor.shutdown(wait=wait)
@@ -5,9 +5,11 @@ Video processing utilities for SAM3 API
 """
 
 import os
+import queue
 import shutil
 import subprocess
 import tempfile
+import threading
 from pathlib import Path
 from typing import List, Optional, Tuple
 
@@ -197,6 +199,243 @@ def extract_frames_from_video(
     return frame_paths, fps, (width, height)
 
 
+class VideoFrameWriter:
+    """
+    Write frames to a video file one at a time.
+
+    Raw frames are streamed into an ffmpeg subprocess over stdin, so no
+    intermediate image files are written and the whole video never has to be
+    held in memory. Frames are handed to a background writer thread through a
+    bounded queue: encoding overlaps with whatever produces the frames (e.g.
+    SAM3 propagation on the GPU), and `write` only blocks when the encoder
+    falls more than `max_queued_frames` behind.
+
+    Supported outputs:
+        - `.webm`: VP9 (`yuva420p` with alpha)
+        - `.mov`: ProRes 4444 with alpha, H.264 otherwise
+        - anything else (e.g. `.mp4`): H.264 without alpha
+
+    If ffmpeg is not installed, opaque video falls back to `cv2.VideoWriter`;
+    video with alpha requires ffmpeg.
+
+    Usage:
+        with VideoFrameWriter("out.webm", fps=30, has_alpha=True) as writer:
+            for frame in frames:
+                writer.write(frame)
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        fps: int = 30,
+        has_alpha: bool = False,
+        codec: str = "mp4v",
+        max_queued_frames: int = 32,
+    ):
+        """
+        Args:
+            output_path: Path to save the output video
+            fps: Frames per second
+            has_alpha: If True, keep the alpha channel of RGBA frames
+            codec: FourCC codec used by the OpenCV fallback
+            max_queued_frames: Maximum number of frames waiting to be encoded
+        """
+        self.output_path = output_path
+        self.fps = fps
+        self.has_alpha = has_alpha
+        self.codec = codec
+        self.max_queued_frames = max_queued_frames
+        self.num_frames = 0
+        self.use_ffmpeg = shutil.which('ffmpeg') is not None
+        if has_alpha and not self.use_ffmpeg:
+            raise RuntimeError("FFmpeg is required to write video with alpha channel")
+
+        self._frame_size = None
+        self._cv2_writer = None
+        self._process = None
+        self._queue = None
+        self._thread = None
+        self._stderr_chunks = []
+        self._stderr_thread = None
+        self._exception = None
+
+    def write(self, frame: np.ndarray):
+        """
+        Queue a single frame for encoding.
+
+        The frame must not be modified after it is passed to `write`, since it
+        is encoded asynchronously.
+
+        Args:
+            frame: RGB (H, W, 3) or RGBA (H, W, 4) uint8 frame
+        """
+        if self._exception is not None:
+            raise RuntimeError("Video encoding failed") from self._exception
+
+        height, width = frame.shape[:2]
+        if self._frame_size is None:
+            self._frame_size = (width, height)
+            if self.use_ffmpeg:
+                self._start_ffmpeg()
+            else:
+                fourcc = cv2.VideoWriter_fourcc(*self.codec)
+                self._cv2_writer = cv2.VideoWriter(
+                    self.output_path, fourcc, self.fps, (width, height)
+                )
+        elif self._frame_size != (width, height):
+            raise ValueError(
+                f"Frame size {(width, height)} does not match the video size {self._frame_size}"
+            )
+
+        if self._cv2_writer is not None:
+            # OpenCV expects BGR frames
+            if frame.shape[2] == 4:
+                self._cv2_writer.write(cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR))
+            else:
+                self._cv2_writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+        else:
+            if self.has_alpha and frame.shape[2] == 3:
+                # Add an opaque alpha channel if not present
+                alpha = np.full((height, width, 1), 255, dtype=np.uint8)
+                frame = np.concatenate([frame, alpha], axis=-1)
+            elif not self.has_alpha and frame.shape[2] == 4:
+                frame = frame[..., :3]
+            self._queue.put(np.ascontiguousarray(frame, dtype=np.uint8))
+        self.num_frames += 1
+
+    def _start_ffmpeg(self):
+        """Start the ffmpeg process and the thread feeding its stdin"""
+        width, height = self._frame_size
+        cmd = [
+            'ffmpeg', '-y',
+            '-hide_banner', '-loglevel', 'error',
+            '-f', 'rawvideo',
+            '-pix_fmt', 'rgba' if self.has_alpha else 'rgb24',
+            '-s', f'{width}x{height}',
+            '-framerate', str(self.fps),
+            '-i', 'pipe:0',
+        ]
+        cmd.extend(self._get_encoder_args())
+        cmd.append(self.output_path)
+
+        self._process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        self._queue = queue.Queue(maxsize=self.max_queued_frames)
+        self._thread = threading.Thread(target=self._pipe_frames, daemon=True)
+        self._thread.start()
+        # read stderr concurrently, as ffmpeg blocks (and stops reading frames) if
+        # its stderr pipe fills up before it exits
+        self._stderr_thread = threading.Thread(
+            target=lambda: self._stderr_chunks.append(self._process.stderr.read()),
+            daemon=True,
+        )
+        self._stderr_thread.start()
+
+    def _get_encoder_args(self) -> List[str]:
+        """Get the ffmpeg encoder arguments for the output container"""
+        # 4:2:0 chroma subsampling needs even frame dimensions
+        pad_to_even = ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+        h264 = ['-c:v', 'libx264', '-preset', 'fast', '-crf', '23', '-pix_fmt', 'yuv420p']
+
+        if self.output_path.endswith('.webm'):
+            # WebM with VP9 supports alpha
+            args = ['-c:v', 'libvpx-vp9', '-b:v', '0', '-crf', '30']
+            if self.has_alpha:
+                args += ['-pix_fmt', 'yuva420p', '-auto-alt-ref', '0']
+            else:
+                args += ['-pix_fmt', 'yuv420p']
+            return pad_to_even + args
+        elif self.output_path.endswith('.mov') and self.has_alpha:
+            # MOV with ProRes 4444 supports alpha
+            return [
+                '-c:v', 'prores_ks',
+                '-profile:v', '4444',
+                '-pix_fmt', 'yuva444p10le',
+            ]
+        else:
+            # MP4 (and opaque MOV) with H.264, without alpha
+            return pad_to_even + h264
+
+    def _pipe_frames(self):
+        """Writer thread: move queued frames into ffmpeg's stdin"""
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            # after a failure, keep draining the queue so `write` never blocks
+            if self._exception is None:
+                try:
+                    self._process.stdin.write(memoryview(frame))
+                except Exception as e:
+                    self._exception = e
+
+    def close(self) -> str:
+        """
+        Finish encoding the video.
+
+        Returns:
+            Path to the created video
+        """
+        if self.num_frames == 0:
+            self.abort()
+            raise ValueError("No frames provided")
+
+        if self._cv2_writer is not None:
+            self._cv2_writer.release()
+            self._cv2_writer = None
+            return self.output_path
+
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._stderr_thread.join()
+        self._stderr_thread = None
+        returncode = self._process.wait()
+        self._process = None
+
+        if returncode != 0 or self._exception is not None:
+            message = b''.join(self._stderr_chunks).decode(errors='replace').strip()
+            raise RuntimeError(f"FFmpeg encoding failed: {message}") from self._exception
+        return self.output_path
+
+    def abort(self):
+        """Stop encoding without finishing the video"""
+        if self._cv2_writer is not None:
+            self._cv2_writer.release()
+            self._cv2_writer = None
+        if self._process is not None:
+            # killing ffmpeg makes pending pipe writes fail, so the thread drains
+            self._process.kill()
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+            self._stderr_thread.join()
+            self._stderr_thread = None
+            self._process.wait()
+            self._process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
 def create_video_from_frames(
     frames: List[np.ndarray],
     output_path: str,
@@ -211,8 +450,8 @@ def create_video_from_frames(
         frames: List of numpy arrays (H, W, C)
         output_path: Path to save the output video
         fps: Frames per second
-        codec: Video codec
-        has_alpha: If True, save with alpha channel (requires WebM)
+        codec: Video codec used when FFmpeg is unavailable
+        has_alpha: If True, save with alpha channel (requires WebM or MOV)
     
     Returns:
         Path to the created video
@@ -220,29 +459,10 @@ def create_video_from_frames(
     if not frames:
         raise ValueError("No frames provided")
     
-    height, width = frames[0].shape[:2]
-    
-    if has_alpha and output_path.endswith('.webm'):
-        # For WebM with alpha, use VP9 codec
-        fourcc = cv2.VideoWriter_fourcc(*'VP90')
-    else:
-        fourcc = cv2.VideoWriter_fourcc(*codec)
-    
-    writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-    
-    for frame in frames:
-        if frame.shape[2] == 4:  # RGBA
-            # Convert RGBA to BGR for standard video
-            frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
-            writer.write(frame_bgr)
-        elif frame.shape[2] == 3:
-            # Assume RGB, convert to BGR
-            frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-            writer.write(frame_bgr)
-        else:
+    with VideoFrameWriter(output_path, fps, has_alpha=has_alpha, codec=codec) as writer:
+        for frame in frames:
             writer.write(frame)
     
-    writer.release()
     return output_path
 
 
@@ -253,7 +473,7 @@ def create_video_with_alpha(
 ) -> str:
     """
     Create a video with alpha channel (transparency).
-    Uses PNG sequence and ffmpeg for alpha support.
+    Streams raw RGBA frames into ffmpeg for alpha support.
     
     Args:
         frames: List of RGBA numpy arrays (H, W, 4)
@@ -266,65 +486,11 @@ def create_video_with_alpha(
     if not frames:
         raise ValueError("No frames provided")
     
-    # Create temporary directory for PNG frames
-    temp_dir = tempfile.mkdtemp()
+    with VideoFrameWriter(output_path, fps, has_alpha=True) as writer:
+        for frame in frames:
+            writer.write(frame)
     
-    try:
-        # Save frames as PNG (supports alpha)
-        for idx, frame in enumerate(frames):
-            if frame.shape[2] == 4:
-                frame_bgra = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGRA)
-            else:
-                # Add alpha channel if not present
-                alpha = np.ones((*frame.shape[:2], 1), dtype=np.uint8) * 255
-                frame_bgra = np.concatenate([
-                    cv2.cvtColor(frame, cv2.COLOR_RGB2BGR),
-                    alpha
-                ], axis=-1)
-            
-            png_path = os.path.join(temp_dir, f"{idx:05d}.png")
-            cv2.imwrite(png_path, frame_bgra)
-        
-        # Use ffmpeg to create video with alpha
-        if output_path.endswith('.webm'):
-            # WebM with VP9 supports alpha
-            cmd = [
-                'ffmpeg', '-y',
-                '-framerate', str(fps),
-                '-i', os.path.join(temp_dir, '%05d.png'),
-                '-c:v', 'libvpx-vp9',
-                '-pix_fmt', 'yuva420p',
-                '-auto-alt-ref', '0',
-                output_path
-            ]
-        elif output_path.endswith('.mov'):
-            # MOV with ProRes 4444 supports alpha
-            cmd = [
-                'ffmpeg', '-y',
-                '-framerate', str(fps),
-                '-i', os.path.join(temp_dir, '%05d.png'),
-                '-c:v', 'prores_ks',
-                '-profile:v', '4444',
-                '-pix_fmt', 'yuva444p10le',
-                output_path
-            ]
-        else:
-            # Fallback to MP4 without alpha (blend with black)
-            cmd = [
-                'ffmpeg', '-y',
-                '-framerate', str(fps),
-                '-i', os.path.join(temp_dir, '%05d.png'),
-                '-c:v', 'libx264',
-                '-pix_fmt', 'yuv420p',
-                output_path
-            ]
-        
-        subprocess.run(cmd, check=True, capture_output=True)
-        return output_path
-        
-    finally:
-        # Cleanup temp directory
-        shutil.rmtree(temp_dir, ignore_errors=True)
+    return output_path
 
 
 def apply_mask_to_frame(
@@ -41,6 +41,7 @@ def segment_dog_video(
     background_mode: str = "black",
     output_format: str = "mp4",
     include_overlay: bool = False,
+    poll_interval: float = 2.0,
 ) -> bool:
     """
     Segment dogs from a video using the API.
@@ -52,6 +53,7 @@ def segment_dog_video(
         background_mode: Background removal mode
         output_format: Output video format
         include_overlay: Include overlay visualization
+        poll_interval: Seconds between task status requests
     
     Returns:
         True if successful
@@ -78,22 +80,42 @@ def segment_dog_video(
                 "include_overlay": str(include_overlay).lower(),
             }
             
-            print("Uploading and processing video...")
+            print("Uploading video...")
             response = requests.post(
                 f"{base_url}/segment/dog",
                 files=files,
                 data=data,
-                timeout=600,  # 10 minute timeout for long videos
+                timeout=600,  # 10 minute timeout for large uploads
             )
         
-        elapsed = time.time() - start_time
-        
-        if response.status_code != 200:
+        if response.status_code != 202:
             print(f"Error: API returned status {response.status_code}")
             print(f"Details: {response.text}")
             return False
         
-        result = response.json()
+        task_id = response.json()["task_id"]
+        print(f"Task queued: {task_id}")
+        
+        # Poll the task until it finishes
+        while True:
+            task_response = requests.get(f"{base_url}/tasks/{task_id}", timeout=10)
+            if task_response.status_code != 200:
+                print(f"Error: API returned status {task_response.status_code}")
+                print(f"Details: {task_response.text}")
+                return False
+            task = task_response.json()
+            if task["status"] in ("completed", "failed"):
+                break
+            print(f"  [{task['progress'] * 100:5.1f}%] {task['message']}")
+            time.sleep(poll_interval)
+        
+        elapsed = time.time() - start_time
+        
+        if task["status"] == "failed":
+            print(f"Error: {task['message']}")
+            return False
+        
+        result = task["result"]
         
         print(f"\nResult:")
         print(f"  Success: {result['success']}")
@@ -133,7 +155,6 @@ def segment_dog_video(
                 print(f"Overlay saved to: {overlay_path}")
         
         # Cleanup server files
-        task_id = result['output_video_path'].split('/')[2]
         requests.delete(f"{base_url}/cleanup/{task_id}")
         print("Server cleanup complete")
         
@@ -7,7 +7,7 @@ import torch
 from PIL import Image
 
 from sam3.model.box_ops import box_xyxy_to_xywh
-from sam3.train.masks_ops import rle_encode
+from sam3.perflib.rle import rle_encode
 
 from .helpers.mask_overlap_removal import remove_overlapping_masks
 from .viz import visualize
@@ -27,7 +27,7 @@ from iopath.common.file_io import g_pathmgr
 from pycocotools.coco import COCO
 from pycocotools.cocoeval import COCOeval
 
-from sam3.train.masks_ops import rle_encode
+from sam3.perflib.rle import rle_encode
 
 from sam3.train.utils.distributed import (
     all_gather,
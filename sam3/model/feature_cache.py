@@ -0,0 +1,246 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
+
+"""
+Byte-budgeted LRU cache for per-frame backbone features (`feature_cache` in the
+video inference state, shared with the tracker as its `cached_features`).
+
+Running the image backbone is the most expensive part of handling a click, so
+when users go back and forth between frames we want to reuse the features of
+recently visited frames instead of keeping only the most recent one.
+"""
+
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from numbers import Integral
+
+import torch
+
+# by default, only the most recently inserted frame is kept on the device (each frame
+# holds a few hundred MB of multi-scale features at the default image size)
+DEFAULT_FEATURE_CACHE_MAX_BYTES = 0
+DEFAULT_FEATURE_CACHE_MAX_CPU_BYTES = 4 * 1024**3  # 4 GiB
+
+
+class _SpilledTensor:
+    """A tensor spilled to CPU memory together with what's needed to restore it."""
+
+    __slots__ = ("tensor", "device", "dtype")
+
+    def __init__(self, tensor, device, dtype):
+        self.tensor = tensor
+        self.device = device
+        self.dtype = dtype
+
+
+def _map_tensors(obj, fn, leaf_type=torch.Tensor):
+    """Apply `fn` to all `leaf_type` objects in a nested dict/list/tuple structure."""
+    if isinstance(obj, leaf_type):
+        return fn(obj)
+    if isinstance(obj, dict):
+        return {k: _map_tensors(v, fn, leaf_type) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_map_tensors(v, fn, leaf_type) for v in obj)
+    return obj
+
+
+def _nbytes(obj, leaf_type=torch.Tensor):
+    """Total size of all tensors in a nested dict/list/tuple structure."""
+    total = 0
+
+    def _count(t):
+        nonlocal total
+        if isinstance(t, _SpilledTensor):
+            t = t.tensor
+        total += t.numel() * t.element_size()
+        return t
+
+    _map_tensors(obj, _count, leaf_type)
+    return total
+
+
+class FrameFeatureCache(MutableMapping):
+    """
+    A `frame_idx -> (image, backbone_out)` mapping that keeps the backbone
+    features of the most recently used frames within a byte budget.
+
+    Integer keys hold per-frame features and are evicted in least-recently-used
+    order once their total size exceeds `max_bytes` (the most recently inserted
+    frame is always kept, so that it can be consumed right after insertion).
+    Only `backbone_out` is counted on the device: `image` is usually a view into
+    the already loaded video frames (it's copied to CPU memory with the features
+    when spilling them if it's on a GPU). Other keys (e.g. "text", "multigpu_buffer"
+    or "tracking_bounds") hold auxiliary per-session caches and are stored as
+    they are, without ever being evicted.
+
+    Each cached frame holds its multi-scale backbone features and their position
+    encodings (256 channels at 1/4, 1/8 and 1/16 of the image size), i.e. a few
+    hundred MB per frame and per session at the default image size of 1008.
+
+    Args:
+        max_bytes: budget for the features kept on their original device (0 by
+            default, to only keep the most recently inserted frame)
+        spill_to_cpu: whether to move frames evicted from the device into
+            (pinned) CPU memory instead of dropping them; they are moved back
+            to the device on the next access
+        max_cpu_bytes: budget for the features spilled to CPU memory
+        spill_dtype: optionally cast floating point features to this dtype
+            (e.g. torch.bfloat16) when spilling them, to halve the host memory
+            and transfer size at the cost of precision
+    """
+
+    def __init__(
+        self,
+        max_bytes=DEFAULT_FEATURE_CACHE_MAX_BYTES,
+        spill_to_cpu=False,
+        max_cpu_bytes=DEFAULT_FEATURE_CACHE_MAX_CPU_BYTES,
+        spill_dtype=None,
+    ):
+        self.max_bytes = max_bytes
+        self.spill_to_cpu = spill_to_cpu
+        self.max_cpu_bytes = max_cpu_bytes
+        self.spill_dtype = spill_dtype
+        self._extras = {}  # non-frame keys
+        self._frames = OrderedDict()  # frame_idx -> (image, backbone_out), LRU first
+        self._frame_nbytes = {}
+        self._spilled = OrderedDict()  # frame_idx -> (image, spilled backbone_out)
+        self._spilled_nbytes = {}
+        self.num_hits = 0
+        self.num_misses = 0
+
+    @staticmethod
+    def _is_frame_key(key):
+        return isinstance(key, Integral) and not isinstance(key, bool)
+
+    def lookup(self, frame_idx):
+        """
+        Get the cached features of a frame (or None if they are not cached) and
+        count it as a cache hit or miss. Use this where a miss means running the
+        backbone, so that `get_stats` reflects how much backbone compute is saved.
+        """
+        entry = self.get(frame_idx, None)
+        if entry is None:
+            self.num_misses += 1
+        else:
+            self.num_hits += 1
+        return entry
+
+    def __getitem__(self, key):
+        if not self._is_frame_key(key):
+            return self._extras[key]
+        if key in self._frames:
+            self._frames.move_to_end(key)
+            return self._frames[key]
+        if key in self._spilled:
+            spilled_image, spilled_out = self._spilled.pop(key)
+            del self._spilled_nbytes[key]
+            image, backbone_out = _map_tensors(
+                (spilled_image, spilled_out),
+                lambda s: s.tensor.to(s.device, dtype=s.dtype, non_blocking=True),
+                leaf_type=_SpilledTensor,
+            )
+            self[key] = (image, backbone_out)
+            return self._frames[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if not self._is_frame_key(key):
+            self._extras[key] = value
+            return
+        self._spilled.pop(key, None)
+        self._spilled_nbytes.pop(key, None)
+        _, backbone_out = value
+        self._frames[key] = value
+        self._frames.move_to_end(key)
+        self._frame_nbytes[key] = _nbytes(backbone_out)
+        self._evict()
+
+    def __delitem__(self, key):
+        if not self._is_frame_key(key):
+            del self._extras[key]
+        elif key in self._frames:
+            del self._frames[key]
+            del self._frame_nbytes[key]
+        elif key in self._spilled:
+            del self._spilled[key]
+            del self._spilled_nbytes[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        yield from list(self._extras)
+        yield from list(self._frames)
+        yield from list(self._spilled)
+
+    def __len__(self):
+        return len(self._extras) + len(self._frames) + len(self._spilled)
+
+    def __contains__(self, key):
+        if not self._is_frame_key(key):
+            return key in self._extras
+        return key in self._frames or key in self._spilled
+
+    def clear(self):
+        self._extras.clear()
+        self._frames.clear()
+        self._frame_nbytes.clear()
+        self._spilled.clear()
+        self._spilled_nbytes.clear()
+
+    def _spill(self, t, cast=True):
+        if cast and self.spill_dtype is not None and t.is_floating_point():
+            spilled = t.to(self.spill_dtype)
+        else:
+            spilled = t
+        if t.is_cuda:
+            # copy into pinned memory asynchronously (the spilled tensor is only read
+            # back by a host-to-device copy on the same stream)
+            pinned = torch.empty(
+                spilled.shape, dtype=spilled.dtype, device="cpu", pin_memory=True
+            )
+            spilled = pinned.copy_(spilled, non_blocking=True)
+        else:
+            spilled = spilled.clone()
+        return _SpilledTensor(spilled, t.device, t.dtype)
+
+    def evict_frames(self):
+        """
+        Evict all frames from the device (e.g. to free the GPU memory of an idle
+        session), spilling them to CPU memory if `spill_to_cpu` is set.
+        """
+        self._evict(max_bytes=-1, min_num_frames=0)  # (-1 to also evict empty frames)
+
+    def _evict(self, max_bytes=None, min_num_frames=1):
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        device_nbytes = sum(self._frame_nbytes.values())
+        while device_nbytes > max_bytes and len(self._frames) > min_num_frames:
+            frame_idx, (image, backbone_out) = self._frames.popitem(last=False)
+            device_nbytes -= self._frame_nbytes.pop(frame_idx)
+            if not self.spill_to_cpu:
+                continue
+            spilled_out = _map_tensors(backbone_out, self._spill)
+            if isinstance(image, torch.Tensor) and image.is_cuda:
+                # a view into the frames on the device would keep all of them alive
+                # (e.g. after a session's frames are offloaded to CPU memory)
+                image = self._spill(image, cast=False)
+            self._spilled[frame_idx] = (image, spilled_out)
+            self._spilled_nbytes[frame_idx] = _nbytes(
+                (image, spilled_out), _SpilledTensor
+            )
+
+        cpu_nbytes = sum(self._spilled_nbytes.values())
+        while cpu_nbytes > self.max_cpu_bytes and len(self._spilled) > 0:
+            frame_idx, _ = self._spilled.popitem(last=False)
+            cpu_nbytes -= self._spilled_nbytes.pop(frame_idx)
+
+    def get_stats(self):
+        """Get the cache hit/miss counters and the memory held by cached frames."""
+        num_lookups = self.num_hits + self.num_misses
+        return {
+            "num_hits": self.num_hits,
+            "num_misses": self.num_misses,
+            "hit_rate": self.num_hits / max(num_lookups, 1),
+            "num_frames": len(self._frames),
+            "device_bytes": sum(self._frame_nbytes.values()),
+            "num_spilled_frames": len(self._spilled),
+            "cpu_bytes": sum(self._spilled_nbytes.values()),
+        }
@@ -0,0 +1,107 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
+
+"""
+Asynchronous host-to-device prefetching of video frames offloaded to CPU memory.
+
+With `offload_video_to_cpu=True`, each frame is copied to the GPU when inference
+reaches it, which is a synchronous copy from pageable memory in the middle of the
+propagation loop. `FramePrefetcher` wraps the CPU frames and copies the next few
+frames (in the direction of propagation) ahead of time through pinned staging
+buffers on a side CUDA stream, so that the copies overlap with the computation on
+the current frame.
+"""
+
+import torch
+
+
+class FramePrefetcher:
+    """
+    An indexable view of video frames held in CPU memory that returns them on
+    `device`, with the next `num_prefetch` frames already being copied there.
+
+    The direction (and the step, e.g. every `world_size`-th frame for a rank in
+    multi-GPU inference) of the prefetching follows the last two frames accessed.
+    At most `num_prefetch` frames are held on `device` at a time. On CPU devices
+    (or without CUDA), frames are returned as they are and nothing is prefetched.
+    """
+
+    def __init__(self, frames, device, num_prefetch=2):
+        self.frames = frames
+        self.device = torch.device(device)
+        self.num_prefetch = num_prefetch
+        self.enabled = (
+            self.device.type == "cuda"
+            and torch.cuda.is_available()
+            and num_prefetch > 0
+            and len(frames) > 0
+        )
+        self._last_frame_idx = None
+        self._step = 1
+        # frame_idx -> (frame on `device`, event recorded after its copy)
+        self._prefetched = {}
+        if self.enabled:
+            self._stream = torch.cuda.Stream(device=self.device)
+            # a ring of pinned staging buffers (a buffer can be refilled once the
+            # copy from it has completed, which is tracked by its event)
+            frame = frames[0]
+            self._pinned_buffers = [
+                torch.empty(frame.shape, dtype=frame.dtype, pin_memory=True)
+                for _ in range(num_prefetch)
+            ]
+            self._pinned_events = [None] * num_prefetch
+            self._next_buffer_idx = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, frame_idx):
+        frame_idx = int(frame_idx)
+        if frame_idx < 0:
+            frame_idx += len(self)
+        if not self.enabled:
+            return self.frames[frame_idx].to(self.device)
+
+        prefetched = self._prefetched.pop(frame_idx, None)
+        if prefetched is not None:
+            frame, event = prefetched
+            current_stream = torch.cuda.current_stream(self.device)
+            current_stream.wait_event(event)
+            # the frame was allocated on the side stream but is used on this one
+            frame.record_stream(current_stream)
+        else:
+            frame = self.frames[frame_idx].to(self.device)
+
+        if self._last_frame_idx is not None and frame_idx != self._last_frame_idx:
+            self._step = frame_idx - self._last_frame_idx
+        self._last_frame_idx = frame_idx
+        self._prefetch_after(frame_idx)
+        return frame
+
+    def _prefetch_after(self, frame_idx):
+        """Start copying the next `num_prefetch` frames after `frame_idx`."""
+        next_frame_inds = [
+            frame_idx + k * self._step for k in range(1, self.num_prefetch + 1)
+        ]
+        next_frame_inds = [t for t in next_frame_inds if 0 <= t < len(self)]
+        # drop the frames that are no longer ahead (e.g. after a change of direction)
+        for t in list(self._prefetched):
+            if t not in next_frame_inds:
+                del self._prefetched[t]
+        for t in next_frame_inds:
+            if t not in self._prefetched:
+                self._prefetched[t] = self._copy_async(t)
+
+    def _copy_async(self, frame_idx):
+        buffer_idx = self._next_buffer_idx
+        self._next_buffer_idx = (buffer_idx + 1) % self.num_prefetch
+        pinned_buffer = self._pinned_buffers[buffer_idx]
+        if self._pinned_events[buffer_idx] is not None:
+            # wait for the previous copy from this buffer before refilling it
+            self._pinned_events[buffer_idx].synchronize()
+        pinned_buffer.copy_(self.frames[frame_idx])
+        with torch.cuda.stream(self._stream):
+            frame = pinned_buffer.to(self.device, non_blocking=True)
+            event = torch.cuda.Event()
+            event.record(self._stream)
+        self._pinned_events[buffer_idx] = event
+        return frame, event
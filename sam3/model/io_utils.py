@@ -4,7 +4,10 @@ import contextlib
 import os
 import queue
 import re
+import subprocess
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from threading import Condition, get_ident, Lock, Thread
 
 import numpy as np
@@ -15,6 +18,8 @@ import torchvision.transforms.functional as TF
 from PIL import Image
 
 from sam3.logger import get_logger
+from sam3.model.mmap_frame_cache import load_frames_with_mmap_cache
+from torchvision.io import decode_image, ImageReadMode, read_file
 from tqdm import tqdm
 
 logger = get_logger(__name__)
@@ -24,6 +29,13 @@ RANK = int(os.getenv("RANK", "0"))
 
 IMAGE_EXTS = [".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"]
 VIDEO_EXTS = [".mp4", ".mov", ".avi", ".mkv", ".webm"]
+# image formats decoded with torchvision.io (libjpeg-turbo / libpng) instead of PIL
+FAST_DECODE_IMAGE_EXTS = [".jpg", ".jpeg", ".png"]
+# image formats that can be decoded at a reduced resolution (via DCT scaling)
+DRAFT_DECODE_IMAGE_EXTS = [".jpg", ".jpeg"]
+
+# number of threads decoding the frames of image-folder videos
+DEFAULT_NUM_DECODE_WORKERS = min(8, os.cpu_count() or 1)
 
 
 def load_resource_as_video_frames(
@@ -34,23 +46,43 @@ def load_resource_as_video_frames(
     img_std=(0.5, 0.5, 0.5),
     async_loading_frames=False,
     video_loader_type="cv2",
+    frame_cache_dir=None,
+    frame_shard=None,
+    frame_stride=1,
 ):
     """
     Load video frames from either a video or an image (as a single-frame video).
-    Alternatively, if input is a list of PIL images, convert its format
+    Alternatively, if input is a list of PIL images or of uint8 RGB numpy arrays
+    in (H, W, 3) layout (e.g. frames that were already decoded by the caller),
+    convert its format
+
+    If `frame_cache_dir` is set, the preprocessed frames of video files and image
+    folders are cached there and memory-mapped by later calls on the same video
+    (see `sam3.model.mmap_frame_cache`).
+
+    If `frame_shard` is a `(rank, world_size)` pair with `world_size > 1`, only the
+    frames this rank runs the detector on in multi-GPU inference are loaded (see
+    `RankShardedVideoFrames`).
+
+    With `frame_stride > 1`, only every `frame_stride`-th frame of a video is loaded
+    (the other frames are not decoded, or not even read when possible).
     """
     if isinstance(resource_path, list):
         img_mean = torch.tensor(img_mean, dtype=torch.float16)[:, None, None]
         img_std = torch.tensor(img_std, dtype=torch.float16)[:, None, None]
-        assert all(isinstance(img_pil, Image.Image) for img_pil in resource_path)
-        assert len(resource_path) is not None
-        orig_height, orig_width = resource_path[0].size
-        orig_height, orig_width = (
-            orig_width,
-            orig_height,
-        )  # For some reason, this method returns these swapped
+        assert all(isinstance(img, (Image.Image, np.ndarray)) for img in resource_path)
+        assert len(resource_path) > 0
+        if isinstance(resource_path[0], np.ndarray):
+            orig_height, orig_width = resource_path[0].shape[:2]
+        else:
+            orig_height, orig_width = resource_path[0].size
+            orig_height, orig_width = (
+                orig_width,
+                orig_height,
+            )  # For some reason, this method returns these swapped
         images = []
-        for img_pil in resource_path:
+        for img in resource_path[::frame_stride]:
+            img_pil = Image.fromarray(img) if isinstance(img, np.ndarray) else img
             img_np = np.array(img_pil.convert("RGB").resize((image_size, image_size)))
             assert img_np.dtype == np.uint8, "np.uint8 is expected for JPEG images"
             img_np = img_np / 255.0
@@ -70,6 +102,52 @@ def load_resource_as_video_frames(
         isinstance(resource_path, str)
         and os.path.splitext(resource_path)[-1].lower() in IMAGE_EXTS
     )
+    is_video = isinstance(resource_path, str) and (
+        os.path.isdir(resource_path)
+        or os.path.splitext(resource_path)[-1].lower() in VIDEO_EXTS
+    )
+    if is_video and frame_cache_dir is not None:
+        images, video_height, video_width = load_frames_with_mmap_cache(
+            resource_path=resource_path,
+            image_size=image_size,
+            img_mean=img_mean,
+            img_std=img_std,
+            # the cache entry needs all frames, so we load them synchronously
+            load_fn=lambda: load_video_frames(
+                video_path=resource_path,
+                image_size=image_size,
+                offload_video_to_cpu=True,
+                img_mean=img_mean,
+                img_std=img_std,
+                async_loading_frames=False,
+                video_loader_type=video_loader_type,
+                frame_stride=frame_stride,
+            ),
+            frame_stride=frame_stride,
+            cache_dir=frame_cache_dir,
+        )
+        if not offload_video_to_cpu:
+            images = images.cuda()
+        return images, video_height, video_width
+    elif is_video and frame_shard is not None and frame_shard[1] > 1:
+        if os.path.isdir(resource_path) or video_loader_type == "cv2":
+            rank, world_size = frame_shard
+            images = RankShardedVideoFrames(
+                video_path=resource_path,
+                image_size=image_size,
+                offload_video_to_cpu=offload_video_to_cpu,
+                img_mean=img_mean,
+                img_std=img_std,
+                rank=rank,
+                world_size=world_size,
+                frame_stride=frame_stride,
+            )
+            return images, images.video_height, images.video_width
+        logger.warning(
+            f"rank-sharded frame loading is not supported with {video_loader_type=}; "
+            "loading all frames instead"
+        )
+
     if is_image:
         return load_image_as_single_frame_video(
             image_path=resource_path,
@@ -87,9 +165,30 @@ def load_resource_as_video_frames(
             img_std=img_std,
             async_loading_frames=async_loading_frames,
             video_loader_type=video_loader_type,
+            frame_stride=frame_stride,
         )
 
 
+def get_video_frame_count_and_fps(resource_path):
+    """
+    Get the number of frames of a video (a video file, an image folder, a list of
+    frames or an image) and its frame rate (None if unknown), without decoding it.
+    """
+    if isinstance(resource_path, list):
+        return len(resource_path), None
+    if os.path.isdir(resource_path):
+        return len(_list_image_folder_frames(resource_path)), None
+    if os.path.splitext(resource_path)[-1].lower() in VIDEO_EXTS:
+        import cv2
+
+        cap = cv2.VideoCapture(resource_path)
+        num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        return num_frames, (fps if fps > 0 else None)
+    return 1, None
+
+
 def load_image_as_single_frame_video(
     image_path,
     image_size,
@@ -121,10 +220,13 @@ def load_video_frames(
     img_std=(0.5, 0.5, 0.5),
     async_loading_frames=False,
     video_loader_type="cv2",
+    num_decode_workers=DEFAULT_NUM_DECODE_WORKERS,
+    frame_stride=1,
 ):
     """
     Load the video frames from video_path. The frames are resized to image_size as in
     the model and are loaded to GPU if offload_video_to_cpu=False. This is used by the demo.
+    With `frame_stride > 1`, only every `frame_stride`-th frame is loaded.
     """
     assert isinstance(video_path, str)
     if video_path.startswith("<load-dummy-video"):
@@ -140,6 +242,8 @@ def load_video_frames(
             img_mean=img_mean,
             img_std=img_std,
             async_loading_frames=async_loading_frames,
+            num_workers=num_decode_workers,
+            frame_stride=frame_stride,
         )
     elif os.path.splitext(video_path)[-1].lower() in VIDEO_EXTS:
         return load_video_frames_from_video_file(
@@ -150,6 +254,7 @@ def load_video_frames(
             img_std=img_std,
             async_loading_frames=async_loading_frames,
             video_loader_type=video_loader_type,
+            frame_stride=frame_stride,
         )
     else:
         raise NotImplementedError("Only video files and image folders are supported")
@@ -162,44 +267,48 @@ def load_video_frames_from_image_folder(
     img_mean,
     img_std,
     async_loading_frames,
+    num_workers=DEFAULT_NUM_DECODE_WORKERS,
+    frame_stride=1,
 ):
     """
-    Load the video frames from a directory of image files ("<frame_index>.<img_ext>" format)
+    Load the video frames from a directory of image files ("<frame_index>.<img_ext>" format),
+    decoding them with `num_workers` threads in parallel.
     """
-    frame_names = [
-        p
-        for p in os.listdir(image_folder)
-        if os.path.splitext(p)[-1].lower() in IMAGE_EXTS
-    ]
-    try:
-        frame_names.sort(key=lambda p: int(os.path.splitext(p)[0]))
-    except ValueError:
-        # fallback to lexicographic sort if the format is not "<frame_index>.<img_ext>"
-        logger.warning(
-            f'frame names are not in "<frame_index>.<img_ext>" format: {frame_names[:5]=}, '
-            f"falling back to lexicographic sort."
-        )
-        frame_names.sort()
-    num_frames = len(frame_names)
-    if num_frames == 0:
-        raise RuntimeError(f"no images found in {image_folder}")
-    img_paths = [os.path.join(image_folder, frame_name) for frame_name in frame_names]
+    img_paths = _list_image_folder_frames(image_folder)[::frame_stride]
+    num_frames = len(img_paths)
     img_mean = torch.tensor(img_mean, dtype=torch.float16)[:, None, None]
     img_std = torch.tensor(img_std, dtype=torch.float16)[:, None, None]
 
     if async_loading_frames:
         lazy_images = AsyncImageFrameLoader(
-            img_paths, image_size, offload_video_to_cpu, img_mean, img_std
+            img_paths,
+            image_size,
+            offload_video_to_cpu,
+            img_mean,
+            img_std,
+            num_workers=num_workers,
         )
         return lazy_images, lazy_images.video_height, lazy_images.video_width
 
     # float16 precision should be sufficient for image tensor storage
     images = torch.zeros(num_frames, 3, image_size, image_size, dtype=torch.float16)
-    video_height, video_width = None, None
-    for n, img_path in enumerate(
-        tqdm(img_paths, desc=f"frame loading (image folder) [rank={RANK}]")
-    ):
-        images[n], video_height, video_width = _load_img_as_tensor(img_path, image_size)
+
+    def _load_frame(n):
+        images[n], video_height, video_width = _load_img_as_tensor(
+            img_paths[n], image_size
+        )
+        return video_height, video_width
+
+    # decoding and resizing mostly run in native code that releases the GIL
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        video_sizes = list(
+            tqdm(
+                executor.map(_load_frame, range(num_frames)),
+                total=num_frames,
+                desc=f"frame loading (image folder) [rank={RANK}]",
+            )
+        )
+    video_height, video_width = video_sizes[-1]
     if not offload_video_to_cpu:
         images = images.cuda()
         img_mean = img_mean.cuda()
@@ -210,6 +319,27 @@ def load_video_frames_from_image_folder(
     return images, video_height, video_width
 
 
+def _list_image_folder_frames(image_folder):
+    """Get the paths of the frames in an image folder, sorted by frame index."""
+    frame_names = [
+        p
+        for p in os.listdir(image_folder)
+        if os.path.splitext(p)[-1].lower() in IMAGE_EXTS
+    ]
+    try:
+        frame_names.sort(key=lambda p: int(os.path.splitext(p)[0]))
+    except ValueError:
+        # fallback to lexicographic sort if the format is not "<frame_index>.<img_ext>"
+        logger.warning(
+            f'frame names are not in "<frame_index>.<img_ext>" format: {frame_names[:5]=}, '
+            f"falling back to lexicographic sort."
+        )
+        frame_names.sort()
+    if len(frame_names) == 0:
+        raise RuntimeError(f"no images found in {image_folder}")
+    return [os.path.join(image_folder, frame_name) for frame_name in frame_names]
+
+
 def load_video_frames_from_video_file(
     video_path,
     image_size,
@@ -220,15 +350,38 @@ def load_video_frames_from_video_file(
     gpu_acceleration=False,
     gpu_device=None,
     video_loader_type="cv2",
+    frame_stride=1,
 ):
-    """Load the video frames from a video file."""
+    """Load the video frames (every `frame_stride`-th one) from a video file."""
     if video_loader_type == "cv2":
+        if async_loading_frames:
+            # decode frames on demand, keeping only a bounded window of them in memory
+            lazy_images = StreamingVideoFrameLoader(
+                video_path=video_path,
+                image_size=image_size,
+                offload_video_to_cpu=offload_video_to_cpu,
+                img_mean=img_mean,
+                img_std=img_std,
+                frame_stride=frame_stride,
+            )
+            return lazy_images, lazy_images.video_height, lazy_images.video_width
         return load_video_frames_from_video_file_using_cv2(
             video_path=video_path,
             image_size=image_size,
             img_mean=img_mean,
             img_std=img_std,
             offload_video_to_cpu=offload_video_to_cpu,
+            frame_stride=frame_stride,
+        )
+    elif video_loader_type == "ffmpeg":
+        # (frames are always loaded synchronously with ffmpeg)
+        return load_video_frames_from_video_file_using_ffmpeg(
+            video_path=video_path,
+            image_size=image_size,
+            img_mean=img_mean,
+            img_std=img_std,
+            offload_video_to_cpu=offload_video_to_cpu,
+            frame_stride=frame_stride,
         )
     elif video_loader_type == "torchcodec":
         logger.info("Using torchcodec to load video file")
@@ -240,6 +393,7 @@ def load_video_frames_from_video_file(
             img_std=img_std,
             gpu_acceleration=gpu_acceleration,
             gpu_device=gpu_device,
+            frame_stride=frame_stride,
         )
         # The `AsyncVideoFileLoaderWithTorchCodec` class always loads the videos asynchronously,
         # so we just wait for its loading thread to finish if async_loading_frames=False.
@@ -249,7 +403,9 @@ def load_video_frames_from_video_file(
                 async_thread.join()
         return lazy_images, lazy_images.video_height, lazy_images.video_width
     else:
-        raise RuntimeError("video_loader_type must be either 'cv2' or 'torchcodec'")
+        raise RuntimeError(
+            "video_loader_type must be one of 'cv2', 'ffmpeg' or 'torchcodec'"
+        )
 
 
 def load_video_frames_from_video_file_using_cv2(
@@ -258,6 +414,7 @@ def load_video_frames_from_video_file_using_cv2(
     img_mean: tuple = (0.5, 0.5, 0.5),
     img_std: tuple = (0.5, 0.5, 0.5),
     offload_video_to_cpu: bool = False,
+    frame_stride: int = 1,
 ) -> torch.Tensor:
     """
     Load video from path, convert to normalized tensor with specified preprocessing
@@ -267,6 +424,8 @@ def load_video_frames_from_video_file_using_cv2(
         image_size: Target size for square frames (height and width)
         img_mean: Normalization mean (RGB)
         img_std: Normalization standard deviation (RGB)
+        frame_stride: Only load every `frame_stride`-th frame (the others are
+            grabbed but not converted nor resized)
 
     Returns:
         torch.Tensor: Preprocessed video tensor in shape (T, C, H, W) with float16 dtype
@@ -283,39 +442,134 @@ def load_video_frames_from_video_file_using_cv2(
     num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     num_frames = num_frames if num_frames > 0 else None
 
+    # keep the decoded frames as uint8 (instead of float32) until the video is fully read
     frames = []
     pbar = tqdm(desc=f"frame loading (OpenCV) [rank={RANK}]", total=num_frames)
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        # Convert BGR to RGB and resize
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame_resized = cv2.resize(
-            frame_rgb, (image_size, image_size), interpolation=cv2.INTER_CUBIC
-        )
-        frames.append(frame_resized)
+    num_read = 0
+    while cap.grab():
+        if num_read % frame_stride == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            frames.append(_cv2_frame_to_rgb_uint8(frame, image_size))
+        num_read += 1
         pbar.update(1)
     cap.release()
     pbar.close()
 
-    # Convert to tensor
-    frames_np = np.stack(frames, axis=0).astype(np.float32)  # (T, H, W, C)
-    video_tensor = torch.from_numpy(frames_np).permute(0, 3, 1, 2)  # (T, C, H, W)
+    video_tensor = _uint8_frames_to_normalized_tensor(
+        frames, image_size, img_mean, img_std, offload_video_to_cpu
+    )
+    return video_tensor, original_height, original_width
 
-    img_mean = torch.tensor(img_mean, dtype=torch.float16).view(1, 3, 1, 1)
-    img_std = torch.tensor(img_std, dtype=torch.float16).view(1, 3, 1, 1)
-    if not offload_video_to_cpu:
-        video_tensor = video_tensor.cuda()
-        img_mean = img_mean.cuda()
-        img_std = img_std.cuda()
-    # normalize by mean and std
-    video_tensor -= img_mean
-    video_tensor /= img_std
+
+def load_video_frames_from_video_file_using_ffmpeg(
+    video_path: str,
+    image_size: int,
+    img_mean: tuple = (0.5, 0.5, 0.5),
+    img_std: tuple = (0.5, 0.5, 0.5),
+    offload_video_to_cpu: bool = False,
+    frame_stride: int = 1,
+) -> torch.Tensor:
+    """
+    Load video from path with the ffmpeg command-line tool, which resizes the frames
+    to `image_size` in its filter graph right after decoding. Unlike with OpenCV, the
+    full-resolution frames are never converted to RGB or copied out of the decoder,
+    which saves most of the per-frame cost on high-resolution (e.g. 4K) videos.
+
+    Args:
+        video_path: Path to video file
+        image_size: Target size for square frames (height and width)
+        img_mean: Normalization mean (RGB)
+        img_std: Normalization standard deviation (RGB)
+        frame_stride: Only load every `frame_stride`-th frame (the others are
+            dropped by ffmpeg before scaling)
+
+    Returns:
+        torch.Tensor: Preprocessed video tensor in shape (T, C, H, W) with float16 dtype
+    """
+    import cv2  # only to read the video size (without decoding any frames)
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
+    original_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    original_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    cap.release()
+
+    # area averaging is cheaper than bicubic filtering when downscaling and antialiases
+    downscale = min(original_height, original_width) >= image_size
+    scale_flags = "area" if downscale else "bicubic"
+    video_filter = f"scale={image_size}:{image_size}:flags={scale_flags}"
+    if frame_stride > 1:
+        video_filter = f"select=not(mod(n\\,{frame_stride})),{video_filter}"
+    proc = subprocess.Popen(
+        ["ffmpeg", "-v", "error", "-nostdin", "-i", video_path]
+        + ["-map", "0:v:0", "-vf", video_filter, "-vsync", "passthrough"]
+        + ["-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    # read stderr concurrently, as ffmpeg blocks (and stops writing frames) if its
+    # stderr pipe fills up before we reach the end of stdout
+    stderr_chunks = []
+    stderr_thread = Thread(
+        target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True
+    )
+    stderr_thread.start()
+    frame_nbytes = image_size * image_size * 3
+    frames = []
+    pbar = tqdm(desc=f"frame loading (ffmpeg) [rank={RANK}]")
+    while True:
+        buf = bytearray(frame_nbytes)
+        if proc.stdout.readinto(buf) < frame_nbytes:
+            break
+        frame = np.frombuffer(buf, dtype=np.uint8)
+        frames.append(frame.reshape(image_size, image_size, 3))
+        pbar.update(1)
+    pbar.close()
+    stderr_thread.join()
+    stderr = b"".join(stderr_chunks).decode(errors="replace")
+    if proc.wait() != 0 or len(frames) == 0:
+        raise RuntimeError(f"Failed to decode {video_path} with ffmpeg:\n{stderr}")
+
+    video_tensor = _uint8_frames_to_normalized_tensor(
+        frames, image_size, img_mean, img_std, offload_video_to_cpu
+    )
     return video_tensor, original_height, original_width
 
 
+def _uint8_frames_to_normalized_tensor(
+    frames, image_size, img_mean, img_std, offload_video_to_cpu
+):
+    """Convert a list of uint8 (H, W, 3) RGB frames into a normalized float16 tensor."""
+    # Convert to a float16 tensor (T, C, H, W) frame by frame to bound the peak memory
+    img_mean = torch.tensor(img_mean, dtype=torch.float16).view(3, 1, 1)
+    img_std = torch.tensor(img_std, dtype=torch.float16).view(3, 1, 1)
+    device = torch.device("cpu") if offload_video_to_cpu else torch.device("cuda")
+    video_tensor = torch.empty(
+        len(frames), 3, image_size, image_size, dtype=torch.float16, device=device
+    )
+    img_mean = img_mean.to(device)
+    img_std = img_std.to(device)
+    for n in range(len(frames)):
+        frame = torch.from_numpy(frames[n]).to(device).permute(2, 0, 1)
+        frames[n] = None  # release the uint8 frame as soon as it's converted
+        # normalize by mean and std
+        video_tensor[n] = (frame.half() / 255 - img_mean) / img_std
+    return video_tensor
+
+
+def _cv2_frame_to_rgb_uint8(frame, image_size):
+    """Convert a BGR frame decoded by OpenCV to an RGB uint8 array of `image_size`."""
+    import cv2
+
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return cv2.resize(
+        frame_rgb, (image_size, image_size), interpolation=cv2.INTER_CUBIC
+    )
+
+
 def load_dummy_video(image_size, offload_video_to_cpu, num_frames=60):
     """
     Load a dummy video with random frames for testing and compilation warmup purposes.
@@ -327,29 +581,89 @@ def load_dummy_video(image_size, offload_video_to_cpu, num_frames=60):
     return images, video_height, video_width
 
 
+def _decode_img_as_uint8_tensor(img_path):
+    """Decode an image file into a uint8 RGB tensor in (C, H, W) layout."""
+    if os.path.splitext(img_path)[-1].lower() in FAST_DECODE_IMAGE_EXTS:
+        try:
+            return decode_image(read_file(img_path), mode=ImageReadMode.RGB)
+        except RuntimeError:
+            pass  # e.g. a file with a misleading extension, fall back to PIL
+    img = Image.open(img_path).convert("RGB")
+    return TF.pil_to_tensor(img)
+
+
+def _decode_img_for_image_size(img_path, image_size):
+    """
+    Decode an image file to be resized to `image_size` into a uint8 RGB tensor in
+    (C, H, W) layout, and also return its original height and width.
+
+    Large JPEG images are downscaled by the decoder itself (DCT scaling by 1/2, 1/4
+    or 1/8 with PIL `draft`) to the smallest size that is still at least `image_size`
+    on both sides, which is much cheaper than decoding them at full resolution.
+    """
+    if os.path.splitext(img_path)[-1].lower() in DRAFT_DECODE_IMAGE_EXTS:
+        with Image.open(img_path) as img:
+            orig_width, orig_height = img.size
+            if img.format == "JPEG" and min(img.size) >= 2 * image_size:
+                img.draft("RGB", (image_size, image_size))
+                img = TF.pil_to_tensor(img.convert("RGB"))
+                return img, orig_height, orig_width
+    img = _decode_img_as_uint8_tensor(img_path)
+    orig_height, orig_width = img.shape[-2:]
+    return img, orig_height, orig_width
+
+
 def _load_img_as_tensor(img_path, image_size):
     """Load and resize an image and convert it into a PyTorch tensor."""
-    img = Image.open(img_path).convert("RGB")
-    orig_width, orig_height = img.width, img.height
-    img = TF.resize(img, size=(image_size, image_size))
-    img = TF.to_tensor(img)
+    img, orig_height, orig_width = _decode_img_for_image_size(img_path, image_size)
+    img = TF.resize(img, size=(image_size, image_size), antialias=True)
+    img = img.float() / 255
     return img, orig_height, orig_width
 
 
 class AsyncImageFrameLoader:
     """
     A list of video frames to be load asynchronously without blocking session start.
+
+    Frames are decoded by `num_workers` threads into a preallocated float16 tensor.
+    Workers load the frames starting from the most recently requested one (i.e. the
+    propagation cursor), so that the frames needed next are loaded first.
     """
 
-    def __init__(self, img_paths, image_size, offload_video_to_cpu, img_mean, img_std):
+    _NOT_LOADED, _LOADING, _LOADED = 0, 1, 2
+
+    def __init__(
+        self,
+        img_paths,
+        image_size,
+        offload_video_to_cpu,
+        img_mean,
+        img_std,
+        num_workers=DEFAULT_NUM_DECODE_WORKERS,
+    ):
         self.img_paths = img_paths
         self.image_size = image_size
         self.offload_video_to_cpu = offload_video_to_cpu
-        self.img_mean = img_mean
-        self.img_std = img_std
-        # items in `self._images` will be loaded asynchronously
-        self.images = [None] * len(img_paths)
-        # catch and raise any exceptions in the async loading thread
+        device = torch.device("cpu") if offload_video_to_cpu else torch.device("cuda")
+        self.img_mean = img_mean.to(device)
+        self.img_std = img_std.to(device)
+        # float16 precision should be sufficient for image tensor storage
+        self.images = torch.zeros(
+            len(img_paths),
+            3,
+            image_size,
+            image_size,
+            dtype=torch.float16,
+            device=device,
+        )
+        self._status = [self._NOT_LOADED] * len(img_paths)
+        self._cond = Condition()
+        # workers look for frames to load from `_scan_idx` onwards, which is reset to
+        # the most recently requested frame, and then from `_first_unloaded_idx`
+        self._scan_idx = 0
+        self._first_unloaded_idx = 0
+        self.num_loaded_frames = 0
+        # catch and raise any exceptions in the async loading threads
         self.exception = None
         # video_height and video_width be filled when loading the first image
         self.video_height = None
@@ -360,53 +674,639 @@ class AsyncImageFrameLoader:
         self.__getitem__(0)
 
         # load the rest of frames asynchronously without blocking the session start
-        def _load_frames():
-            try:
-                for n in tqdm(
-                    range(len(self.images)),
-                    desc=f"frame loading (image folder) [rank={RANK}]",
-                ):
-                    self.__getitem__(n)
-            except Exception as e:
+        self.pbar = tqdm(
+            desc=f"frame loading (image folder) [rank={RANK}]",
+            total=len(img_paths),
+            initial=self.num_loaded_frames,
+        )
+        self._close_pbar_if_done()
+        self.threads = [
+            Thread(target=self._load_frames, daemon=True) for _ in range(num_workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _next_frame_to_load(self):
+        """Claim the next frame to load (caller must hold `_cond`), or return None."""
+        num_frames = len(self._status)
+        for attr in ("_scan_idx", "_first_unloaded_idx"):
+            idx = getattr(self, attr)
+            while idx < num_frames and self._status[idx] != self._NOT_LOADED:
+                idx += 1
+            setattr(self, attr, idx)
+            if idx < num_frames:
+                self._status[idx] = self._LOADING
+                return idx
+        return None
+
+    def _close_pbar_if_done(self):
+        """Close the progress bar once all frames are loaded (caller must hold `_cond`)."""
+        pbar = getattr(self, "pbar", None)
+        if pbar is not None and (
+            self.num_loaded_frames == len(self._status) or self.exception is not None
+        ):
+            pbar.close()
+            self.pbar = None
+
+    def _load_frame(self, index):
+        """
+        Load frame `index`, which the caller marked as `_LOADING`. On failure, the
+        frame is marked as not loaded again and the exception is recorded in
+        `self.exception` (and re-raised), so that nobody waits for it forever.
+        """
+        try:
+            img, video_height, video_width = _load_img_as_tensor(
+                self.img_paths[index], self.image_size
+            )
+            img = img.to(device=self.images.device, dtype=torch.float16)
+            # normalize by mean and std
+            img -= self.img_mean
+            img /= self.img_std
+            self.images[index] = img
+        except Exception as e:
+            with self._cond:
+                self._status[index] = self._NOT_LOADED
                 self.exception = e
+                self._close_pbar_if_done()
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self.video_height = video_height
+            self.video_width = video_width
+            self._status[index] = self._LOADED
+            self.num_loaded_frames += 1
+            pbar = getattr(self, "pbar", None)
+            if pbar is not None:
+                pbar.update(1)
+            self._close_pbar_if_done()
+            self._cond.notify_all()
+
+    def _load_frames(self):
+        while True:
+            with self._cond:
+                if self.exception is not None:
+                    return
+                index = self._next_frame_to_load()
+            if index is None:
+                return
+            try:
+                self._load_frame(index)
+            except Exception:
+                # the exception is raised in `__getitem__`
+                return
 
-        self.thread = Thread(target=_load_frames, daemon=True)
+    def __getitem__(self, index):
+        with self._cond:
+            if self.exception is not None:
+                raise RuntimeError(
+                    "Failure in frame loading thread"
+                ) from self.exception
+            status = self._status[index]
+            if status == self._LOADED:
+                return self.images[index]
+            # prioritize loading the frames from this one onwards
+            self._scan_idx = index
+            if status == self._NOT_LOADED:
+                self._status[index] = self._LOADING
+            else:
+                # a worker is loading this frame, wait for it
+                while self._status[index] != self._LOADED:
+                    if self.exception is not None:
+                        raise RuntimeError(
+                            "Failure in frame loading thread"
+                        ) from self.exception
+                    self._cond.wait()
+                return self.images[index]
+
+        self._load_frame(index)
+        return self.images[index]
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getstate__(self):
+        """
+        Wait for all frames to be loaded and remove the loading threads during pickling,
+        so that this async frame loader can be saved and loaded as a part of the session.
+        """
+        for thread in self.threads:
+            thread.join()
+        state = self.__dict__.copy()
+        for key in ("_cond", "threads", "pbar"):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cond = Condition()
+        self.threads = []
+        self.pbar = None
+
+
+class StreamingVideoFrameLoader:
+    """
+    A list of video frames decoded on demand with OpenCV, with bounded memory.
+
+    Frames are read by a background thread up to `prefetch_frames` ahead of the
+    most recently requested frame, in the direction in which the frames are being
+    requested (e.g. backward for a reverse propagation), resized and kept as uint8
+    in a ring buffer of at most `max_cached_frames` frames, and normalized to
+    float16 when they are accessed. Since the decoder only reads forward, frames
+    are prefetched backward by seeking `prefetch_frames` before the nearest missing
+    frame and reading up to it. Requesting a frame that is no longer (or not yet)
+    in the buffer seeks the decoder to it. The memory held by the loader thus
+    depends on `max_cached_frames` rather than on the video length.
+
+    With `frame_stride > 1`, the loader holds every `frame_stride`-th frame of the
+    video (the frames in between are grabbed but not converted nor resized).
+    """
+
+    def __init__(
+        self,
+        video_path,
+        image_size,
+        offload_video_to_cpu,
+        img_mean,
+        img_std,
+        max_cached_frames=32,
+        prefetch_frames=16,
+        frame_stride=1,
+    ):
+        import cv2
+
+        assert max_cached_frames > prefetch_frames > 0 and frame_stride >= 1
+        self.video_path = video_path
+        self.image_size = image_size
+        self.offload_video_to_cpu = offload_video_to_cpu
+        self.out_device = torch.device("cpu" if offload_video_to_cpu else "cuda")
+        if not isinstance(img_mean, torch.Tensor):
+            img_mean = torch.tensor(img_mean, dtype=torch.float16)[:, None, None]
+        if not isinstance(img_std, torch.Tensor):
+            img_std = torch.tensor(img_std, dtype=torch.float16)[:, None, None]
+        self.img_mean = img_mean.to(self.out_device)
+        self.img_std = img_std.to(self.out_device)
+        self.max_cached_frames = max_cached_frames
+        self.prefetch_frames = prefetch_frames
+        self.frame_stride = frame_stride
+
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {video_path}")
+        self.video_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.video_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if num_frames <= 0:
+            # the container doesn't report the frame count, so count the frames
+            # (`grab` skips decoding them)
+            num_frames = 0
+            while cap.grab():
+                num_frames += 1
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        if num_frames == 0:
+            raise RuntimeError(f"no frames found in {video_path}")
+        self.num_frames = (num_frames + frame_stride - 1) // frame_stride
+
+        self._cap = cap
+        self._init_loading_state()
+
+    def _init_loading_state(self):
+        # `_cond` guards the buffer and the cursors below; `_decode_lock` guards `_cap`
+        self._cond = Condition()
+        self._decode_lock = Lock()
+        self._frames = OrderedDict()  # frame_idx -> uint8 (H, W, 3), LRU first
+        self._next_decode_idx = 0  # index of the next frame `_cap` will read
+        self._cursor = 0  # most recently requested frame
+        self._direction = 1  # 1 (-1) if the frames are requested forward (backward)
+        self._last_frame = None  # to pad videos with fewer frames than reported
+        self.exception = None
+        self._closed = False
+        self.thread = Thread(target=self._prefetch_frames, daemon=True)
         self.thread.start()
 
-    def __getitem__(self, index):
-        if self.exception is not None:
-            raise RuntimeError("Failure in frame loading thread") from self.exception
+    def _read_next_frame(self):
+        """Decode the frame at `_next_decode_idx` (caller must hold `_decode_lock`)."""
+        import cv2
 
-        img = self.images[index]
-        if img is not None:
-            return img
+        if self._cap is None:
+            self._cap = cv2.VideoCapture(self.video_path)
+            self._cap.set(
+                cv2.CAP_PROP_POS_FRAMES, self._next_decode_idx * self.frame_stride
+            )
+        ret, frame = self._cap.read()
+        if ret:
+            frame = _cv2_frame_to_rgb_uint8(frame, self.image_size)
+            self._last_frame = frame
+            # skip the frames up to the next one we hold
+            for _ in range(self.frame_stride - 1):
+                if not self._cap.grab():
+                    break
+        elif self._last_frame is not None:
+            # the container reported more frames than it holds, repeat the last one
+            logger.warning(
+                f"failed to read frame {self._next_decode_idx}, reusing the last frame"
+            )
+            frame = self._last_frame
+        else:
+            raise RuntimeError(
+                f"Failed to read frame {self._next_decode_idx} from {self.video_path}"
+            )
+        return frame
 
-        img, video_height, video_width = _load_img_as_tensor(
-            self.img_paths[index], self.image_size
-        )
-        self.video_height = video_height
-        self.video_width = video_width
+    def _next_frame_to_decode(self):
+        """
+        The index of the next frame to decode to fill the prefetching window ahead of
+        the cursor (in the direction of the requests), and the index to seek to if the
+        decoder isn't positioned to read up to it. Returns `(None, None)` if the window
+        is full. The caller must hold `_cond`.
+        """
+        target_idx = None
+        for offset in range(self.prefetch_frames):
+            idx = self._cursor + self._direction * offset
+            if not 0 <= idx < self.num_frames:
+                break
+            if idx not in self._frames:
+                target_idx = idx
+                break
+        if target_idx is None:
+            return None, None
+        if self._direction > 0:
+            seek_idx = target_idx
+        else:
+            # the decoder can't read backward, so read the frames before the missing
+            # one from `prefetch_frames` earlier, to seek once for all of them
+            seek_idx = max(target_idx - self.prefetch_frames + 1, 0)
+        if seek_idx <= self._next_decode_idx <= target_idx:
+            # already reading toward the missing frame
+            return self._next_decode_idx, None
+        if target_idx == self._cursor:
+            # a frame is being waited for, decode it first
+            seek_idx = target_idx
+        return seek_idx, seek_idx
+
+    def _prefetch_frames(self):
+        while True:
+            with self._cond:
+                idx, seek_idx = self._next_frame_to_decode()
+                while not self._closed and idx is None:
+                    self._cond.wait()
+                    idx, seek_idx = self._next_frame_to_decode()
+                if self._closed:
+                    return
+            try:
+                with self._decode_lock:
+                    if seek_idx is not None:
+                        self._seek(seek_idx)
+                    frame = self._read_next_frame()
+                    self._next_decode_idx = idx + 1
+            except Exception as e:
+                with self._cond:
+                    self.exception = e
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                if idx not in self._frames:
+                    self._frames[idx] = frame
+                    while len(self._frames) > self.max_cached_frames:
+                        self._frames.popitem(last=False)
+                self._cond.notify_all()
+
+    def _seek(self, index):
+        """Seek the decoder to frame `index` (caller must hold `_decode_lock`)."""
+        import cv2
+
+        if self._cap is not None:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, index * self.frame_stride)
+        self._next_decode_idx = index
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.num_frames
+        if not 0 <= index < self.num_frames:
+            raise IndexError(
+                f"Index {index} is out of bounds; length is {self.num_frames}"
+            )
+
+        with self._cond:
+            if index != self._cursor:
+                self._direction = 1 if index > self._cursor else -1
+            self._cursor = index
+            # the prefetching thread decodes (or seeks to) the requested frame first
+            # when it is missing, including when it was evicted before we read it
+            self._cond.notify_all()
+            frame = self._frames.get(index)
+            while frame is None:
+                if self.exception is not None:
+                    raise RuntimeError(
+                        "Failure in frame loading thread"
+                    ) from self.exception
+                self._cond.wait()
+                frame = self._frames.get(index)
+            self._frames.move_to_end(index)
+
+        img = torch.from_numpy(frame).to(self.out_device).permute(2, 0, 1)
         # float16 precision should be sufficient for image tensor storage
-        img = img.to(dtype=torch.float16)
+        img = img.half() / 255
         # normalize by mean and std
         img -= self.img_mean
         img /= self.img_std
-        if not self.offload_video_to_cpu:
-            img = img.cuda()
-        self.images[index] = img
         return img
 
     def __len__(self):
-        return len(self.images)
+        return self.num_frames
+
+    def close(self):
+        """Stop the prefetching thread and release the decoder."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self._decode_lock:
+            if self._cap is not None:
+                self._cap.release()
+                self._cap = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __getstate__(self):
+        """
+        Only keep the video path and preprocessing parameters when pickling (e.g. as a
+        part of the model session); frames are decoded again after unpickling.
+        """
+        state = self.__dict__.copy()
+        for key in (
+            "_cond",
+            "_decode_lock",
+            "_frames",
+            "_cap",
+            "_last_frame",
+            "thread",
+        ):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cap = None  # reopened lazily by the prefetching thread
+        self._init_loading_state()
+
+
+class RankShardedVideoFrames:
+    """
+    The video frames held by one rank in multi-GPU inference.
+
+    In `Sam3ImageOnVideoMultiGPU`, the frames are processed in chunks of `world_size`
+    frames aligned to multiples of `world_size`, and each rank only runs the detector
+    on frame `t` with `t % world_size == rank` (or on the last frame, for the ranks
+    past the end of the last chunk); the tracker gets its backbone features of all
+    frames through all-gather. So each rank only decodes and stores these frames,
+    which cuts the decoding work and frame memory per rank by `world_size`.
+
+    Other frames are still accessible (e.g. for the single-GPU warm-up or evaluation
+    paths) but are decoded on demand, keeping only the `max_extra_frames` most
+    recently used ones.
+
+    With `frame_stride > 1`, the frames are those of the video subsampled to every
+    `frame_stride`-th frame.
+    """
+
+    def __init__(
+        self,
+        video_path,
+        image_size,
+        offload_video_to_cpu,
+        img_mean,
+        img_std,
+        rank,
+        world_size,
+        num_workers=DEFAULT_NUM_DECODE_WORKERS,
+        max_extra_frames=4,
+        frame_stride=1,
+    ):
+        assert 0 <= rank < world_size
+        self.video_path = video_path
+        self.image_size = image_size
+        self.out_device = torch.device("cpu" if offload_video_to_cpu else "cuda")
+        self.img_mean = torch.tensor(img_mean, dtype=torch.float16)[:, None, None]
+        self.img_std = torch.tensor(img_std, dtype=torch.float16)[:, None, None]
+        self.img_mean = self.img_mean.to(self.out_device)
+        self.img_std = self.img_std.to(self.out_device)
+        self.rank = rank
+        self.world_size = world_size
+        self.max_extra_frames = max_extra_frames
+        self.frame_stride = frame_stride
+        self._cap = None
+        self._decode_lock = Lock()
+        self._extra_frames = OrderedDict()  # frame_idx -> frame, LRU first
+
+        if os.path.isdir(video_path):
+            self.img_paths = _list_image_folder_frames(video_path)[::frame_stride]
+            self.num_frames = len(self.img_paths)
+            local_frames = self._load_local_frames_from_image_folder(num_workers)
+        else:
+            self.img_paths = None
+            local_frames = self._load_local_frames_from_video_file()
+
+        # the frames are stored in a single tensor (in order of frame index)
+        self.local_frame_inds = sorted(local_frames)
+        self._local_slots = {t: i for i, t in enumerate(self.local_frame_inds)}
+        self.frames = torch.empty(
+            len(self.local_frame_inds),
+            3,
+            image_size,
+            image_size,
+            dtype=torch.float16,
+            device=self.out_device,
+        )
+        for i, t in enumerate(self.local_frame_inds):
+            self.frames[i] = self._normalize(local_frames.pop(t))
+        # stands in for the frames not held by this rank where only the image shape
+        # matters (zero strides, so it does not take any memory)
+        self.placeholder_frame = torch.zeros(
+            (), dtype=torch.float16, device=self.out_device
+        ).expand(3, image_size, image_size)
+
+    def is_local_frame(self, index):
+        """Whether the frame is decoded and stored by this rank."""
+        return index % self.world_size == self.rank or index == self.num_frames - 1
+
+    def _load_local_frames_from_image_folder(self, num_workers):
+        """Decode the local frames of an image folder into uint8 (3, H, W) tensors."""
+        local_inds = [t for t in range(self.num_frames) if self.is_local_frame(t)]
+
+        def _load_frame(t):
+            img, orig_height, orig_width = _decode_img_for_image_size(
+                self.img_paths[t], self.image_size
+            )
+            return (orig_height, orig_width), self._resize(img)
+
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            results = list(
+                tqdm(
+                    executor.map(_load_frame, local_inds),
+                    total=len(local_inds),
+                    desc=f"frame loading (image folder, sharded) [rank={self.rank}]",
+                )
+            )
+        (self.video_height, self.video_width), _ = results[-1]
+        return {t: img for t, (_, img) in zip(local_inds, results)}
+
+    def _load_local_frames_from_video_file(self):
+        """
+        Decode the local frames of a video file into uint8 (3, H, W) tensors. Other
+        frames are only grabbed, skipping their color conversion and resizing.
+        """
+        import cv2
+
+        cap = cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {self.video_path}")
+        self.video_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.video_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if num_frames <= 0:
+            # the container doesn't report the frame count, so count the frames
+            num_frames = 0
+            while cap.grab():
+                num_frames += 1
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        num_frames = (num_frames + self.frame_stride - 1) // self.frame_stride
+        self.num_frames = num_frames
+
+        local_frames = {}
+        pbar = tqdm(
+            desc=f"frame loading (OpenCV, sharded) [rank={self.rank}]",
+            total=num_frames,
+        )
+        num_read = 0
+        num_grabbed = 0  # including the frames skipped by `frame_stride`
+        while num_read < num_frames and cap.grab():
+            num_grabbed += 1
+            if (num_grabbed - 1) % self.frame_stride != 0:
+                continue
+            if self.is_local_frame(num_read):
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                frame = _cv2_frame_to_rgb_uint8(frame, self.image_size)
+                local_frames[num_read] = torch.from_numpy(frame).permute(2, 0, 1)
+            num_read += 1
+            pbar.update(1)
+        pbar.close()
+        cap.release()
+        if num_read == 0:
+            raise RuntimeError(f"no frames found in {self.video_path}")
+        if num_read < num_frames:
+            # the container reported more frames than it holds
+            logger.warning(
+                f"only {num_read} out of {num_frames} frames could be read from "
+                f"{self.video_path}"
+            )
+            self.num_frames = num_read
+            if num_read - 1 not in local_frames:
+                # the new last frame is local to all ranks
+                local_frames[num_read - 1] = self._decode_frame(num_read - 1)
+            local_frames = {
+                t: img for t, img in local_frames.items() if self.is_local_frame(t)
+            }
+        return local_frames
+
+    def _resize(self, img):
+        return TF.resize(img, size=(self.image_size, self.image_size), antialias=True)
+
+    def _normalize(self, img):
+        """Convert a uint8 (3, H, W) frame into a normalized float16 one."""
+        img = img.to(self.out_device).half() / 255
+        img -= self.img_mean
+        img /= self.img_std
+        return img
+
+    def _decode_frame(self, index):
+        """Decode any frame of the video into a uint8 (3, H, W) tensor."""
+        if self.img_paths is not None:
+            img, _, _ = _decode_img_for_image_size(
+                self.img_paths[index], self.image_size
+            )
+            return self._resize(img)
+
+        import cv2
+
+        with self._decode_lock:
+            if self._cap is None:
+                self._cap = cv2.VideoCapture(self.video_path)
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, index * self.frame_stride)
+            ret, frame = self._cap.read()
+        if not ret:
+            raise RuntimeError(f"Failed to read frame {index} from {self.video_path}")
+        frame = _cv2_frame_to_rgb_uint8(frame, self.image_size)
+        return torch.from_numpy(frame).permute(2, 0, 1)
+
+    def get_local_frame(self, index):
+        """
+        Get a frame if it is held by this rank, and otherwise `placeholder_frame`
+        (without decoding the frame).
+        """
+        if self.is_local_frame(index):
+            return self[index]
+        return self.placeholder_frame
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.num_frames
+        if not 0 <= index < self.num_frames:
+            raise IndexError(
+                f"Index {index} is out of bounds; length is {self.num_frames}"
+            )
+        slot = self._local_slots.get(index)
+        if slot is not None:
+            return self.frames[slot]
+
+        img = self._extra_frames.get(index)
+        if img is None:
+            img = self._normalize(self._decode_frame(index))
+            self._extra_frames[index] = img
+            while len(self._extra_frames) > self.max_extra_frames:
+                self._extra_frames.popitem(last=False)
+        self._extra_frames.move_to_end(index)
+        return img
+
+    def __len__(self):
+        return self.num_frames
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cap"] = None
+        state.pop("_decode_lock", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._decode_lock = Lock()
 
 
 class TorchCodecDecoder:
     """
     A wrapper to support GPU device and num_threads in TorchCodec decoder,
     which are not supported by `torchcodec.decoders.SimpleVideoDecoder` yet.
+
+    If `output_size` (height, width) is set, the decoder is asked to resize the frames
+    itself; this is skipped (with a warning) on TorchCodec versions that don't support
+    it, so the returned frames may still be at the original video resolution.
     """
 
-    def __init__(self, source, dimension_order="NCHW", device="cpu", num_threads=1):
+    def __init__(
+        self,
+        source,
+        dimension_order="NCHW",
+        device="cpu",
+        num_threads=1,
+        output_size=None,
+    ):
         from torchcodec import _core as core
 
         self._source = source  # hold a reference to the source to prevent it from GC
@@ -420,12 +1320,28 @@ class TorchCodecDecoder:
 
         device_string = str(device)
         core.scan_all_streams_to_update_metadata(self._decoder)
-        core.add_video_stream(
-            self._decoder,
+        stream_options = dict(
             dimension_order=dimension_order,
             device=device_string,
             num_threads=(1 if "cuda" in device_string else num_threads),
         )
+        if output_size is not None:
+            try:
+                core.add_video_stream(
+                    self._decoder,
+                    height=output_size[0],
+                    width=output_size[1],
+                    **stream_options,
+                )
+            except (TypeError, RuntimeError):
+                # (unsupported keyword arguments of the underlying op)
+                logger.warning(
+                    "this TorchCodec version cannot resize frames in the decoder; "
+                    "decoding at the original resolution instead"
+                )
+                output_size = None
+        if output_size is None:
+            core.add_video_stream(self._decoder, **stream_options)
         video_metadata = core.get_container_metadata(self._decoder)
         best_stream_index = video_metadata.best_video_stream_index
         assert best_stream_index is not None
@@ -501,6 +1417,7 @@ class AsyncVideoFileLoaderWithTorchCodec:
         gpu_acceleration=True,
         gpu_device=None,
         use_rand_seek_in_loading=False,
+        frame_stride=1,
     ):
         # Check and possibly infer the output device (and also get its GPU id when applicable)
         assert gpu_device is None or gpu_device.type == "cuda"
@@ -536,11 +1453,17 @@ class AsyncVideoFileLoaderWithTorchCodec:
 
         self.rank = int(os.environ.get("RANK", "0"))
         self.world_size = int(os.environ.get("WORLD_SIZE", "1"))
-        self.async_reader = TorchCodecDecoder(video_path, **decoder_option)
+        # let the decoder resize the frames to `image_size` (see `_transform_frame`)
+        self.async_reader = TorchCodecDecoder(
+            video_path, output_size=(image_size, image_size), **decoder_option
+        )
 
         # `num_frames_from_content` is the true number of frames in the video content
         # from the scan operation (rather than from the metadata, which could be wrong)
-        self.num_frames = self.async_reader.metadata.num_frames_from_content
+        # with `frame_stride > 1`, we only load every `frame_stride`-th frame
+        self.frame_stride = frame_stride
+        num_frames_from_content = self.async_reader.metadata.num_frames_from_content
+        self.num_frames = (num_frames_from_content + frame_stride - 1) // frame_stride
         self.video_height = self.async_reader.metadata.height
         self.video_width = self.async_reader.metadata.width
 
@@ -565,7 +1488,9 @@ class AsyncVideoFileLoaderWithTorchCodec:
         self._start_video_loading()
 
     def _load_one_frame(self, idx):
-        frame_resized = self._transform_frame(self.async_reader[idx])
+        frame_resized = self._transform_frame(
+            self.async_reader[idx * self.frame_stride]
+        )
         return frame_resized
 
     @torch.inference_mode()
@@ -646,12 +1571,15 @@ class AsyncVideoFileLoaderWithTorchCodec:
     def _transform_frame(self, frame):
         frame = frame.clone()  # make a copy to avoid modifying the original frame bytes
         frame = frame.float()  # convert to float32 before interpolation
-        frame_resized = F.interpolate(
-            frame[None, :],
-            size=(self.image_size, self.image_size),
-            mode="bicubic",
-            align_corners=False,
-        )[0]
+        if frame.shape[-2:] != (self.image_size, self.image_size):
+            frame_resized = F.interpolate(
+                frame[None, :],
+                size=(self.image_size, self.image_size),
+                mode="bicubic",
+                align_corners=False,
+            )[0]
+        else:
+            frame_resized = frame  # already resized by the decoder
         # float16 precision should be sufficient for image tensor storage
         frame_resized = frame_resized.half()  # uint8 -> float16
         frame_resized /= 255
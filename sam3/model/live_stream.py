@@ -0,0 +1,147 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
+
+"""
+Containers for the inputs of live video streams (e.g. camera feeds), whose frames
+arrive one at a time and whose total length is unknown.
+
+In a live session (see `Sam3VideoInference.init_live_state`), the per-frame inputs
+and states grow as frames are appended and drop the values of their oldest frames
+as the stream moves on, so that the memory held by the session stays constant
+instead of growing with the number of frames seen so far.
+"""
+
+from collections import deque
+
+import numpy as np
+import torch
+import torchvision.transforms.functional as TF
+from PIL import Image
+
+from sam3.model.io_utils import _decode_img_for_image_size
+
+
+class PerFrameList:
+    """
+    A list of per-frame values, indexed by frame index, that only holds a window of
+    the most recent frames. Values are added with `append` and the values of the
+    oldest frames are dropped with `drop_before`. Its length is the number of
+    frames appended so far; accessing a frame that was dropped raises an IndexError.
+    """
+
+    def __init__(self):
+        self._values = deque()
+        self.start = 0  # index of the first frame still held
+
+    def __len__(self):
+        return self.start + len(self._values)
+
+    def _offset(self, index):
+        if index < 0:
+            index += len(self)
+        if not self.start <= index < len(self):
+            raise IndexError(
+                f"frame {index} is not held (holding frames {self.start} to {len(self) - 1})"
+            )
+        return index - self.start
+
+    def __getitem__(self, index):
+        return self._values[self._offset(index)]
+
+    def __setitem__(self, index, value):
+        self._values[self._offset(index)] = value
+
+    def __iter__(self):
+        """Iterate over the values of the frames still held."""
+        return iter(self._values)
+
+    def append(self, value):
+        self._values.append(value)
+
+    def drop_before(self, index):
+        """Drop the values of all frames before `index`."""
+        while self.start < index and len(self._values) > 0:
+            self._values.popleft()
+            self.start += 1
+
+
+class LiveVideoFrames(PerFrameList):
+    """
+    The frames of a live video stream, preprocessed (resized to `image_size` and
+    normalized) as they are appended. The original size of the video is taken from
+    its first frame, and all later frames must have the same size.
+    """
+
+    def __init__(
+        self,
+        image_size,
+        offload_video_to_cpu,
+        img_mean=(0.5, 0.5, 0.5),
+        img_std=(0.5, 0.5, 0.5),
+    ):
+        super().__init__()
+        self.image_size = image_size
+        self.device = (
+            torch.device("cpu") if offload_video_to_cpu else torch.device("cuda")
+        )
+        self.img_mean = torch.tensor(img_mean, device=self.device).view(3, 1, 1)
+        self.img_std = torch.tensor(img_std, device=self.device).view(3, 1, 1)
+        self.video_height = None
+        self.video_width = None
+
+    def append(self, frame):
+        """
+        Preprocess and append a frame, given as an image path, a PIL image or a uint8
+        RGB numpy array in (H, W, 3) layout, and return its frame index.
+        """
+        if isinstance(frame, str):
+            img, height, width = _decode_img_for_image_size(frame, self.image_size)
+        else:
+            if isinstance(frame, Image.Image):
+                frame = np.asarray(frame.convert("RGB"))
+            assert isinstance(frame, np.ndarray) and frame.dtype == np.uint8
+            assert frame.ndim == 3 and frame.shape[2] == 3, "expected (H, W, 3) RGB"
+            height, width = frame.shape[:2]
+            img = torch.from_numpy(np.ascontiguousarray(frame)).permute(2, 0, 1)
+        if self.video_height is None:
+            self.video_height, self.video_width = height, width
+        elif (height, width) != (self.video_height, self.video_width):
+            raise ValueError(
+                f"frame of size {height}x{width} in a live stream of size "
+                f"{self.video_height}x{self.video_width}"
+            )
+
+        img = img.to(self.device, non_blocking=True)
+        if img.shape[-2:] != (self.image_size, self.image_size):
+            img = TF.resize(
+                img, size=(self.image_size, self.image_size), antialias=True
+            )
+        # normalize by mean and std (float16 precision is sufficient for storage)
+        img = ((img.float() / 255 - self.img_mean) / self.img_std).half()
+        super().append(img)
+        return len(self) - 1
+
+
+def iter_video_source_frames(source):
+    """
+    Iterate over the frames of a local video source as uint8 RGB numpy arrays in
+    (H, W, 3) layout, as they become available. `source` can be a camera index, a
+    stream URL (e.g. "rtsp://...") or a video file path, which are read with OpenCV,
+    or any iterable of frames (that are passed through as they are).
+    """
+    if not isinstance(source, (int, str)):
+        yield from source
+        return
+
+    import cv2
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise RuntimeError(f"cannot open video source {source}")
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        cap.release()
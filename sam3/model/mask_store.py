@@ -0,0 +1,348 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
+
+"""
+Compressed storage for per-frame object masks (`cached_frame_outputs` in the
+video inference state).
+
+Cached masks are boolean tensors at the original video resolution. Keeping one
+dense tensor per object per frame makes the cache grow as
+`num_frames * num_objects * H * W` bytes, which runs out of (GPU) memory on long
+videos. `FrameMaskStore` is a drop-in replacement for the `frame_idx -> {obj_id:
+mask}` dict that encodes the masks on insertion and decodes them on access.
+
+Supported codecs (all lossless):
+- "dense": keep the mask tensors as they are (no compression)
+- "bitpack": pack 8 pixels into each uint8 byte (8x smaller, no device sync)
+- "rle": run-length encode the flattened mask into int32 run lengths (with the
+  COCO RLE kernels of `sam3.perflib.rle`). This is usually much smaller than
+  "bitpack" for object masks, but encoding needs one device-to-host sync per mask
+  to size the output.
+
+The encoded payloads can optionally be offloaded to CPU memory ("cpu") or to
+files in a temporary directory ("disk").
+"""
+
+import os
+import shutil
+import tempfile
+import weakref
+from collections.abc import MutableMapping
+
+import torch
+from sam3.perflib.rle import expand_run_lengths, rle_run_lengths
+
+MASK_CODECS = ("dense", "bitpack", "rle")
+MASK_OFFLOAD_MODES = (None, "cpu", "disk")
+
+_BIT_WEIGHTS = (128, 64, 32, 16, 8, 4, 2, 1)
+
+
+def bitpack_encode(mask: torch.Tensor) -> torch.Tensor:
+    """Pack a boolean mask of any shape into a flat uint8 tensor (8 pixels per byte)."""
+    flat = mask.reshape(-1)
+    num_pad = -flat.numel() % 8
+    if num_pad > 0:
+        flat = torch.cat([flat, flat.new_zeros(num_pad)])
+    weights = torch.tensor(_BIT_WEIGHTS, dtype=torch.uint8, device=mask.device)
+    return (flat.view(-1, 8).to(torch.uint8) * weights).sum(dim=1, dtype=torch.uint8)
+
+
+def bitpack_decode(packed: torch.Tensor, shape, device=None) -> torch.Tensor:
+    """Unpack the output of `bitpack_encode` into a boolean mask of `shape`."""
+    packed = packed.to(device=device)
+    weights = torch.tensor(_BIT_WEIGHTS, dtype=torch.uint8, device=packed.device)
+    flat = (packed[:, None] & weights) != 0
+    numel = 1
+    for s in shape:
+        numel *= s
+    return flat.reshape(-1)[:numel].reshape(shape)
+
+
+def rle_encode_mask(mask: torch.Tensor) -> torch.Tensor:
+    """
+    Run-length encode a boolean mask of any shape (flattened in row-major order),
+    with `sam3.perflib.rle.rle_run_lengths`. Returns an int32 tensor of run lengths
+    that alternate between background and foreground, starting with background (the
+    first run is 0 if the first pixel is foreground), as in the COCO RLE convention.
+    """
+    # a (1, 1, numel) mask is flattened in the same order in COCO's column-major order
+    run_lengths, _ = rle_run_lengths(mask.reshape(1, 1, -1))
+    return run_lengths.to(torch.int32)
+
+
+def rle_decode_mask(counts: torch.Tensor, shape, device=None) -> torch.Tensor:
+    """Decode the output of `rle_encode_mask` into a boolean mask of `shape`."""
+    device = counts.device if device is None else device
+    numel = 1
+    for s in shape:
+        numel *= s
+    return expand_run_lengths([counts], 1, numel, device).reshape(shape)
+
+
+_ENCODERS = {
+    "dense": lambda mask: mask,
+    "bitpack": bitpack_encode,
+    "rle": rle_encode_mask,
+}
+
+_DECODERS = {
+    "dense": lambda payload, shape, device: payload.to(device=device),
+    "bitpack": bitpack_decode,
+    "rle": rle_decode_mask,
+}
+
+
+class _EncodedMask:
+    """An encoded mask together with what's needed to restore it."""
+
+    __slots__ = ("payload", "nbytes", "shape", "device")
+
+    def __init__(self, payload, nbytes, shape, device):
+        self.payload = payload  # None when the payload lives on disk
+        self.nbytes = nbytes
+        self.shape = shape
+        self.device = device
+
+    @property
+    def dense_nbytes(self):
+        numel = 1
+        for s in self.shape:
+            numel *= s
+        return numel  # bool masks take 1 byte per pixel
+
+
+class _FrameMasks(MutableMapping):
+    """
+    The `obj_id -> mask` mapping of a single frame in a `FrameMaskStore`.
+    Masks are decoded on access, so only the objects actually read are decoded.
+    """
+
+    def __init__(self, store, frame_idx):
+        self._store = store
+        self._frame_idx = frame_idx
+        self._entries = {}  # obj_id -> _EncodedMask
+        self._payload_nbytes = 0
+
+    def _payload_path(self):
+        return os.path.join(self._store.spill_dir, f"{self._frame_idx}.pt")
+
+    def _load_disk_payloads(self):
+        # the payloads of the last frame read from disk are kept by the store, so that
+        # reading all the masks of a frame loads its file only once
+        store = self._store
+        if store._disk_payloads_frame_idx == self._frame_idx:
+            return store._disk_payloads
+        path = self._payload_path()
+        if not os.path.exists(path):
+            payloads = {}
+        else:
+            payloads = torch.load(path, map_location="cpu", weights_only=True)
+        store._disk_payloads_frame_idx = self._frame_idx
+        store._disk_payloads = payloads
+        return payloads
+
+    def _save_disk_payloads(self, payloads):
+        store = self._store
+        store._disk_payloads_frame_idx = self._frame_idx
+        store._disk_payloads = payloads
+        path = self._payload_path()
+        if len(payloads) == 0:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        torch.save(payloads, path)
+
+    def _set_many(self, obj_id_to_mask):
+        """Encode and insert several masks (with a single write in "disk" mode)."""
+        store = self._store
+        payloads = {}
+        for obj_id, mask in obj_id_to_mask.items():
+            assert mask.dtype == torch.bool, "only boolean masks can be cached"
+            payload = _ENCODERS[store.codec](mask)
+            if store.offload is not None:
+                payload = payload.cpu()
+            # use plain ints as keys since obj ids could be numpy integers
+            payloads[int(obj_id)] = payload
+            self._pop_entry(obj_id)
+            entry = _EncodedMask(
+                payload=None if store.offload == "disk" else payload,
+                nbytes=payload.numel() * payload.element_size(),
+                shape=tuple(mask.shape),
+                device=mask.device,
+            )
+            self._entries[obj_id] = entry
+            self._payload_nbytes += entry.nbytes
+        if store.offload == "disk" and len(payloads) > 0:
+            all_payloads = self._load_disk_payloads()
+            all_payloads.update(payloads)
+            self._save_disk_payloads(all_payloads)
+
+    def _pop_entry(self, obj_id):
+        entry = self._entries.pop(obj_id, None)
+        if entry is not None:
+            self._payload_nbytes -= entry.nbytes
+        return entry
+
+    def __getitem__(self, obj_id):
+        entry = self._entries[obj_id]
+        payload = entry.payload
+        if payload is None:
+            payload = self._load_disk_payloads()[int(obj_id)]
+        return _DECODERS[self._store.codec](payload, entry.shape, entry.device)
+
+    def __setitem__(self, obj_id, mask):
+        self._set_many({obj_id: mask})
+
+    def __delitem__(self, obj_id):
+        if obj_id not in self._entries:
+            raise KeyError(obj_id)
+        if self._store.offload == "disk":
+            payloads = self._load_disk_payloads()
+            payloads.pop(int(obj_id), None)
+            self._save_disk_payloads(payloads)
+        self._pop_entry(obj_id)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, obj_id):
+        return obj_id in self._entries
+
+    def copy(self):
+        """Decode all masks into a plain `obj_id -> mask` dict."""
+        return {obj_id: self[obj_id] for obj_id in self._entries}
+
+    def _clear_disk(self):
+        if self._store.offload == "disk":
+            self._save_disk_payloads({})
+
+    @property
+    def encoded_nbytes(self):
+        return self._payload_nbytes
+
+    @property
+    def dense_nbytes(self):
+        return sum(entry.dense_nbytes for entry in self._entries.values())
+
+
+class FrameMaskStore(MutableMapping):
+    """
+    A `frame_idx -> {obj_id: mask}` mapping that keeps the masks compressed.
+
+    Assigning a dict of boolean mask tensors to a frame encodes them with
+    `codec`; reading `store[frame_idx][obj_id]` decodes a mask back to a dense
+    boolean tensor on the device it was cached from. `store[frame_idx]` is a
+    lazy mapping, and `store[frame_idx].copy()` decodes all masks of the frame
+    into a plain dict.
+
+    Args:
+        codec: one of "dense", "bitpack" or "rle" (see module docstring)
+        offload: None to keep the encoded masks on their original device,
+            "cpu" to move them to CPU memory, or "disk" to spill them into
+            files under `spill_dir`
+        spill_dir: directory for "disk" offloading (a temporary directory is
+            created and removed with the store if not specified)
+    """
+
+    def __init__(self, codec="bitpack", offload=None, spill_dir=None):
+        if codec not in MASK_CODECS:
+            raise ValueError(
+                f"unknown mask codec {codec}; expected one of {MASK_CODECS}"
+            )
+        if offload not in MASK_OFFLOAD_MODES:
+            raise ValueError(
+                f"unknown mask offload mode {offload}; expected one of {MASK_OFFLOAD_MODES}"
+            )
+        self.codec = codec
+        self.offload = offload
+        self.spill_dir = None
+        if offload == "disk":
+            if spill_dir is None:
+                spill_dir = tempfile.mkdtemp(prefix="sam3_mask_store_")
+                weakref.finalize(self, shutil.rmtree, spill_dir, ignore_errors=True)
+            os.makedirs(spill_dir, exist_ok=True)
+            self.spill_dir = spill_dir
+        self._frames = {}  # frame_idx -> _FrameMasks
+        # the payloads of the frame last read from (or written to) disk
+        self._disk_payloads_frame_idx = None
+        self._disk_payloads = None
+
+    def __getitem__(self, frame_idx):
+        return self._frames[frame_idx]
+
+    def __setitem__(self, frame_idx, obj_id_to_mask):
+        old_frame = self._frames.pop(frame_idx, None)
+        if old_frame is not None:
+            old_frame._clear_disk()
+        frame = _FrameMasks(self, frame_idx)
+        frame._set_many(obj_id_to_mask)
+        self._frames[frame_idx] = frame
+
+    def __delitem__(self, frame_idx):
+        frame = self._frames.pop(frame_idx)
+        frame._clear_disk()
+
+    def __iter__(self):
+        return iter(self._frames)
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, frame_idx):
+        return frame_idx in self._frames
+
+    def clear(self):
+        for frame in self._frames.values():
+            frame._clear_disk()
+        self._frames.clear()
+
+    def get_memory_stats(self):
+        """
+        Get the memory footprint of the cached masks, e.g. to size sessions.
+
+        Returns a dict with the number of cached frames and masks, the bytes held
+        by the encoded masks (on disk for "disk" offloading), the bytes the same
+        masks would take as dense boolean tensors, and the average encoded bytes
+        per cached frame.
+        """
+        num_frames = len(self._frames)
+        num_masks = sum(len(frame) for frame in self._frames.values())
+        encoded_nbytes = sum(frame.encoded_nbytes for frame in self._frames.values())
+        dense_nbytes = sum(frame.dense_nbytes for frame in self._frames.values())
+        return {
+            "codec": self.codec,
+            "offload": self.offload,
+            "num_frames": num_frames,
+            "num_masks": num_masks,
+            "encoded_bytes": encoded_nbytes,
+            "dense_bytes": dense_nbytes,
+            "bytes_per_frame": encoded_nbytes / max(num_frames, 1),
+            "compression_ratio": dense_nbytes / max(encoded_nbytes, 1),
+        }
+
+    def __getstate__(self):
+        # decode "disk" payloads into memory so that the store can be pickled
+        # along with the rest of a session
+        state = self.__dict__.copy()
+        if self.offload == "disk":
+            frames = {}
+            for frame_idx, frame in self._frames.items():
+                payloads = frame._load_disk_payloads()
+                frame_copy = _FrameMasks.__new__(_FrameMasks)
+                frame_copy.__dict__.update(frame.__dict__)
+                frame_copy._entries = {
+                    obj_id: _EncodedMask(
+                        payloads[int(obj_id)], entry.nbytes, entry.shape, entry.device
+                    )
+                    for obj_id, entry in frame._entries.items()
+                }
+                frames[frame_idx] = frame_copy
+            state["_frames"] = frames
+            state["offload"] = "cpu"
+            state["spill_dir"] = None
+            state["_disk_payloads_frame_idx"] = None
+            state["_disk_payloads"] = None
+        return state
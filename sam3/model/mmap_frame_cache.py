@@ -0,0 +1,178 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
+
+"""
+On-disk cache of preprocessed (resized and normalized) float16 video frames.
+
+Decoding and normalizing a video is repeated by every session started on it, and
+by every GPU worker of a multi-GPU predictor. With this cache, the frames are
+preprocessed once into a `.npy` file keyed by a fingerprint of the video file(s),
+`image_size` and the normalization mean and std, and then memory-mapped by all later sessions and
+processes. The mapped pages are shared through the OS page cache, so host memory
+holds a single copy of the frames regardless of the number of sessions or ranks.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+
+import numpy as np
+import torch
+
+from sam3.logger import get_logger
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+logger = get_logger(__name__)
+
+DEFAULT_FRAME_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "sam3", "frames"
+)
+
+# bump when the preprocessing of the frames (or the cache key) changes to invalidate
+# existing entries
+_FRAME_CACHE_VERSION = 2
+# bytes hashed at the beginning and at the end of each file
+_HASH_EDGE_SIZE = 1024 * 1024
+
+
+def hash_video_content(resource_path):
+    """
+    Fingerprint a video file, or all the files in a directory of frames (together
+    with their names, which define the frame order), by their path, size and
+    modification time, and the hash of their first and last MB. This is cheap even
+    for multi-GB videos, unlike hashing their full content.
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+
+    def _hash_file(path):
+        stat = os.stat(path)
+        hasher.update(
+            f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")
+        )
+        with open(path, "rb") as f:
+            hasher.update(f.read(_HASH_EDGE_SIZE))
+            if stat.st_size > _HASH_EDGE_SIZE:
+                f.seek(max(stat.st_size - _HASH_EDGE_SIZE, _HASH_EDGE_SIZE))
+                hasher.update(f.read(_HASH_EDGE_SIZE))
+
+    if os.path.isdir(resource_path):
+        for name in sorted(os.listdir(resource_path)):
+            path = os.path.join(resource_path, name)
+            if os.path.isfile(path):
+                hasher.update(name.encode("utf-8"))
+                _hash_file(path)
+    else:
+        _hash_file(resource_path)
+    return hasher.hexdigest()
+
+
+def _save_frames(path, images):
+    """
+    Save frames as a float16 `.npy` file, from a tensor or from a lazy loader that
+    decodes its frames on access (e.g. `AsyncVideoFileLoaderWithTorchCodec`), one
+    frame at a time.
+    """
+    first_frame = images[0]
+    images_np = np.lib.format.open_memmap(
+        path, mode="w+", dtype=np.float16, shape=(len(images), *first_frame.shape)
+    )
+    if isinstance(images, torch.Tensor):
+        images_np[:] = images.to(device="cpu", dtype=torch.float16).numpy()
+    else:
+        for idx in range(len(images)):
+            frame = first_frame if idx == 0 else images[idx]
+            images_np[idx] = frame.to(device="cpu", dtype=torch.float16).numpy()
+    images_np.flush()
+    del images_np
+
+
+def get_frame_cache_key(resource_path, image_size, img_mean, img_std, frame_stride=1):
+    """
+    Get the cache key of a video preprocessed with `image_size`, `img_mean` and
+    `img_std`, and subsampled to every `frame_stride`-th frame.
+    """
+    params = json.dumps(
+        {
+            "version": _FRAME_CACHE_VERSION,
+            "image_size": image_size,
+            "frame_stride": frame_stride,
+            "img_mean": [float(x) for x in img_mean],
+            "img_std": [float(x) for x in img_std],
+        },
+        sort_keys=True,
+    )
+    params_hash = hashlib.blake2b(params.encode("utf-8"), digest_size=8).hexdigest()
+    return f"{hash_video_content(resource_path)}_{params_hash}"
+
+
+@contextlib.contextmanager
+def _file_lock(lock_path):
+    """Exclusive inter-process lock, so that only one process builds a cache entry."""
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def load_frames_with_mmap_cache(
+    resource_path,
+    image_size,
+    img_mean,
+    img_std,
+    load_fn,
+    cache_dir=DEFAULT_FRAME_CACHE_DIR,
+    frame_stride=1,
+):
+    """
+    Get the preprocessed frames of a video as a memory-mapped float16 CPU tensor.
+
+    On a cache miss, `load_fn()` is called to decode and preprocess the frames; it
+    must return `(images, video_height, video_width)` like the video loaders in
+    `sam3.model.io_utils` (where `images` is a tensor or a lazy frame loader). Concurrent callers (e.g. the ranks of a multi-GPU
+    predictor) wait for the first one to write the cache entry instead of decoding
+    the video themselves.
+
+    The returned tensor is a copy-on-write mapping of the cache file: it can be
+    modified in place without affecting the file or other sessions.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    key = get_frame_cache_key(
+        resource_path, image_size, img_mean, img_std, frame_stride=frame_stride
+    )
+    data_path = os.path.join(cache_dir, f"{key}.npy")
+    # the metadata file is written last and marks the entry as complete
+    meta_path = os.path.join(cache_dir, f"{key}.json")
+
+    with _file_lock(os.path.join(cache_dir, f"{key}.lock")):
+        if not os.path.exists(meta_path):
+            logger.info(f"building the frame cache of {resource_path} in {data_path}")
+            images, video_height, video_width = load_fn()
+            tmp_data_path = f"{data_path}.{os.getpid()}.tmp"
+            _save_frames(tmp_data_path, images)
+            os.replace(tmp_data_path, data_path)
+            tmp_meta_path = f"{meta_path}.{os.getpid()}.tmp"
+            with open(tmp_meta_path, "w") as f:
+                json.dump(
+                    {
+                        "resource_path": str(resource_path),
+                        "video_height": int(video_height),
+                        "video_width": int(video_width),
+                    },
+                    f,
+                )
+            os.replace(tmp_meta_path, meta_path)
+            del images
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    images = torch.from_numpy(np.load(data_path, mmap_mode="c"))
+    return images, meta["video_height"], meta["video_width"]
@@ -1,5 +1,5 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import PIL
@@ -8,6 +8,7 @@ import torch
 from sam3.model import box_ops
 
 from sam3.model.data_misc import FindStage, interpolate
+from sam3.model.text_embedding_cache import encode_text_cached
 from torchvision.transforms import v2
 
 
@@ -116,7 +117,9 @@ class Sam3Processor:
         if "backbone_out" not in state:
             raise ValueError("You must call set_image before set_text_prompt")
 
-        text_outputs = self.model.backbone.forward_text([prompt], device=self.device)
+        text_outputs = encode_text_cached(
+            self.model.backbone, [prompt], device=self.device
+        )
         # will erase the previous text prompt if any
         state["backbone_out"].update(text_outputs)
         if "geometric_prompt" not in state:
@@ -124,6 +127,111 @@ class Sam3Processor:
 
         return self._forward_grounding(state)
 
+    @torch.inference_mode()
+    def set_text_prompt_batch(
+        self,
+        prompts: List[str],
+        state: Dict,
+        pairs: Optional[List[Tuple[int, int]]] = None,
+    ):
+        """Runs the inference for every text prompt on every image set with set_image_batch.
+        All the (image, prompt) pairs are grounded in a single forward pass, and the results
+        are stored per image in state["batch_results"]: a list with, for each image, a dict of
+        "masks", "masks_logits", "boxes" and "scores" (as in set_text_prompt, for the
+        detections of all prompts) and "prompt_ids", the index in `prompts` of each detection.
+        If `pairs` is given, only the listed (image index, prompt index) pairs are grounded.
+        """
+        if "backbone_out" not in state or "original_heights" not in state:
+            raise ValueError(
+                "You must call set_image_batch before set_text_prompt_batch"
+            )
+        assert len(prompts) > 0, "Prompts list must not be empty"
+
+        num_images = len(state["original_heights"])
+        num_prompts = len(prompts)
+        if pairs is None:
+            pairs = [(i, j) for i in range(num_images) for j in range(num_prompts)]
+        # one query per (image, prompt) pair, image-major
+        pairs = sorted(pairs)
+        assert len(pairs) > 0, "Pairs list must not be empty"
+        query_img_ids = torch.tensor([i for i, _ in pairs], dtype=torch.long)
+        query_text_ids = torch.tensor([j for _, j in pairs], dtype=torch.long)
+        text_outputs = encode_text_cached(
+            self.model.backbone, prompts, device=self.device
+        )
+        state["backbone_out"].update(text_outputs)
+        find_stage = FindStage(
+            img_ids=query_img_ids.to(self.device),
+            text_ids=query_text_ids.to(self.device),
+            input_boxes=None,
+            input_boxes_mask=None,
+            input_boxes_label=None,
+            input_points=None,
+            input_points_mask=None,
+        )
+        outputs = self.model.forward_grounding(
+            backbone_out=state["backbone_out"],
+            find_input=find_stage,
+            geometric_prompt=self.model._get_dummy_prompt(num_prompts=len(pairs)),
+            find_target=None,
+        )
+
+        out_probs = outputs["pred_logits"].sigmoid()
+        presence_score = outputs["presence_logit_dec"].sigmoid().unsqueeze(1)
+        out_probs = (out_probs * presence_score).squeeze(-1)
+
+        # keep the detections above threshold of all queries at once
+        query_idx, det_idx = torch.nonzero(
+            out_probs > self.confidence_threshold, as_tuple=True
+        )
+        out_probs = out_probs[query_idx, det_idx]
+        out_masks = outputs["pred_masks"][query_idx, det_idx]
+        out_bbox = outputs["pred_boxes"][query_idx, det_idx]
+        img_idx = find_stage.img_ids[query_idx]
+
+        # convert to [x0, y0, x1, y1] format in the original size of each image
+        heights = torch.tensor(state["original_heights"], device=self.device)
+        widths = torch.tensor(state["original_widths"], device=self.device)
+        scale_fct = torch.stack([widths, heights, widths, heights], dim=1)
+        boxes = box_ops.box_cxcywh_to_xyxy(out_bbox) * scale_fct[img_idx]
+
+        query_idx = query_idx.cpu()
+        img_idx = query_img_ids[query_idx]
+        prompt_idx = query_text_ids[query_idx]
+        num_dets_per_image = torch.bincount(img_idx, minlength=num_images).tolist()
+        results = [None] * num_images
+        # upsample the masks of all images with the same original size in one call
+        image_sizes = list(zip(state["original_heights"], state["original_widths"]))
+        for img_h, img_w in dict.fromkeys(image_sizes):
+            same_size = [
+                i for i, size in enumerate(image_sizes) if size == (img_h, img_w)
+            ]
+            sel = torch.isin(img_idx, torch.tensor(same_size))
+            sel_idx = torch.nonzero(sel, as_tuple=True)[0]
+            masks_logits = interpolate(
+                out_masks[sel_idx.to(self.device)].unsqueeze(1),
+                (img_h, img_w),
+                mode="bilinear",
+                align_corners=False,
+            ).sigmoid()
+            # detections are sorted by image, so each image is a contiguous slice
+            start = 0
+            for i in same_size:
+                end = start + num_dets_per_image[i]
+                det_sel = sel_idx[start:end].to(self.device)
+                results[i] = {
+                    "masks_logits": masks_logits[start:end],
+                    "masks": masks_logits[start:end] > 0.5,
+                    "boxes": boxes[det_sel],
+                    "scores": out_probs[det_sel],
+                    "prompt_ids": prompt_idx[sel_idx[start:end]],
+                }
+                start = end
+
+        state["prompts"] = list(prompts)
+        state["batch_results"] = results
+        return state
+
     @torch.inference_mode()
     def add_geometric_prompt(self, box: List, label: bool, state: Dict):
         """Adds a box prompt and run the inference.
@@ -136,8 +244,8 @@ class Sam3Processor:
 
         if "language_features" not in state["backbone_out"]:
             # Looks like we don't have a text prompt yet. This is allowed, but we need to set the text prompt to "visual" for the model to rely only on the geometric prompt
-            dummy_text_outputs = self.model.backbone.forward_text(
-                ["visual"], device=self.device
+            dummy_text_outputs = encode_text_cached(
+                self.model.backbone, ["visual"], device=self.device
             )
             state["backbone_out"].update(dummy_text_outputs)
 
@@ -163,7 +271,15 @@ class Sam3Processor:
                 if key in state["backbone_out"]:
                     del state["backbone_out"][key]
 
-        keys_to_del = ["geometric_prompt", "boxes", "masks", "masks_logits", "scores"]
+        keys_to_del = [
+            "geometric_prompt",
+            "boxes",
+            "masks",
+            "masks_logits",
+            "scores",
+            "prompts",
+            "batch_results",
+        ]
         for key in keys_to_del:
             if key in state:
                 del state[key]
@@ -0,0 +1,367 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
+
+"""
+Chunked inference on long videos with parallel workers.
+
+A single `propagate_in_video` run is sequential over the frames of a video, so its
+wall-clock time grows with the video length. `Sam3LongVideoPredictor` splits a video
+into overlapping temporal chunks, runs a `Sam3VideoPredictor` session on each chunk
+in a pool of worker processes (one per GPU by default), and stitches the object
+identities of consecutive chunks by matching their masks on the overlapping frames
+(with `sam3.perflib.associate_det_trk`). The wall-clock time then scales with the
+number of frames per worker instead of the video length.
+
+Each chunk is processed independently with the text prompt added on its first frame,
+so objects are re-detected at the start of each chunk; the overlapping frames give
+the tracker of the next chunk time to settle before its outputs are used.
+"""
+
+import multiprocessing as mp
+import os
+import queue
+import sys
+from collections import Counter
+from typing import List, Optional
+
+import numpy as np
+import psutil
+import torch
+
+from sam3.logger import get_logger
+from sam3.model.io_utils import _list_image_folder_frames, get_video_frame_count_and_fps
+from sam3.perflib.associate_det_trk import associate_det_trk
+
+logger = get_logger(__name__)
+
+
+def get_chunk_ranges(num_frames, chunk_size, overlap):
+    """
+    Split `num_frames` frames into chunks of `chunk_size` frames where consecutive
+    chunks share `overlap` frames. Returns a list of `(start, end)` frame ranges.
+    """
+    if not 0 <= overlap < chunk_size:
+        raise ValueError(f"expected 0 <= {overlap=} < {chunk_size=}")
+    chunk_stride = chunk_size - overlap
+    chunk_ranges = []
+    start = 0
+    while True:
+        end = min(start + chunk_size, num_frames)
+        chunk_ranges.append((start, end))
+        if end == num_frames:
+            return chunk_ranges
+        start += chunk_stride
+
+
+def stitch_chunk_obj_ids(prev_outputs, next_outputs, iou_threshold=0.5):
+    """
+    Match the objects of two consecutive chunks by their masks on the frames where
+    they overlap. `prev_outputs` and `next_outputs` are the outputs of each chunk on
+    the same overlapping frames (as returned by `propagate_in_video`).
+
+    On each frame, the masks of the next chunk are associated with those of the
+    previous chunk with `associate_det_trk`, and each match above `iou_threshold`
+    counts as a vote for this pair of objects. The pairs are then matched one-to-one
+    in decreasing number of votes. Returns a dict from the object ids of the next
+    chunk to their matching object ids in the previous chunk.
+    """
+    votes = Counter()
+    for prev_out, next_out in zip(prev_outputs, next_outputs):
+        prev_obj_ids = prev_out["out_obj_ids"].tolist()
+        next_obj_ids = next_out["out_obj_ids"].tolist()
+        if len(prev_obj_ids) == 0 or len(next_obj_ids) == 0:
+            continue
+        _, _, det_to_matched_trk, _ = associate_det_trk(
+            det_masks=torch.from_numpy(next_out["out_binary_masks"]),
+            track_masks=torch.from_numpy(prev_out["out_binary_masks"]),
+            iou_threshold=iou_threshold,
+            iou_threshold_trk=iou_threshold,
+            det_scores=torch.from_numpy(next_out["out_probs"]),
+        )
+        for d, matched_trk_inds in det_to_matched_trk.items():
+            for t in matched_trk_inds:
+                votes[next_obj_ids[d], prev_obj_ids[t]] += 1
+
+    next_to_prev_obj_id = {}
+    matched_prev_obj_ids = set()
+    for (next_obj_id, prev_obj_id), _ in votes.most_common():
+        if next_obj_id in next_to_prev_obj_id or prev_obj_id in matched_prev_obj_ids:
+            continue
+        next_to_prev_obj_id[next_obj_id] = prev_obj_id
+        matched_prev_obj_ids.add(prev_obj_id)
+    return next_to_prev_obj_id
+
+
+def load_chunk_frames(resource_path, start, end):
+    """
+    Load frames `start` to `end` (exclusive, or to the last frame if `end` is None)
+    of a video file or a JPEG folder as a list of frames accepted by
+    `Sam3VideoPredictor.start_session`. Fewer frames are returned if the video ends
+    before `end`. Image files are opened lazily (PIL only decodes them when the
+    session preprocesses them).
+    """
+    from PIL import Image
+
+    if os.path.isdir(resource_path):
+        img_paths = _list_image_folder_frames(resource_path)
+        return [Image.open(img_path) for img_path in img_paths[start:end]]
+
+    import cv2
+
+    cap = cv2.VideoCapture(resource_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Failed to open video: {resource_path}")
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        frames = []
+        while end is None or start + len(frames) < end:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    finally:
+        cap.release()
+    return frames
+
+
+class Sam3LongVideoPredictor:
+    """
+    Run text-prompted video inference on a long video (a video file or a folder of
+    JPEG frames) in overlapping chunks processed in parallel by worker processes.
+    Each worker holds its own `Sam3VideoPredictor` (and its own copy of the model).
+    """
+
+    def __init__(
+        self,
+        *model_args,
+        gpus_to_use: Optional[List[int]] = None,
+        num_workers_per_gpu: int = 1,
+        chunk_size: int = 300,
+        overlap: int = 16,
+        stitch_iou_threshold: float = 0.5,
+        **model_kwargs,
+    ):
+        """
+        The workers are spread over `gpus_to_use` (all visible GPUs by default), with
+        `num_workers_per_gpu` workers per GPU. `model_args` and `model_kwargs` are
+        passed to `Sam3VideoPredictor` in each worker.
+
+        Videos are split into chunks of `chunk_size` frames, with `overlap` frames
+        shared by consecutive chunks to stitch their object identities (objects are
+        matched if their masks have an IoU of at least `stitch_iou_threshold`).
+        """
+        if gpus_to_use is None:
+            gpus_to_use = list(range(torch.cuda.device_count()))
+        assert len(gpus_to_use) > 0, "at least one GPU is needed"
+        assert num_workers_per_gpu > 0
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.stitch_iou_threshold = stitch_iou_threshold
+        # validate the chunk parameters early
+        get_chunk_ranges(chunk_size, chunk_size, overlap)
+
+        mp_ctx = mp.get_context("spawn")
+        self.task_queue = mp_ctx.Queue()
+        self.result_queue = mp_ctx.Queue()
+        self.workers = []
+        parent_pid = os.getpid()
+        for gpu_id in gpus_to_use:
+            for _ in range(num_workers_per_gpu):
+                worker = mp_ctx.Process(
+                    target=Sam3LongVideoPredictor._worker_loop,
+                    args=(
+                        gpu_id,
+                        self.task_queue,
+                        self.result_queue,
+                        model_args,
+                        model_kwargs,
+                        parent_pid,
+                    ),
+                    daemon=True,
+                )
+                worker.start()
+                self.workers.append(worker)
+        # wait for all the workers to load the model
+        for _ in self.workers:
+            # a large timeout to cover potentially long model loading time
+            self._get_result(timeout=7200)
+        logger.info(f"started {len(self.workers)} long-video workers")
+        self.has_shutdown = False
+        # results of chunks from an earlier (e.g. aborted) call are discarded
+        self._run_id = 0
+
+    def propagate_in_video(self, resource_path, text):
+        """
+        Detect and track the objects of the text prompt `text` on all frames of
+        `resource_path`, and yield `{"frame_index": ..., "outputs": ...}` for each
+        frame in order (with the outputs as in `Sam3VideoPredictor`). Object ids are
+        consistent across the whole video.
+
+        The chunks are planned from the frame count reported by the video container,
+        which can be inaccurate: the last chunk is read to the actual end of the video
+        (so it may be longer than `chunk_size`), and if the video ends earlier than
+        reported, the frames are yielded up to its actual last frame.
+        """
+        if self.has_shutdown:
+            raise RuntimeError(
+                "cannot handle request after the predictor has shutdown; please create a new predictor"
+            )
+        num_frames, _ = get_video_frame_count_and_fps(resource_path)
+        chunk_ranges = get_chunk_ranges(num_frames, self.chunk_size, self.overlap)
+        logger.info(
+            f"processing {num_frames} frames of {resource_path} in "
+            f"{len(chunk_ranges)} chunks on {len(self.workers)} workers"
+        )
+        self._run_id += 1
+        for chunk_idx, (start, end) in enumerate(chunk_ranges):
+            # read the last chunk to the end, in case the frame count is underestimated
+            is_last_chunk = chunk_idx == len(chunk_ranges) - 1
+            self.task_queue.put(
+                (
+                    self._run_id,
+                    chunk_idx,
+                    resource_path,
+                    start,
+                    None if is_last_chunk else end,
+                    text,
+                )
+            )
+
+        # chunks may finish out of order, so we hold their outputs until all the
+        # chunks before them have been stitched and yielded
+        finished_chunks = {}
+        next_global_obj_id = 0
+        prev_to_global_obj_id = {}
+        prev_overlap_outputs = None
+        for chunk_idx, (start, end) in enumerate(chunk_ranges):
+            while chunk_idx not in finished_chunks:
+                run_id, finished_chunk_idx, chunk_outputs = self._get_result()
+                if run_id != self._run_id:
+                    continue
+                if isinstance(chunk_outputs, Exception):
+                    raise RuntimeError(
+                        f"failed to process chunk {finished_chunk_idx}"
+                    ) from chunk_outputs
+                finished_chunks[finished_chunk_idx] = chunk_outputs
+            chunk_outputs = finished_chunks.pop(chunk_idx)
+
+            # map the object ids of this chunk to global ones, continuing the
+            # objects matched to the previous chunk on the overlapping frames
+            to_global_obj_id = {}
+            if prev_overlap_outputs is not None:
+                num_overlap = len(prev_overlap_outputs)
+                next_to_prev_obj_id = stitch_chunk_obj_ids(
+                    prev_overlap_outputs,
+                    chunk_outputs[:num_overlap],
+                    iou_threshold=self.stitch_iou_threshold,
+                )
+                for obj_id, prev_obj_id in next_to_prev_obj_id.items():
+                    to_global_obj_id[obj_id] = prev_to_global_obj_id[prev_obj_id]
+            for outputs in chunk_outputs:
+                for obj_id in outputs["out_obj_ids"].tolist():
+                    if obj_id not in to_global_obj_id:
+                        to_global_obj_id[obj_id] = next_global_obj_id
+                        next_global_obj_id += 1
+
+            # yield the frames of this chunk through its end, except the overlapping
+            # frames already yielded from the previous chunk (whose tracking has
+            # settled on them, unlike this chunk's that just started)
+            num_skip = 0 if chunk_idx == 0 else self.overlap
+            for t in range(num_skip, len(chunk_outputs)):
+                outputs = dict(chunk_outputs[t])
+                outputs["out_obj_ids"] = np.array(
+                    [to_global_obj_id[i] for i in outputs["out_obj_ids"].tolist()],
+                    dtype=np.int64,
+                )
+                yield {"frame_index": start + t, "outputs": outputs}
+            # keep the chunk-local object ids of the overlapping frames to stitch
+            # the next chunk
+            prev_overlap_outputs = chunk_outputs[len(chunk_outputs) - self.overlap :]
+            prev_to_global_obj_id = to_global_obj_id
+            if len(chunk_outputs) < end - start:
+                # the video ends earlier than its reported frame count, so the next
+                # chunks are empty (their results are discarded by the next run)
+                break
+
+    def _get_result(self, timeout=None, poll_interval=5.0):
+        """
+        Get the next item from the result queue, waiting up to `timeout` seconds
+        (forever by default). Raises `RuntimeError` if a worker process died, as
+        the results of its chunks would then never arrive.
+        """
+        waited = 0.0
+        while True:
+            try:
+                return self.result_queue.get(timeout=poll_interval)
+            except queue.Empty:
+                pass
+            dead_workers = [w for w in self.workers if not w.is_alive()]
+            if len(dead_workers) > 0:
+                exitcodes = [w.exitcode for w in dead_workers]
+                raise RuntimeError(
+                    f"{len(dead_workers)} long-video worker(s) died "
+                    f"(exit codes: {exitcodes})"
+                )
+            waited += poll_interval
+            if timeout is not None and waited >= timeout:
+                raise RuntimeError(f"no result from the workers after {timeout}s")
+
+    @staticmethod
+    def _worker_loop(
+        gpu_id, task_queue, result_queue, model_args, model_kwargs, parent_pid
+    ):
+        """Load a predictor on GPU `gpu_id` and process chunks from `task_queue`."""
+        # each worker runs a single-GPU predictor
+        os.environ["RANK"] = "0"
+        os.environ["WORLD_SIZE"] = "1"
+        torch.cuda.set_device(gpu_id)
+        from sam3.model.sam3_video_predictor import Sam3VideoPredictor
+
+        predictor = Sam3VideoPredictor(*model_args, **model_kwargs)
+        result_queue.put(("load_model", os.getpid()))
+
+        while True:
+            try:
+                task = task_queue.get(timeout=5.0)
+            except queue.Empty:
+                # exit if the main process was killed without shutting down the workers
+                if not psutil.pid_exists(parent_pid):
+                    sys.exit(1)
+                continue
+            if task == "shutdown":
+                sys.exit(0)
+
+            run_id, chunk_idx, resource_path, start, end, text = task
+            logger.debug(f"GPU {gpu_id} processing frames {start} to {end}")
+            session_id = None
+            try:
+                frames = load_chunk_frames(resource_path, start, end)
+                if len(frames) == 0:
+                    # the video ends before this chunk (its frame count was overestimated)
+                    result_queue.put((run_id, chunk_idx, []))
+                    continue
+                session_id = predictor.start_session(resource_path=frames)["session_id"]
+                predictor.add_prompt(session_id, frame_idx=0, text=text)
+                chunk_outputs = [None] * len(frames)
+                for response in predictor.propagate_in_video(
+                    session_id,
+                    propagation_direction="forward",
+                    start_frame_idx=0,
+                    max_frame_num_to_track=None,
+                ):
+                    chunk_outputs[response["frame_index"]] = response["outputs"]
+                result_queue.put((run_id, chunk_idx, chunk_outputs))
+            except Exception as e:
+                logger.error(f"failed to process chunk {chunk_idx}", exc_info=True)
+                # send the error as a string, as not all exceptions can be pickled
+                result_queue.put((run_id, chunk_idx, RuntimeError(repr(e))))
+            finally:
+                if session_id is not None:
+                    predictor.close_session(session_id)
+
+    def shutdown(self):
+        """Shutdown all worker processes."""
+        for _ in self.workers:
+            self.task_queue.put("shutdown")
+        for worker in self.workers:
+            worker.join()
+        self.has_shutdown = True
@@ -536,6 +536,18 @@ class Sam3TrackerBase(torch.nn.Module):
             step = r
             must_include = frame_idx + 1
 
+        # frames without outputs are skipped below, so we don't need to scan beyond the
+        # outermost frame with outputs (e.g. on live streams, where the outputs of old
+        # frames are dropped, the scan would otherwise go back to the first frame)
+        non_cond_frame_outputs = output_dict["non_cond_frame_outputs"]
+        if len(non_cond_frame_outputs) < abs(end - start) // r:
+            if len(non_cond_frame_outputs) == 0:
+                end = start
+            elif not track_in_reverse:
+                end = max(end, min(non_cond_frame_outputs) - 1)
+            else:
+                end = min(end, max(non_cond_frame_outputs) + 1)
+
         valid_indices = []
         for i in range(start, end, step):
             if (
@@ -650,8 +662,8 @@ class Sam3TrackerBase(torch.nn.Module):
                 t_pos_and_prevs.append((t_pos, out, False))
 
             for t_pos, prev, is_selected_cond_frame in t_pos_and_prevs:
-                if prev is None:
-                    continue  # skip padding frames
+                if prev is None or prev["maskmem_features"] is None:
+                    continue  # skip padding frames (and frames with evicted memory)
                 # "maskmem_features" might have been offloaded to CPU in demo use cases,
                 # so we load it back to GPU (it's a no-op if it's already on GPU).
                 feats = prev["maskmem_features"].cuda(non_blocking=True)
@@ -729,7 +741,9 @@ class Sam3TrackerBase(torch.nn.Module):
                     t, unselected_cond_outputs.get(t, None)
                 )
                 if out is not None:
-                    pos_and_ptrs.append((t_diff, out["obj_ptr"], False))
+                    # the object pointer might have been offloaded to CPU on long videos
+                    obj_ptr = out["obj_ptr"].to(device, non_blocking=True)
+                    pos_and_ptrs.append((t_diff, obj_ptr, False))
 
             # If we have at least one object pointer, add them to the across attention
             if len(pos_and_ptrs) > 0:
@@ -5,6 +5,8 @@ from collections import OrderedDict
 
 import torch
 
+from sam3.model.feature_cache import FrameFeatureCache
+from sam3.model.frame_prefetcher import FramePrefetcher
 from sam3.model.sam3_tracker_base import concat_points, NO_OBJ_SCORE, Sam3TrackerBase
 from sam3.model.sam3_tracker_utils import fill_holes_in_mask_scores
 from sam3.model.utils.sam2_utils import load_video_frames
@@ -35,16 +37,25 @@ class Sam3TrackerPredictor(Sam3TrackerBase):
         # - if it's set to 0 or negative, this option is turned off and we use all points in the prompt encoder
         max_point_num_in_prompt_enc=16,
         non_overlap_masks_for_output=True,
+        # bounded-memory tracking for long videos and streams: what to do with the non-conditioning frame outputs that
+        # fall behind the memory attention window during `propagate_in_video` (see `_evict_non_cond_mem_outside_window`)
+        # - None: keep them as they are (the state grows linearly with the number of tracked frames)
+        # - "offload": move them to CPU memory, so that re-tracking or refining any frame later gives the same results
+        # - "evict": drop their memory features and move the remaining (small) outputs to CPU memory; the previous
+        #   masks of these frames are still available for refinement, but they are no longer used as memory
+        non_cond_mem_eviction=None,
         # checkpoint_file=None,
         **kwargs,
     ):
         super().__init__(**kwargs)
+        assert non_cond_mem_eviction in (None, "offload", "evict")
         self.clear_non_cond_mem_around_input = clear_non_cond_mem_around_input
         self.clear_non_cond_mem_for_multi_obj = clear_non_cond_mem_for_multi_obj
         self.fill_hole_area = fill_hole_area
         self.always_start_from_first_ann_frame = always_start_from_first_ann_frame
         self.max_point_num_in_prompt_enc = max_point_num_in_prompt_enc
         self.non_overlap_masks_for_output = non_overlap_masks_for_output
+        self.non_cond_mem_eviction = non_cond_mem_eviction
 
         self.bf16_context = torch.autocast(device_type="cuda", dtype=torch.bfloat16)
         self.bf16_context.__enter__()  # keep using for the entire model process
@@ -88,6 +99,9 @@ class Sam3TrackerPredictor(Sam3TrackerBase):
                 async_loading_frames=async_loading_frames,
                 compute_device=inference_state["storage_device"],
             )
+            if offload_video_to_cpu and isinstance(images, torch.Tensor):
+                # copy the upcoming frames to GPU in the background during propagation
+                images = FramePrefetcher(images, device=self.device)
             inference_state["images"] = images
             inference_state["num_frames"] = len(images)
             inference_state["video_height"] = video_height
@@ -102,7 +116,7 @@ class Sam3TrackerPredictor(Sam3TrackerBase):
         inference_state["mask_inputs_per_obj"] = {}
         # visual features on a small number of recently visited frames for quick interactions
         inference_state["cached_features"] = (
-            {} if cached_features is None else cached_features
+            FrameFeatureCache() if cached_features is None else cached_features
         )
         # values that don't change across frames (so we only need to hold one copy of them)
         inference_state["constants"] = {}
@@ -131,6 +145,9 @@ class Sam3TrackerPredictor(Sam3TrackerBase):
         # metadata for each tracking frame (e.g. which direction it's tracked)
         inference_state["tracking_has_started"] = False
         inference_state["frames_already_tracked"] = {}
+        # tracked non-conditioning frames whose outputs are still fully kept on the
+        # storage device (only used when `non_cond_mem_eviction` is set)
+        inference_state["resident_non_cond_frame_inds"] = set()
         self.clear_all_points_in_video(inference_state)
         return inference_state
 
@@ -857,12 +874,18 @@ class Sam3TrackerPredictor(Sam3TrackerBase):
                 )
                 obj_scores = current_out["object_score_logits"]
                 output_dict[storage_key][frame_idx] = current_out
+                if self.non_cond_mem_eviction is not None:
+                    inference_state["resident_non_cond_frame_inds"].add(frame_idx)
             # Create slices of per-object outputs for subsequent interaction with each
             # individual object after tracking.
             self._add_output_per_object(
                 inference_state, frame_idx, current_out, storage_key
             )
             inference_state["frames_already_tracked"][frame_idx] = {"reverse": reverse}
+            if self.non_cond_mem_eviction is not None:
+                self._evict_non_cond_mem_outside_window(
+                    inference_state, frame_idx, reverse
+                )
 
             # Resize the output mask to the original video resolution (we directly use
             # the mask scores on GPU for output to avoid any CPU conversion in between)
@@ -1003,6 +1026,7 @@ class Sam3TrackerPredictor(Sam3TrackerBase):
         inference_state["output_dict"]["non_cond_frame_outputs"].clear()
         inference_state["consolidated_frame_inds"]["cond_frame_outputs"].clear()
         inference_state["consolidated_frame_inds"]["non_cond_frame_outputs"].clear()
+        inference_state["resident_non_cond_frame_inds"].clear()
         inference_state["tracking_has_started"] = False
         inference_state["frames_already_tracked"].clear()
         inference_state["first_ann_frame_idx"] = None
@@ -1010,9 +1034,13 @@ class Sam3TrackerPredictor(Sam3TrackerBase):
     def _get_image_feature(self, inference_state, frame_idx, batch_size):
         """Compute the image features on a given frame."""
         # Look up in the cache
-        image, backbone_out = inference_state["cached_features"].get(
-            frame_idx, (None, None)
-        )
+        cached_features = inference_state["cached_features"]
+        if isinstance(cached_features, FrameFeatureCache) and self.backbone is not None:
+            # count hits and misses where a miss means running the backbone
+            cached = cached_features.lookup(frame_idx)
+        else:
+            cached = cached_features.get(frame_idx, None)
+        image, backbone_out = cached if cached is not None else (None, None)
         if backbone_out is None:
             if self.backbone is None:
                 raise RuntimeError(
@@ -1023,9 +1051,15 @@ class Sam3TrackerPredictor(Sam3TrackerBase):
                 # Cache miss -- we will run inference on a single image
                 image = inference_state["images"][frame_idx].cuda().float().unsqueeze(0)
                 backbone_out = self.forward_image(image)
-                # Cache the most recent frame's feature (for repeated interactions with
-                # a frame; we can use an LRU cache for more frames in the future).
-                inference_state["cached_features"] = {frame_idx: (image, backbone_out)}
+                # Cache the frame's feature for repeated interactions with it (an LRU
+                # `FrameFeatureCache` keeps several recent frames within its byte budget,
+                # while a plain dict only keeps the most recent frame)
+                if isinstance(cached_features, FrameFeatureCache):
+                    cached_features[frame_idx] = (image, backbone_out)
+                else:
+                    inference_state["cached_features"] = {
+                        frame_idx: (image, backbone_out)
+                    }
         if "tracker_backbone_out" in backbone_out:
             backbone_out = backbone_out["tracker_backbone_out"]  # get backbone output
 
@@ -1249,10 +1283,14 @@ class Sam3TrackerPredictor(Sam3TrackerBase):
         # Step 3: For packed tensor storage, we index the remaining ids and rebuild the per-object slices.
         def _slice_state(output_dict, storage_key):
             for frame_idx, out in output_dict[storage_key].items():
-                out["maskmem_features"] = out["maskmem_features"][remain_old_obj_inds]
-                out["maskmem_pos_enc"] = [
-                    x[remain_old_obj_inds] for x in out["maskmem_pos_enc"]
-                ]
+                # (the memory features of evicted non-conditioning frames are None)
+                if out["maskmem_features"] is not None:
+                    out["maskmem_features"] = out["maskmem_features"][
+                        remain_old_obj_inds
+                    ]
+                    out["maskmem_pos_enc"] = [
+                        x[remain_old_obj_inds] for x in out["maskmem_pos_enc"]
+                    ]
                 # "maskmem_pos_enc" is the same across frames, so we only need to store one copy of it
                 out["maskmem_pos_enc"] = self._get_maskmem_pos_enc(inference_state, out)
                 out["pred_masks"] = out["pred_masks"][remain_old_obj_inds]
@@ -1296,6 +1334,111 @@ class Sam3TrackerPredictor(Sam3TrackerBase):
 
         return inference_state["obj_ids"], updated_frames
 
+    def _evict_non_cond_mem_outside_window(self, inference_state, frame_idx, reverse):
+        """
+        Offload or evict (according to `non_cond_mem_eviction`) the outputs of those
+        non-conditioning frames that fell behind the memory attention window after
+        tracking `frame_idx`. This keeps the GPU memory of the inference state constant
+        on long videos and streams, instead of growing with every tracked frame.
+
+        A frame stays resident as long as `_prepare_memory_conditioned_features` can
+        still read it when tracking the next frames in the same direction, i.e. if it's
+        within `r * num_maskmem` frames (spatial memories) or `max_obj_ptrs_in_encoder`
+        frames (object pointers) of the current frame, or, with memory selection, if
+        `frame_filter` could still select it. Conditioning frames and frames holding
+        consolidated user inputs are never evicted.
+        """
+        resident_frame_inds = inference_state["resident_non_cond_frame_inds"]
+        r = self.memory_temporal_stride_for_eval
+        window = max(r * self.num_maskmem, self.max_obj_ptrs_in_encoder)
+        tpos_sign_mul = -1 if reverse else 1
+        # frames that fell behind the window, starting from the temporally closest one
+        frame_inds_to_check = sorted(
+            (
+                t
+                for t in resident_frame_inds
+                if (frame_idx - t) * tpos_sign_mul > window
+            ),
+            key=lambda t: (frame_idx - t) * tpos_sign_mul,
+        )
+        if len(frame_inds_to_check) == 0:
+            return
+
+        non_cond_frame_outputs = inference_state["output_dict"][
+            "non_cond_frame_outputs"
+        ]
+        consolidated_frame_inds = inference_state["consolidated_frame_inds"]
+        # `frame_filter` scans every r-th frame backwards from the current frame and
+        # selects the closest (max_num - 1) frames above `mf_threshold`, so for each
+        # offset modulo r, only the closest such frames can still be selected later
+        max_num_selected = (
+            min(inference_state["num_frames"], self.max_obj_ptrs_in_encoder) - 1
+        )
+        num_selected_per_offset = {}
+        for t in frame_inds_to_check:
+            out = non_cond_frame_outputs.get(t, None)
+            if out is None or t in consolidated_frame_inds["non_cond_frame_outputs"]:
+                # already removed (e.g. cleared around an input) or holding user inputs
+                resident_frame_inds.discard(t)
+                continue
+            if self.use_memory_selection and out["eff_iou_score"] > self.mf_threshold:
+                num_selected = num_selected_per_offset.get(t % r, 0)
+                if num_selected < max_num_selected:
+                    num_selected_per_offset[t % r] = num_selected + 1
+                    continue
+
+            if self.non_cond_mem_eviction == "offload":
+                maskmem_features = out["maskmem_features"]
+                if maskmem_features is not None:
+                    maskmem_features = maskmem_features.cpu()
+                # "maskmem_pos_enc" is the same across frames, so we only keep a view of the shared copy
+                maskmem_pos_enc = self._get_maskmem_pos_enc(inference_state, out)
+            else:
+                maskmem_features = None
+                maskmem_pos_enc = None
+            evicted_out = {
+                "maskmem_features": maskmem_features,
+                "maskmem_pos_enc": maskmem_pos_enc,
+                "pred_masks": out["pred_masks"].cpu(),
+                "obj_ptr": out["obj_ptr"].cpu(),
+                "object_score_logits": out["object_score_logits"].cpu(),
+            }
+            if self.use_memory_selection:
+                evicted_out["iou_score"] = out["iou_score"].cpu()
+                evicted_out["eff_iou_score"] = out["eff_iou_score"].cpu()
+            non_cond_frame_outputs[t] = evicted_out
+            # rebuild the per-object slices so that they no longer hold the device tensors
+            self._add_output_per_object(
+                inference_state, t, evicted_out, "non_cond_frame_outputs"
+            )
+            resident_frame_inds.discard(t)
+
+    def remove_frames_before(self, inference_state, frame_idx):
+        """
+        Drop the tracking outputs of all non-conditioning frames before `frame_idx`.
+        This is used on live streams (tracked forward only), where the frames far
+        behind the current one are no longer needed, to keep the inference state
+        constant instead of growing with every tracked frame. Conditioning frames
+        and frames holding consolidated user inputs are kept.
+        """
+        consolidated_frame_inds = inference_state["consolidated_frame_inds"]
+
+        def _remove_frames(frame_outputs):
+            for t in [t for t in frame_outputs if t < frame_idx]:
+                if t not in consolidated_frame_inds["non_cond_frame_outputs"]:
+                    del frame_outputs[t]
+
+        _remove_frames(inference_state["output_dict"]["non_cond_frame_outputs"])
+        for obj_output_dict in inference_state["output_dict_per_obj"].values():
+            _remove_frames(obj_output_dict["non_cond_frame_outputs"])
+        frames_already_tracked = inference_state["frames_already_tracked"]
+        for t in [t for t in frames_already_tracked if t < frame_idx]:
+            del frames_already_tracked[t]
+        resident_frame_inds = inference_state["resident_non_cond_frame_inds"]
+        resident_frame_inds.difference_update(
+            [t for t in resident_frame_inds if t < frame_idx]
+        )
+
     def _clear_non_cond_mem_around_input(self, inference_state, frame_idx):
         """
         Remove the non-conditioning memory around the input frame. When users provide
@@ -19,9 +19,14 @@ from sam3 import perflib
 from sam3.logger import get_logger
 from sam3.model.box_ops import fast_diag_box_iou
 from sam3.model.data_misc import BatchedDatapoint
+from sam3.model.feature_cache import FrameFeatureCache
+from sam3.model.frame_prefetcher import FramePrefetcher
+from sam3.model.io_utils import RankShardedVideoFrames
 from sam3.model.sam3_tracker_utils import fill_holes_in_mask_scores, mask_to_box
+from sam3.model.text_embedding_cache import encode_text_cached
+from sam3.perflib.associate_det_trk import match_det_trk
 from sam3.perflib.masks_ops import mask_iou
-from sam3.train.masks_ops import rle_encode
+from sam3.perflib.rle import rle_encode
 from torch import nn, Tensor
 
 logger = get_logger(__name__)
@@ -322,8 +327,9 @@ class Sam3VideoBase(nn.Module):
         # Step 1: if text feature is not cached in `feature_cache`, compute and cache it
         text_batch_key = tuple(input_batch.find_text_batch)
         if "text" not in feature_cache or text_batch_key not in feature_cache["text"]:
-            text_outputs = self.detector.backbone.forward_text(
-                input_batch.find_text_batch, device=self.device
+            # (the process-wide text embedding cache is shared across sessions)
+            text_outputs = encode_text_cached(
+                self.detector.backbone, input_batch.find_text_batch, device=self.device
             )
             # note: we only cache the text feature of the most recent prompt
             feature_cache["text"] = {text_batch_key: text_outputs}
@@ -374,6 +380,8 @@ class Sam3VideoBase(nn.Module):
             "bbox": pred_boxes_xyxy[pos_pred_idx[0], pos_pred_idx[1]],
             "mask": pred_masks[pos_pred_idx[0], pos_pred_idx[1]],
             "scores": pred_probs[pos_pred_idx[0], pos_pred_idx[1]],
+            # index of the text prompt (in `find_text_batch`) of each detection
+            "prompt_ids": pos_pred_idx[0],
         }
 
         # Step 3: build SAM2 backbone features and store them in `feature_cache`
@@ -390,12 +398,22 @@ class Sam3VideoBase(nn.Module):
             "backbone_fpn": tracker_backbone_fpn,
         }
         backbone_cache["tracker_backbone_out"] = tracker_backbone_out
-        feature_cache[frame_idx] = (
-            input_batch.img_batch[frame_idx],
-            backbone_cache,
-        )
+        img_batch = input_batch.img_batch
+        if isinstance(img_batch, RankShardedVideoFrames):
+            # the tracker gets its features above and doesn't need the image itself,
+            # so we don't decode the frames that this rank doesn't hold
+            image = img_batch.get_local_frame(frame_idx)
+        elif isinstance(img_batch, FramePrefetcher):
+            # keep the CPU copy of offloaded frames (the prefetcher tracks the frames
+            # accessed by the detector to prefetch the next ones)
+            image = img_batch.frames[frame_idx]
+        else:
+            image = img_batch[frame_idx]
+        feature_cache[frame_idx] = (image, backbone_cache)
         # remove from `feature_cache` old features to save GPU memory
-        feature_cache.pop(frame_idx - 1 if not reverse else frame_idx + 1, None)
+        # (a `FrameFeatureCache` evicts least recently used frames within its byte budget)
+        if not isinstance(feature_cache, FrameFeatureCache):
+            feature_cache.pop(frame_idx - 1 if not reverse else frame_idx + 1, None)
         return det_out
 
     def run_tracker_propagation(
@@ -520,6 +538,9 @@ class Sam3VideoBase(nn.Module):
             "obj_ids_all_gpu": None,  # will be filled later
             "num_obj_per_gpu": deepcopy(tracker_metadata_prev["num_obj_per_gpu"]),
             "obj_id_to_score": deepcopy(tracker_metadata_prev["obj_id_to_score"]),
+            "obj_id_to_prompt_id": deepcopy(
+                tracker_metadata_prev.get("obj_id_to_prompt_id", {})
+            ),
             "obj_id_to_tracker_score_frame_wise": deepcopy(
                 tracker_metadata_prev["obj_id_to_tracker_score_frame_wise"]
             ),
@@ -786,6 +807,11 @@ class Sam3VideoBase(nn.Module):
             tracker_metadata_new["obj_id_to_score"].update(
                 zip(new_det_obj_ids, det_scores_np[new_det_fa_inds])
             )
+            # remember which text prompt each new object was detected from
+            det_prompt_ids_np = det_out["prompt_ids"].cpu().numpy()
+            tracker_metadata_new["obj_id_to_prompt_id"].update(
+                zip(new_det_obj_ids, det_prompt_ids_np[new_det_fa_inds].tolist())
+            )
             # tracker scores are not available for new objects, use det score instead.
             tracker_metadata_new["obj_id_to_tracker_score_frame_wise"][
                 frame_idx
@@ -1220,72 +1246,45 @@ class Sam3VideoBase(nn.Module):
                 empty_trk_obj_ids,
             )
 
-        if det_masks.shape[-2:] != trk_masks.shape[-2:]:
-            # resize to the smaller size to save GPU memory
-            if np.prod(det_masks.shape[-2:]) < np.prod(trk_masks.shape[-2:]):
-                trk_masks = F.interpolate(
-                    trk_masks.unsqueeze(1),
-                    size=det_masks.shape[-2:],
-                    mode="bilinear",
-                    align_corners=False,
-                ).squeeze(1)
-            else:
-                # resize detections to track size
-                det_masks = F.interpolate(
-                    det_masks.unsqueeze(1),
-                    size=trk_masks.shape[-2:],
-                    mode="bilinear",
-                    align_corners=False,
-                ).squeeze(1)
-
-        det_masks_binary = det_masks > 0
-        trk_masks_binary = trk_masks > 0
-        ious = mask_iou(det_masks_binary, trk_masks_binary)  # (N, M)
-
-        ious_np = ious.cpu().numpy()
-        if self.o2o_matching_masklets_enable:
-            from scipy.optimize import linear_sum_assignment
-
-            # Hungarian matching for tracks (one-to-one: each track matches at most one detection)
-            cost_matrix = 1 - ious_np  # Hungarian solves for minimum cost
-            row_ind, col_ind = linear_sum_assignment(cost_matrix)
-            trk_is_matched = np.zeros(trk_masks.size(0), dtype=bool)
-            for d, t in zip(row_ind, col_ind):
-                if ious_np[d, t] >= iou_threshold_trk:
-                    trk_is_matched[t] = True
-        else:
-            trk_is_matched = (ious_np >= iou_threshold_trk).any(axis=0)
+        # IoUs, det -> track matches and Hungarian assignment, with a single DtoH sync
+        match = match_det_trk(
+            det_masks,
+            trk_masks,
+            iou_threshold=iou_threshold,
+            iou_threshold_trk=iou_threshold_trk,
+            hungarian=self.o2o_matching_masklets_enable,
+        )
+        ious_np = match.ious
         # Non-empty tracks not matched by Hungarian assignment above threshold are unmatched
-        trk_is_nonempty = trk_masks_binary.any(dim=(1, 2)).cpu().numpy()
-        trk_is_unmatched = np.logical_and(trk_is_nonempty, ~trk_is_matched)
+        trk_is_unmatched = np.logical_and(match.trk_is_nonempty, ~match.trk_is_matched)
         unmatched_trk_obj_ids = trk_obj_ids[trk_is_unmatched]
         # also record masklets that have zero area in SAM 2 prediction
-        empty_trk_obj_ids = trk_obj_ids[~trk_is_nonempty]
+        empty_trk_obj_ids = trk_obj_ids[~match.trk_is_nonempty]
 
         # For detections: allow many tracks to match to the same detection (many-to-one)
         # So, a detection is 'new' if it does not match any track above threshold
         is_new_det = np.logical_and(
-            det_scores_np >= new_det_thresh,
-            np.logical_not(np.any(ious_np >= iou_threshold, axis=1)),
+            det_scores_np >= new_det_thresh, ~match.det_has_match
         )
         new_det_fa_inds = np.nonzero(is_new_det)[0]
 
         # for each detection, which tracks it matched to (above threshold)
-        det_to_matched_trk_obj_ids = {}
-        trk_id_to_max_iou_high_conf_det = {}  # trk id --> exactly one detection idx
+        det_to_matched_trk_obj_ids = dict(
+            enumerate(match.det_to_matched_trk(trk_ids=trk_obj_ids))
+        )
+        # trk id --> exactly one detection idx (the last one if several)
         HIGH_CONF_THRESH = 0.8
         HIGH_IOU_THRESH = 0.8
         det_to_max_iou_trk_idx = np.argmax(ious_np, axis=1)
         det_is_high_conf = (det_scores_np >= HIGH_CONF_THRESH) & ~is_new_det
         det_is_high_iou = np.max(ious_np, axis=1) >= HIGH_IOU_THRESH
-        det_is_high_conf_and_iou = set(
-            np.nonzero(det_is_high_conf & det_is_high_iou)[0]
+        high_conf_det_inds = np.nonzero(det_is_high_conf & det_is_high_iou)[0]
+        trk_id_to_max_iou_high_conf_det = dict(
+            zip(
+                trk_obj_ids[det_to_max_iou_trk_idx[high_conf_det_inds]].tolist(),
+                high_conf_det_inds.tolist(),
+            )
         )
-        for d in range(det_masks.size(0)):
-            det_to_matched_trk_obj_ids[d] = trk_obj_ids[ious_np[d, :] >= iou_threshold]
-            if d in det_is_high_conf_and_iou:
-                trk_obj_id = trk_obj_ids[det_to_max_iou_trk_idx[d]].item()
-                trk_id_to_max_iou_high_conf_det[trk_obj_id] = d
 
         return (
             new_det_fa_inds,
@@ -1606,6 +1605,7 @@ class Sam3VideoBase(nn.Module):
             "num_obj_per_gpu": np.zeros(self.world_size, np.int64),
             "max_obj_id": -1,
             "obj_id_to_score": {},
+            "obj_id_to_prompt_id": {},
             "obj_id_to_tracker_score_frame_wise": defaultdict(dict),
             "obj_id_to_last_occluded": {},
         }
@@ -14,7 +14,15 @@ from sam3.model.act_ckpt_utils import clone_output_wrapper
 from sam3.model.box_ops import box_xywh_to_cxcywh, box_xyxy_to_xywh
 from sam3.model.data_misc import BatchedDatapoint, convert_my_tensors, FindStage
 from sam3.model.geometry_encoders import Prompt
-from sam3.model.io_utils import IMAGE_EXTS, load_resource_as_video_frames
+from sam3.model.feature_cache import DEFAULT_FEATURE_CACHE_MAX_BYTES, FrameFeatureCache
+from sam3.model.io_utils import (
+    get_video_frame_count_and_fps,
+    IMAGE_EXTS,
+    load_resource_as_video_frames,
+)
+from sam3.model.frame_prefetcher import FramePrefetcher
+from sam3.model.live_stream import LiveVideoFrames, PerFrameList
+from sam3.model.mask_store import FrameMaskStore
 from sam3.model.sam3_tracker_utils import fill_holes_in_mask_scores
 from sam3.model.sam3_video_base import MaskletConfirmationStatus, Sam3VideoBase
 from sam3.model.utils.misc import copy_data_to_device
@@ -36,6 +44,13 @@ class Sam3VideoInference(Sam3VideoBase):
         image_mean=(0.5, 0.5, 0.5),
         image_std=(0.5, 0.5, 0.5),
         compile_model=False,
+        cached_mask_codec="bitpack",
+        cached_mask_offload=None,
+        feature_cache_max_bytes=DEFAULT_FEATURE_CACHE_MAX_BYTES,
+        feature_cache_spill_to_cpu=False,
+        feature_cache_spill_dtype=None,
+        live_state_window=32,
+        num_prefetch_frames=2,
         **kwargs,
     ):
         """
@@ -43,12 +58,31 @@ class Sam3VideoInference(Sam3VideoBase):
         hotstart_unmatch_thresh: int, remove the object if it has this many unmatched frames within its hotstart_delay period.
             If `hotstart_delay` is set to 0, this parameter is ignored.
         hotstart_dup_thresh: int, remove the object if it has overlapped with another object this many frames within its hotstart_delay period.
+        cached_mask_codec: str, how the per-frame output masks in `inference_state["cached_frame_outputs"]` are
+            compressed, one of "dense", "bitpack" or "rle" (see `sam3.model.mask_store`).
+        cached_mask_offload: None, "cpu" or "disk", where the compressed cached masks are kept.
+        feature_cache_max_bytes: int, the byte budget of backbone features of recently visited frames
+            kept on GPU in `inference_state["feature_cache"]` (see `sam3.model.feature_cache`). Each frame
+            takes a few hundred MB per session; with the default of 0, only the most recent frame is kept.
+        feature_cache_spill_to_cpu: bool, whether to spill frames evicted from the feature cache to CPU memory.
+        feature_cache_spill_dtype: optional dtype (e.g. torch.bfloat16) to cast spilled features to.
+        live_state_window: int, the number of most recent frames whose inputs and states are kept in live
+            sessions (see `init_live_state`); it's raised to cover the hotstart delay and the tracker memory.
+        num_prefetch_frames: int, the number of upcoming frames copied ahead of time to GPU when video frames
+            are offloaded to CPU (see `sam3.model.frame_prefetcher`), 0 to copy each frame when it's needed.
         """
         super().__init__(**kwargs)
         self.image_size = image_size
         self.image_mean = image_mean
         self.image_std = image_std
         self.compile_model = compile_model
+        self.cached_mask_codec = cached_mask_codec
+        self.cached_mask_offload = cached_mask_offload
+        self.feature_cache_max_bytes = feature_cache_max_bytes
+        self.feature_cache_spill_to_cpu = feature_cache_spill_to_cpu
+        self.feature_cache_spill_dtype = feature_cache_spill_dtype
+        self.live_state_window = live_state_window
+        self.num_prefetch_frames = num_prefetch_frames
 
     @torch.inference_mode()
     def init_state(
@@ -57,8 +91,19 @@ class Sam3VideoInference(Sam3VideoBase):
         offload_video_to_cpu=False,
         async_loading_frames=False,
         video_loader_type="cv2",
+        frame_cache_dir=None,
+        shard_frames_across_ranks=False,
+        frame_stride=1,
     ):
-        """Initialize an inference state from `resource_path` (an image or a video)."""
+        """
+        Initialize an inference state from `resource_path` (an image or a video).
+        With `frame_cache_dir`, the preprocessed video frames are cached on disk and
+        shared (memory-mapped) by later sessions and processes on the same video.
+        With `shard_frames_across_ranks`, each rank in multi-GPU inference only loads
+        the video frames it runs the detector on.
+        With `frame_stride > 1`, the session only holds every `frame_stride`-th frame
+        of the video, i.e. session frame `t` is frame `t * frame_stride` of the video.
+        """
         images, orig_height, orig_width = load_resource_as_video_frames(
             resource_path=resource_path,
             image_size=self.image_size,
@@ -67,10 +112,33 @@ class Sam3VideoInference(Sam3VideoBase):
             img_std=self.image_std,
             async_loading_frames=async_loading_frames,
             video_loader_type=video_loader_type,
+            frame_cache_dir=frame_cache_dir,
+            frame_shard=(
+                (self.rank, self.world_size) if shard_frames_across_ranks else None
+            ),
+            frame_stride=frame_stride,
         )
+        if offload_video_to_cpu and isinstance(images, torch.Tensor):
+            # copy the upcoming frames to GPU in the background during propagation
+            images = FramePrefetcher(
+                images, device=self.device, num_prefetch=self.num_prefetch_frames
+            )
+        num_frames = len(images)
         inference_state = {}
         inference_state["image_size"] = self.image_size
-        inference_state["num_frames"] = len(images)
+        inference_state["num_frames"] = num_frames
+        # the subsampling of the video frames and the number of frames before it
+        inference_state["frame_stride"] = frame_stride
+        if frame_stride > 1:
+            num_source_frames, _ = get_video_frame_count_and_fps(resource_path)
+            # (the frame count reported by the container might be inaccurate)
+            num_source_frames = min(
+                max(num_source_frames, (num_frames - 1) * frame_stride + 1),
+                num_frames * frame_stride,
+            )
+        else:
+            num_source_frames = num_frames
+        inference_state["num_source_frames"] = num_source_frames
         # the original video height and width, used for resizing final output scores
         inference_state["orig_height"] = orig_height
         inference_state["orig_width"] = orig_width
@@ -78,22 +146,93 @@ class Sam3VideoInference(Sam3VideoBase):
         inference_state["constants"] = {}
         # inputs on each frame
         self._construct_initial_input_batch(inference_state, images)
-        # initialize extra states
+        self._init_extra_states(inference_state)
+        inference_state["is_image_only"] = is_image_type(resource_path)
+        return inference_state
+
+    @torch.inference_mode()
+    def init_live_state(self, offload_video_to_cpu=False):
+        """
+        Initialize an inference state for a live video stream (e.g. a camera feed).
+        Instead of loading a whole video up front, its frames are appended one at a
+        time with `add_live_frame` as they arrive, and `propagate_live` runs inference
+        on them. Only the inputs and states of the last `live_state_window` frames are
+        kept, so that the memory and per-frame latency stay constant on unbounded
+        streams (prompts can only be added on these frames).
+        """
+        images = LiveVideoFrames(
+            image_size=self.image_size,
+            offload_video_to_cpu=offload_video_to_cpu,
+            img_mean=self.image_mean,
+            img_std=self.image_std,
+        )
+        inference_state = {}
+        inference_state["image_size"] = self.image_size
+        inference_state["num_frames"] = 0
+        inference_state["frame_stride"] = 1
+        inference_state["num_source_frames"] = 0
+        # the original video height and width (set when the first frame is appended)
+        inference_state["orig_height"] = None
+        inference_state["orig_width"] = None
+        inference_state["constants"] = {}
+        self._construct_initial_input_batch(inference_state, images)
+        self._init_extra_states(inference_state)
+        inference_state["is_image_only"] = False
+        # the cursor and the hotstart buffer of the stream (see `propagate_live`)
+        inference_state["live_stream"] = {
+            "next_frame_idx": 0,
+            "hotstart_buffer": [],
+            "hotstart_removed_obj_ids": set(),
+            "unconfirmed_obj_ids_per_frame": {},
+            # final outputs of buffered frames flushed by `reset_state`, to be yielded
+            # by the next `propagate_live` call
+            "flushed_outputs": [],
+        }
+        return inference_state
+
+    def _init_extra_states(self, inference_state):
+        """Initialize the tracking states and caches of a new inference state."""
         inference_state["tracker_inference_states"] = []
         inference_state["tracker_metadata"] = {}
-        inference_state["feature_cache"] = {}
-        inference_state["cached_frame_outputs"] = {}
+        inference_state["feature_cache"] = FrameFeatureCache(
+            max_bytes=self.feature_cache_max_bytes,
+            spill_to_cpu=self.feature_cache_spill_to_cpu,
+            spill_dtype=self.feature_cache_spill_dtype,
+        )
+        inference_state["cached_frame_outputs"] = FrameMaskStore(
+            codec=self.cached_mask_codec, offload=self.cached_mask_offload
+        )
         inference_state["action_history"] = []  # for logging user actions
-        inference_state["is_image_only"] = is_image_type(resource_path)
-        return inference_state
 
     @torch.inference_mode()
     def reset_state(self, inference_state):
         """Revert `inference_state` to what it was right after initialization."""
-        inference_state["input_batch"].find_text_batch[0] = "<text placeholder>"
+        live_stream = inference_state.get("live_stream", None)
+        if live_stream is not None:
+            # finalize the outputs of the frames still held back for hotstart (before
+            # their objects are cleared), so that they are not lost
+            for frame_idx, out in live_stream["hotstart_buffer"]:
+                live_stream["flushed_outputs"].append(
+                    (
+                        frame_idx,
+                        self._postprocess_hotstart_output(
+                            inference_state,
+                            frame_idx,
+                            out,
+                            False,
+                            live_stream["hotstart_removed_obj_ids"],
+                            live_stream["unconfirmed_obj_ids_per_frame"],
+                        ),
+                    )
+                )
+        inference_state["input_batch"].find_text_batch = [
+            "<text placeholder>",
+            "visual",
+        ]
         inference_state["text_prompt"] = None
-        for t in range(inference_state["num_frames"]):
-            inference_state["input_batch"].find_inputs[t].text_ids[...] = 0
+        inference_state["text_prompts"] = []
+        self._set_find_text_ids(inference_state, [self.TEXT_ID_FOR_TEXT])
+        for t in self._get_held_frame_inds(inference_state):
             # constructing an output list in inference state (we start with an empty list)
             inference_state["previous_stages_out"][t] = None
             inference_state["per_frame_raw_point_input"][t] = None
@@ -109,72 +248,132 @@ class Sam3VideoInference(Sam3VideoBase):
         inference_state["feature_cache"].clear()
         inference_state["cached_frame_outputs"].clear()
         inference_state["action_history"].clear()  # for logging user actions
+        if live_stream is not None:
+            live_stream["hotstart_buffer"].clear()
+            live_stream["hotstart_removed_obj_ids"].clear()
+            live_stream["unconfirmed_obj_ids_per_frame"].clear()
 
     def _construct_initial_input_batch(self, inference_state, images):
         """Construct an initial `BatchedDatapoint` instance as input."""
         # 1) img_batch
         num_frames = len(images)
         device = self.device
+        # the per-frame inputs of live streams grow as frames are appended
+        is_live = isinstance(images, LiveVideoFrames)
+
+        def _per_frame_list(value):
+            return PerFrameList() if is_live else [value] * num_frames
 
         # 2) find_text_batch
         # "<text placeholder>" will be replaced by the actual text prompt when adding prompts
         find_text_batch = ["<text placeholder>", "visual"]
 
         # 3) find_inputs
-        input_box_embedding_dim = 258  # historical default
-        input_points_embedding_dim = 257  # historical default
-        stages = [
-            FindStage(
-                img_ids=[stage_id],
-                text_ids=[0],
-                input_boxes=[torch.zeros(input_box_embedding_dim)],
-                input_boxes_mask=[torch.empty(0, dtype=torch.bool)],
-                input_boxes_label=[torch.empty(0, dtype=torch.long)],
-                input_points=[torch.empty(0, input_points_embedding_dim)],
-                input_points_mask=[torch.empty(0)],
-                object_ids=[],
-            )
-            for stage_id in range(num_frames)
-        ]
-        for i in range(len(stages)):
-            stages[i] = convert_my_tensors(stages[i])
+        inference_state["find_text_ids"] = [self.TEXT_ID_FOR_TEXT]
+        if is_live:
+            stages = PerFrameList()
+        else:
+            stages = [
+                self._get_find_stage(stage_id, text_ids=[self.TEXT_ID_FOR_TEXT])
+                for stage_id in range(num_frames)
+            ]
 
         # construct the final `BatchedDatapoint` and cast to GPU
         input_batch = BatchedDatapoint(
             img_batch=images,
             find_text_batch=find_text_batch,
             find_inputs=stages,
-            find_targets=[None] * num_frames,
-            find_metadatas=[None] * num_frames,
+            find_targets=_per_frame_list(None),
+            find_metadatas=_per_frame_list(None),
         )
         input_batch = copy_data_to_device(input_batch, device, non_blocking=True)
         inference_state["input_batch"] = input_batch
 
         # construct the placeholder interactive prompts and tracking queries
-        bs = 1
-        inference_state["constants"]["empty_geometric_prompt"] = Prompt(
-            box_embeddings=torch.zeros(0, bs, 4, device=device),
-            box_mask=torch.zeros(bs, 0, device=device, dtype=torch.bool),
-            box_labels=torch.zeros(0, bs, device=device, dtype=torch.long),
-            point_embeddings=torch.zeros(0, bs, 2, device=device),
-            point_mask=torch.zeros(bs, 0, device=device, dtype=torch.bool),
-            point_labels=torch.zeros(0, bs, device=device, dtype=torch.long),
+        inference_state["constants"]["empty_geometric_prompt"] = (
+            self._get_empty_geometric_prompt(bs=1)
         )
 
         # constructing an output list in inference state (we start with an empty list)
-        inference_state["previous_stages_out"] = [None] * num_frames
+        inference_state["previous_stages_out"] = _per_frame_list(None)
         inference_state["text_prompt"] = None
-        inference_state["per_frame_raw_point_input"] = [None] * num_frames
-        inference_state["per_frame_raw_box_input"] = [None] * num_frames
-        inference_state["per_frame_visual_prompt"] = [None] * num_frames
-        inference_state["per_frame_geometric_prompt"] = [None] * num_frames
-        inference_state["per_frame_cur_step"] = [0] * num_frames
+        inference_state["text_prompts"] = []
+        inference_state["per_frame_raw_point_input"] = _per_frame_list(None)
+        inference_state["per_frame_raw_box_input"] = _per_frame_list(None)
+        inference_state["per_frame_visual_prompt"] = _per_frame_list(None)
+        inference_state["per_frame_geometric_prompt"] = _per_frame_list(None)
+        inference_state["per_frame_cur_step"] = _per_frame_list(0)
 
         # placeholders for cached outputs
         # (note: currently, a single visual prompt embedding is shared for all frames)
         inference_state["visual_prompt_embed"] = None
         inference_state["visual_prompt_mask"] = None
 
+    def _get_find_stage(self, frame_idx, text_ids):
+        """Get the detector queries on a frame (one per text id) without geometric inputs."""
+        input_box_embedding_dim = 258  # historical default
+        input_points_embedding_dim = 257  # historical default
+        stage = FindStage(
+            img_ids=[frame_idx] * len(text_ids),
+            text_ids=list(text_ids),
+            input_boxes=[torch.zeros(input_box_embedding_dim)],
+            input_boxes_mask=[torch.empty(0, dtype=torch.bool)],
+            input_boxes_label=[torch.empty(0, dtype=torch.long)],
+            input_points=[torch.empty(0, input_points_embedding_dim)],
+            input_points_mask=[torch.empty(0)],
+            object_ids=[],
+        )
+        return convert_my_tensors(stage)
+
+    def _get_held_frame_inds(self, inference_state):
+        """
+        Get the indices of the frames whose per-frame inputs are held in the inference
+        state, i.e. all frames, except in live sessions that drop their oldest frames.
+        """
+        find_inputs = inference_state["input_batch"].find_inputs
+        start = find_inputs.start if isinstance(find_inputs, PerFrameList) else 0
+        return range(start, inference_state["num_frames"])
+
+    def _get_empty_geometric_prompt(self, bs):
+        """Get a geometric prompt without any boxes or points for `bs` detector queries."""
+        device = self.device
+        return Prompt(
+            box_embeddings=torch.zeros(0, bs, 4, device=device),
+            box_mask=torch.zeros(bs, 0, device=device, dtype=torch.bool),
+            box_labels=torch.zeros(0, bs, device=device, dtype=torch.long),
+            point_embeddings=torch.zeros(0, bs, 2, device=device),
+            point_mask=torch.zeros(bs, 0, device=device, dtype=torch.bool),
+            point_labels=torch.zeros(0, bs, device=device, dtype=torch.long),
+        )
+
+    def _set_find_text_ids(self, inference_state, text_ids):
+        """
+        Set the text prompts (indices into `find_text_batch`) that the detector runs
+        on every frame. Each frame gets one detector query per text id, all pointing
+        to the same image, so that the backbone runs only once per frame and its
+        features are shared by all the text prompts.
+        """
+        num_queries = len(text_ids)
+        find_inputs = inference_state["input_batch"].find_inputs
+        frame_inds = self._get_held_frame_inds(inference_state)
+        if len(inference_state["find_text_ids"]) != num_queries:
+            for t in frame_inds:
+                img_ids = find_inputs[t].img_ids
+                find_inputs[t].img_ids = img_ids.new_full((num_queries,), t)
+                find_inputs[t].text_ids = img_ids.new_zeros(num_queries)
+            inference_state["constants"]["empty_geometric_prompt"] = (
+                self._get_empty_geometric_prompt(bs=num_queries)
+            )
+        # (the queries on frames appended later to a live stream are built from these)
+        inference_state["find_text_ids"] = list(text_ids)
+        if num_queries == 1:
+            for t in frame_inds:
+                find_inputs[t].text_ids[...] = text_ids[0]
+        else:
+            text_ids = torch.tensor(text_ids, device=self.device)
+            for t in frame_inds:
+                find_inputs[t].text_ids.copy_(text_ids)
+
     def _get_visual_prompt(self, inference_state, frame_idx, boxes_cxcywh, box_labels):
         """
         Handle the case of visual prompt. Currently, in the inference API we do not
@@ -280,11 +479,6 @@ class Sam3VideoInference(Sam3VideoBase):
 
         hotstart_buffer = []
         hotstart_removed_obj_ids = set()
-        # when deciding whether to output a masklet on `yield_frame_idx`, we check whether the object is confirmed
-        # in a future frame (`unconfirmed_frame_delay` frames after the current frame). For example, if we require
-        # an object to be detected in 3 consecutive frames to be confirmed, then we look 2 frames in the future --
-        # e.g., we output an object on frame 4 only if it becomes confirmed on frame 6.
-        unconfirmed_status_delay = self.masklet_confirmation_consecutive_det_thresh - 1
         unconfirmed_obj_ids_per_frame = {}  # frame_idx -> hidden_obj_ids
         for frame_idx in tqdm(
             processing_order, desc="propagate_in_video", disable=self.rank > 0
@@ -317,42 +511,285 @@ class Sam3VideoInference(Sam3VideoBase):
 
             for yield_frame_idx, yield_out in yield_list:
                 # post-process the output and yield it
+                postprocessed_out = self._postprocess_hotstart_output(
+                    inference_state,
+                    yield_frame_idx,
+                    yield_out,
+                    reverse,
+                    hotstart_removed_obj_ids,
+                    unconfirmed_obj_ids_per_frame,
+                )
+                yield yield_frame_idx, postprocessed_out
+
+    def _postprocess_hotstart_output(
+        self,
+        inference_state,
+        frame_idx,
+        out,
+        reverse,
+        hotstart_removed_obj_ids,
+        unconfirmed_obj_ids_per_frame,
+    ):
+        """
+        Post-process the output of a frame that leaves the hotstart buffer (hiding the
+        objects removed by hotstart, suppressed on this frame or not yet confirmed) and
+        cache it. Returns None on GPUs other than GPU 0.
+        """
+        if self.rank > 0:
+            return None  # no output on other GPUs
+
+        # when deciding whether to output a masklet on `frame_idx`, we check whether the object is confirmed
+        # in a future frame (`unconfirmed_frame_delay` frames after the current frame). For example, if we require
+        # an object to be detected in 3 consecutive frames to be confirmed, then we look 2 frames in the future --
+        # e.g., we output an object on frame 4 only if it becomes confirmed on frame 6.
+        unconfirmed_status_delay = self.masklet_confirmation_consecutive_det_thresh - 1
+        suppressed_obj_ids = out["suppressed_obj_ids"]
+        unconfirmed_status_frame_idx = (
+            frame_idx + unconfirmed_status_delay
+            if not reverse
+            else frame_idx - unconfirmed_status_delay
+        )
+
+        # Clamp the frame index to stay within video bounds
+        num_frames = inference_state["num_frames"]
+        unconfirmed_status_frame_idx = max(
+            0, min(unconfirmed_status_frame_idx, num_frames - 1)
+        )
+
+        unconfirmed_obj_ids = unconfirmed_obj_ids_per_frame.get(
+            unconfirmed_status_frame_idx, None
+        )
+        postprocessed_out = self._postprocess_output(
+            inference_state,
+            out,
+            hotstart_removed_obj_ids,
+            suppressed_obj_ids,
+            unconfirmed_obj_ids,
+        )
+
+        self._cache_frame_outputs(
+            inference_state,
+            frame_idx,
+            out["obj_id_to_mask"],
+            suppressed_obj_ids=suppressed_obj_ids,
+            removed_obj_ids=hotstart_removed_obj_ids,
+            unconfirmed_obj_ids=unconfirmed_obj_ids,
+        )
+        return postprocessed_out
+
+    @torch.inference_mode()
+    def add_live_frame(self, inference_state, frame):
+        """
+        Append a frame to a live stream (see `init_live_state`) and return its frame
+        index. `frame` can be an image path, a PIL image or a uint8 RGB numpy array in
+        (H, W, 3) layout. The frame is processed by the next `propagate_live` call.
+        """
+        input_batch = inference_state["input_batch"]
+        frame_idx = input_batch.img_batch.append(frame)
+        if frame_idx == 0:
+            inference_state["orig_height"] = input_batch.img_batch.video_height
+            inference_state["orig_width"] = input_batch.img_batch.video_width
+        find_stage = self._get_find_stage(frame_idx, inference_state["find_text_ids"])
+        input_batch.find_inputs.append(
+            copy_data_to_device(find_stage, self.device, non_blocking=True)
+        )
+        input_batch.find_targets.append(None)
+        input_batch.find_metadatas.append(None)
+        inference_state["previous_stages_out"].append(None)
+        inference_state["per_frame_raw_point_input"].append(None)
+        inference_state["per_frame_raw_box_input"].append(None)
+        inference_state["per_frame_visual_prompt"].append(None)
+        inference_state["per_frame_geometric_prompt"].append(None)
+        inference_state["per_frame_cur_step"].append(0)
+
+        num_frames = frame_idx + 1
+        inference_state["num_frames"] = num_frames
+        inference_state["num_source_frames"] = num_frames
+        for tracker_state in inference_state["tracker_inference_states"]:
+            tracker_state["num_frames"] = num_frames
+        return frame_idx
+
+    @torch.inference_mode()
+    def propagate_live(self, inference_state, end_of_stream=False):
+        """
+        Run inference on the frames appended to a live stream since the last call, one
+        frame at a time, and yield `(frame_idx, outputs)` for those frames whose outputs
+        are final. As in `propagate_in_video`, the outputs of a frame are held back in a
+        buffer until `hotstart_delay` frames have been processed (so that the objects
+        removed by hotstart heuristics are never shown), i.e. they are yielded a fixed
+        number of frames after it's appended. With `end_of_stream=True`, the outputs of
+        all the remaining frames are yielded.
+
+        Frames appended before any prompt was added are yielded with empty outputs
+        without running the model. Adding a text or box prompt restarts the stream from
+        the prompted frame (i.e. the frames after it are processed again), and the
+        frames before it that were still held back are yielded first by the next call,
+        with their outputs as of the previous prompt.
+        """
+        self._compile_model()
+
+        live_stream = inference_state["live_stream"]
+        flushed_outputs = live_stream["flushed_outputs"]
+        while len(flushed_outputs) > 0:
+            yield flushed_outputs.pop(0)
+        hotstart_buffer = live_stream["hotstart_buffer"]
+        hotstart_removed_obj_ids = live_stream["hotstart_removed_obj_ids"]
+        unconfirmed_obj_ids_per_frame = live_stream["unconfirmed_obj_ids_per_frame"]
+        while live_stream["next_frame_idx"] < inference_state["num_frames"]:
+            frame_idx = live_stream["next_frame_idx"]
+            live_stream["next_frame_idx"] += 1
+            tracker_metadata = inference_state["tracker_metadata"]
+            has_prompts = (
+                inference_state["text_prompt"] is not None
+                or inference_state["per_frame_geometric_prompt"][frame_idx] is not None
+                or len(tracker_metadata.get("obj_ids_all_gpu", [])) > 0
+            )
+            if has_prompts:
+                out = self._run_single_frame_inference(
+                    inference_state, frame_idx, reverse=False
+                )
+            else:
+                out = self._get_empty_frame_output()
+
+            if self.hotstart_delay > 0:
+                hotstart_buffer.append((frame_idx, out))
+                # update the object IDs removed by hotstart so that we don't output them
                 if self.rank == 0:
-                    suppressed_obj_ids = yield_out["suppressed_obj_ids"]
-                    unconfirmed_status_frame_idx = (
-                        yield_frame_idx + unconfirmed_status_delay
-                        if not reverse
-                        else yield_frame_idx - unconfirmed_status_delay
-                    )
+                    hotstart_removed_obj_ids.update(out["removed_obj_ids"])
+                    unconfirmed_obj_ids = out.get("unconfirmed_obj_ids", None)
+                    if unconfirmed_obj_ids is not None:
+                        unconfirmed_obj_ids_per_frame[frame_idx] = unconfirmed_obj_ids
+                # yield the oldest frame once the buffer has `hotstart_delay` frames
+                yield_list = []
+                while len(hotstart_buffer) >= self.hotstart_delay:
+                    yield_list.append(hotstart_buffer.pop(0))
+            else:
+                yield_list = [(frame_idx, out)]
 
-                    # Clamp the frame index to stay within video bounds
-                    num_frames = inference_state["num_frames"]
-                    unconfirmed_status_frame_idx = max(
-                        0, min(unconfirmed_status_frame_idx, num_frames - 1)
-                    )
+            for yield_frame_idx, yield_out in yield_list:
+                yield yield_frame_idx, self._postprocess_hotstart_output(
+                    inference_state,
+                    yield_frame_idx,
+                    yield_out,
+                    False,
+                    hotstart_removed_obj_ids,
+                    unconfirmed_obj_ids_per_frame,
+                )
+            self._trim_live_state(inference_state, frame_idx)
+
+        if end_of_stream:
+            # we reached the end of the stream -- yield all frames in the buffer
+            while len(hotstart_buffer) > 0:
+                yield_frame_idx, yield_out = hotstart_buffer.pop(0)
+                yield yield_frame_idx, self._postprocess_hotstart_output(
+                    inference_state,
+                    yield_frame_idx,
+                    yield_out,
+                    False,
+                    hotstart_removed_obj_ids,
+                    unconfirmed_obj_ids_per_frame,
+                )
 
-                    unconfirmed_obj_ids = unconfirmed_obj_ids_per_frame.get(
-                        unconfirmed_status_frame_idx, None
-                    )
-                    postprocessed_out = self._postprocess_output(
-                        inference_state,
-                        yield_out,
-                        hotstart_removed_obj_ids,
-                        suppressed_obj_ids,
-                        unconfirmed_obj_ids,
-                    )
+    def _get_empty_frame_output(self):
+        """Get the output of a frame without any objects (as `_run_single_frame_inference`)."""
+        out = {
+            "obj_id_to_mask": {},
+            "obj_id_to_score": {},
+            "obj_id_to_tracker_score": {},
+        }
+        if self.rank == 0:
+            out["removed_obj_ids"] = set()
+            out["suppressed_obj_ids"] = set()
+            out["frame_stats"] = None
+            out["unconfirmed_obj_ids"] = []
+        return out
 
-                    self._cache_frame_outputs(
-                        inference_state,
-                        yield_frame_idx,
-                        yield_out["obj_id_to_mask"],
-                        suppressed_obj_ids=suppressed_obj_ids,
-                        removed_obj_ids=hotstart_removed_obj_ids,
-                        unconfirmed_obj_ids=unconfirmed_obj_ids,
-                    )
+    def _trim_live_state(self, inference_state, frame_idx):
+        """
+        Drop the inputs, cached outputs and tracking states of the frames of a live
+        stream that fell out of its window of recent frames after processing
+        `frame_idx`, as well as the metadata of the objects removed by hotstart before
+        it, so that the inference state doesn't grow with the length of the stream.
+        """
+        # the window must cover the hotstart buffer and the frames the tracker attends to
+        tracker = self.tracker
+        window = max(
+            self.live_state_window,
+            self.hotstart_delay + 1,
+            tracker.memory_temporal_stride_for_eval * tracker.num_maskmem + 1,
+            tracker.max_obj_ptrs_in_encoder + 1,
+        )
+        input_batch = inference_state["input_batch"]
+        prev_first_frame_idx = input_batch.find_inputs.start
+        first_frame_idx = frame_idx + 1 - window
+        if first_frame_idx <= prev_first_frame_idx:
+            return
+
+        input_batch.img_batch.drop_before(first_frame_idx)
+        input_batch.find_inputs.drop_before(first_frame_idx)
+        input_batch.find_targets.drop_before(first_frame_idx)
+        input_batch.find_metadatas.drop_before(first_frame_idx)
+        inference_state["previous_stages_out"].drop_before(first_frame_idx)
+        inference_state["per_frame_raw_point_input"].drop_before(first_frame_idx)
+        inference_state["per_frame_raw_box_input"].drop_before(first_frame_idx)
+        inference_state["per_frame_visual_prompt"].drop_before(first_frame_idx)
+        inference_state["per_frame_geometric_prompt"].drop_before(first_frame_idx)
+        inference_state["per_frame_cur_step"].drop_before(first_frame_idx)
+
+        feature_cache = inference_state["feature_cache"]
+        cached_frame_outputs = inference_state["cached_frame_outputs"]
+        unconfirmed_obj_ids_per_frame = inference_state["live_stream"][
+            "unconfirmed_obj_ids_per_frame"
+        ]
+        for t in range(prev_first_frame_idx, first_frame_idx):
+            feature_cache.pop(t, None)
+            unconfirmed_obj_ids_per_frame.pop(t, None)
+        for t in [t for t in cached_frame_outputs if t < first_frame_idx]:
+            del cached_frame_outputs[t]
+        for tracker_state in inference_state["tracker_inference_states"]:
+            tracker.remove_frames_before(tracker_state, first_frame_idx)
+
+        tracker_metadata = inference_state["tracker_metadata"]
+        if tracker_metadata == {}:
+            return
+        tracker_score_frame_wise = tracker_metadata[
+            "obj_id_to_tracker_score_frame_wise"
+        ]
+        for t in [t for t in tracker_score_frame_wise if t < first_frame_idx]:
+            del tracker_score_frame_wise[t]
+        if self.rank > 0:
+            return
+        rank0_metadata = tracker_metadata["rank0_metadata"]
+        suppressed_obj_ids = rank0_metadata["suppressed_obj_ids"]
+        for t in [t for t in suppressed_obj_ids if t < first_frame_idx]:
+            del suppressed_obj_ids[t]
+        # the hotstart heuristics only count the frames within `hotstart_delay` frames
+        # after an object first appears, which are all in the window
+        unmatched_frame_inds = rank0_metadata["unmatched_frame_inds"]
+        overlap_pair_to_frame_inds = rank0_metadata["overlap_pair_to_frame_inds"]
+        for frame_inds_dict in [unmatched_frame_inds, overlap_pair_to_frame_inds]:
+            for key, frame_inds in list(frame_inds_dict.items()):
+                frame_inds = [t for t in frame_inds if t >= first_frame_idx]
+                if len(frame_inds) > 0:
+                    frame_inds_dict[key] = frame_inds
                 else:
-                    postprocessed_out = None  # no output on other GPUs
-                yield yield_frame_idx, postprocessed_out
+                    del frame_inds_dict[key]
+        # objects are only removed by hotstart within `hotstart_delay` frames after they
+        # first appear, so those that first appeared before that are no longer in any
+        # output held in the hotstart buffer
+        obj_first_frame_idx = rank0_metadata["obj_first_frame_idx"]
+        hotstart_removed_obj_ids = inference_state["live_stream"][
+            "hotstart_removed_obj_ids"
+        ]
+        for obj_id in list(rank0_metadata["removed_obj_ids"]):
+            if obj_first_frame_idx[obj_id] + self.hotstart_delay >= first_frame_idx:
+                continue
+            rank0_metadata["removed_obj_ids"].discard(obj_id)
+            hotstart_removed_obj_ids.discard(obj_id)
+            del obj_first_frame_idx[obj_id]
+            rank0_metadata["trk_keep_alive"].pop(obj_id, None)
+            tracker_metadata["obj_id_to_score"].pop(obj_id, None)
+            tracker_metadata["obj_id_to_prompt_id"].pop(obj_id, None)
 
     def _run_single_frame_inference(self, inference_state, frame_idx, reverse):
         """
@@ -439,11 +876,23 @@ class Sam3VideoInference(Sam3VideoBase):
         H_video, W_video = inference_state["orig_height"], inference_state["orig_width"]
         if len(curr_obj_ids) == 0:
             out_obj_ids = torch.zeros(0, dtype=torch.int64)
+            out_prompt_ids = torch.zeros(0, dtype=torch.int64)
             out_probs = torch.zeros(0, dtype=torch.float32)
             out_binary_masks = torch.zeros(0, H_video, W_video, dtype=torch.bool)
             out_boxes_xywh = torch.zeros(0, 4, dtype=torch.float32)
         else:
             out_obj_ids = torch.tensor(curr_obj_ids, dtype=torch.int64)
+            # the text prompt each object was detected from (-1 for objects that
+            # were added by other prompts, e.g. point clicks)
+            num_text_prompts = len(inference_state.get("text_prompts", []))
+            obj_id_to_prompt_id = inference_state["tracker_metadata"].get(
+                "obj_id_to_prompt_id", {}
+            )
+            out_prompt_ids = torch.tensor(
+                [obj_id_to_prompt_id.get(obj_id, -1) for obj_id in curr_obj_ids],
+                dtype=torch.int64,
+            )
+            out_prompt_ids[out_prompt_ids >= num_text_prompts] = -1
             out_probs = torch.tensor(
                 [out["obj_id_to_score"][obj_id] for obj_id in curr_obj_ids]
             )
@@ -482,6 +931,7 @@ class Sam3VideoInference(Sam3VideoBase):
             )
 
             out_obj_ids = torch.index_select(out_obj_ids, 0, keep_idx)
+            out_prompt_ids = torch.index_select(out_prompt_ids, 0, keep_idx)
             out_probs = torch.index_select(out_probs, 0, keep_idx)
             out_tracker_probs = torch.index_select(out_tracker_probs, 0, keep_idx)
             out_binary_masks = torch.index_select(out_binary_masks, 0, keep_idx_gpu)
@@ -511,8 +961,13 @@ class Sam3VideoInference(Sam3VideoBase):
                 ).squeeze(1)
             ) > 0
 
+        text_prompts = inference_state.get("text_prompts", [])
         outputs = {
             "out_obj_ids": out_obj_ids.cpu().numpy(),
+            "out_prompt_ids": out_prompt_ids.numpy(),
+            "out_prompts": [
+                text_prompts[i] if i >= 0 else None for i in out_prompt_ids.tolist()
+            ],
             "out_probs": out_probs.cpu().numpy(),
             "out_boxes_xywh": out_boxes_xywh.cpu().numpy(),
             "out_binary_masks": out_binary_masks.cpu().numpy(),
@@ -556,7 +1011,13 @@ class Sam3VideoInference(Sam3VideoBase):
         ), "No cached outputs found. Ensure normal propagation has run first to populate the cache."
         cached_outputs = inference_state["cached_frame_outputs"][frame_idx]
 
-        obj_id_to_mask = cached_outputs.copy()
+        # Decode the cached masks, skipping those that will be replaced by refined masks
+        refined_obj_ids = refined_obj_id_to_mask or {}
+        obj_id_to_mask = {
+            obj_id: cached_outputs[obj_id]
+            for obj_id in cached_outputs
+            if obj_id not in refined_obj_ids
+        }
 
         # Update with refined masks if provided
         if refined_obj_id_to_mask is not None:
@@ -848,6 +1309,10 @@ class Sam3VideoInference(Sam3VideoBase):
 
         Note that text prompts are NOT associated with a particular frame (i.e. they apply
         to all frames). However, we only run inference on the frame specified in `frame_idx`.
+
+        `text_str` can also be a list of text prompts, which are detected together in the
+        same session with a single backbone pass per frame. The outputs then include the
+        prompt each object was detected from ("out_prompt_ids" and "out_prompts").
         """
         logger.debug("Running add_prompt on frame %d", frame_idx)
 
@@ -863,16 +1328,29 @@ class Sam3VideoInference(Sam3VideoBase):
         self.reset_state(inference_state)
 
         # 1) add text prompt
-        if text_str is not None and text_str != "visual":
+        if isinstance(text_str, (list, tuple)) and len(text_str) == 1:
+            text_str = text_str[0]
+        if isinstance(text_str, (list, tuple)):
+            # multiple text prompts: one detector query per prompt on each frame
+            assert len(text_str) > 0, "at least one text prompt must be provided"
+            assert "visual" not in text_str, "visual prompts cannot be batched"
+            assert (
+                boxes_xywh is None
+            ), "box prompts are not supported together with multiple text prompts"
+            text_prompts = list(text_str)
+            inference_state["text_prompt"] = text_prompts
+            inference_state["text_prompts"] = text_prompts
+            inference_state["input_batch"].find_text_batch = [*text_prompts, "visual"]
+            self._set_find_text_ids(inference_state, list(range(len(text_prompts))))
+        elif text_str is not None and text_str != "visual":
             inference_state["text_prompt"] = text_str
+            inference_state["text_prompts"] = [text_str]
             inference_state["input_batch"].find_text_batch[0] = text_str
-            text_id = self.TEXT_ID_FOR_TEXT
+            self._set_find_text_ids(inference_state, [self.TEXT_ID_FOR_TEXT])
         else:
             inference_state["text_prompt"] = None
             inference_state["input_batch"].find_text_batch[0] = "<text placeholder>"
-            text_id = self.TEXT_ID_FOR_VISUAL
-        for t in range(inference_state["num_frames"]):
-            inference_state["input_batch"].find_inputs[t].text_ids[...] = text_id
+            self._set_find_text_ids(inference_state, [self.TEXT_ID_FOR_VISUAL])
 
         # 2) handle box prompt
         assert (boxes_xywh is not None) == (box_labels is not None)
@@ -898,6 +1376,15 @@ class Sam3VideoInference(Sam3VideoBase):
 
             inference_state["per_frame_geometric_prompt"][frame_idx] = geometric_prompt
 
+        if "live_stream" in inference_state:
+            # in a live stream, `propagate_live` restarts from the prompted frame, so
+            # the flushed outputs of the frames from there on are superseded
+            live_stream = inference_state["live_stream"]
+            live_stream["next_frame_idx"] = frame_idx
+            live_stream["flushed_outputs"] = [
+                (t, out) for t, out in live_stream["flushed_outputs"] if t < frame_idx
+            ]
+
         out = self._run_single_frame_inference(
             inference_state, frame_idx, reverse=False
         )
@@ -1039,8 +1526,9 @@ class Sam3VideoInferenceWithInstanceInteractivity(Sam3VideoInference):
         if propagation_type == "propagation_fetch":
             for frame_idx in tqdm(processing_order):
                 if self.rank == 0:
-                    obj_id_to_mask = inference_state["cached_frame_outputs"].get(
-                        frame_idx, {}
+                    # decode the cached masks into a plain dict for postprocessing
+                    obj_id_to_mask = dict(
+                        inference_state["cached_frame_outputs"].get(frame_idx, {})
                     )
                     # post processing - remove suppressed obj_ids
                     obj_id_to_score = tracker_metadata["obj_id_to_score"]
@@ -1302,6 +1790,7 @@ class Sam3VideoInferenceWithInstanceInteractivity(Sam3VideoInference):
             tracker_metadata["obj_ids_per_gpu"]
         )
         tracker_metadata["obj_id_to_score"].pop(obj_id, None)
+        tracker_metadata.get("obj_id_to_prompt_id", {}).pop(obj_id, None)
         # tracker_metadata["max_obj_id"] # we do not reuse the object id, so we do not update it here
 
         # Clean up cached frame outputs to remove references to the deleted object
@@ -1337,6 +1826,10 @@ class Sam3VideoInferenceWithInstanceInteractivity(Sam3VideoInference):
     def _prepare_backbone_feats(self, inference_state, frame_idx, reverse):
         input_batch = inference_state["input_batch"]
         feature_cache = inference_state["feature_cache"]
+        # reuse the backbone features of recently visited frames (e.g. when the user
+        # clicks back and forth between frames) instead of running the backbone again
+        if feature_cache.lookup(frame_idx) is not None:
+            return
         num_frames = inference_state["num_frames"]
         geometric_prompt = (
             inference_state["constants"]["empty_geometric_prompt"]
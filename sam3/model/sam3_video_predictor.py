@@ -10,20 +10,20 @@ import sys
 import time
 import uuid
 from contextlib import closing
-from typing import List, Optional
+from typing import List, Optional, Union
 
 import psutil
 import torch
 
 from sam3.logger import get_logger
+from sam3.model.io_utils import get_video_frame_count_and_fps
+from sam3.model.live_stream import iter_video_source_frames
+from sam3.model.session_manager import get_inference_state_memory, SessionManager
 
 logger = get_logger(__name__)
 
 
 class Sam3VideoPredictor:
-    # a global dictionary that holds all inference states for this model (key is session_id)
-    _ALL_INFERENCE_STATES = {}
-
     def __init__(
         self,
         checkpoint_path=None,
@@ -34,9 +34,53 @@ class Sam3VideoPredictor:
         async_loading_frames=False,
         video_loader_type="cv2",
         apply_temporal_disambiguation: bool = True,
+        feature_cache_capacity_mb: float = 0,
+        feature_cache_spill_to_cpu: bool = False,
+        frame_cache_dir: Optional[str] = None,
+        shard_frames_across_ranks: bool = False,
+        session_idle_ttl_sec: Optional[float] = None,
+        max_sessions: Optional[int] = None,
+        session_gpu_budget_mb: Optional[float] = None,
+        session_eviction_policy: str = "offload",
     ):
+        """
+        `feature_cache_capacity_mb` is the GPU memory budget (per session) for the
+        backbone features of recently visited frames, which are reused when adding
+        prompts on these frames again; with `feature_cache_spill_to_cpu=True`, frames
+        evicted from this budget are kept in CPU memory instead of being dropped. Each
+        cached frame takes a few hundred MB of GPU memory in every open session, so the
+        budget is opt-in: by default (0), only the most recently used frame is kept.
+
+        `frame_cache_dir` enables an on-disk cache of preprocessed video frames, so
+        that sessions on an already seen video (and all GPU workers) memory-map its
+        frames instead of decoding them again.
+
+        With `shard_frames_across_ranks=True` (for `Sam3VideoPredictorMultiGPU`),
+        each GPU worker only decodes and keeps the video frames that its detector
+        runs on, i.e. about `1 / num_gpus` of them.
+
+        Open sessions are closed after `session_idle_ttl_sec` seconds without
+        requests, and the least recently used ones are closed beyond `max_sessions`.
+        Beyond `session_gpu_budget_mb` of GPU memory held by all sessions, the least
+        recently used ones are offloaded to CPU memory and then closed (or closed
+        right away with `session_eviction_policy="close"`). See
+        `sam3.model.session_manager`; all limits are disabled by default.
+        """
         self.async_loading_frames = async_loading_frames
         self.video_loader_type = video_loader_type
+        self.frame_cache_dir = frame_cache_dir
+        self.shard_frames_across_ranks = shard_frames_across_ranks
+        # holds all inference states for this model (key is session_id)
+        self._ALL_INFERENCE_STATES = SessionManager(
+            idle_ttl_sec=session_idle_ttl_sec,
+            max_sessions=max_sessions,
+            max_gpu_bytes=(
+                int(session_gpu_budget_mb * 1024**2)
+                if session_gpu_budget_mb is not None
+                else None
+            ),
+            eviction_policy=session_eviction_policy,
+        )
         from sam3.model_builder import build_sam3_video_model
 
         self.model = (
@@ -51,16 +95,29 @@ class Sam3VideoPredictor:
             .cuda()
             .eval()
         )
+        self.model.feature_cache_max_bytes = int(feature_cache_capacity_mb * 1024**2)
+        self.model.feature_cache_spill_to_cpu = feature_cache_spill_to_cpu
 
     @torch.inference_mode()
     def handle_request(self, request):
         """Dispatch a request based on its type."""
+        self._enforce_session_limits(request)
         request_type = request["type"]
         if request_type == "start_session":
             return self.start_session(
                 resource_path=request["resource_path"],
                 session_id=request.get("session_id", None),
+                frame_stride=request.get("frame_stride", 1),
+                target_fps=request.get("target_fps", None),
+            )
+        elif request_type == "start_live_session":
+            return self.start_live_session(session_id=request.get("session_id", None))
+        elif request_type == "append_frame":
+            return self.append_frame(
+                session_id=request["session_id"], frame=request["frame"]
             )
+        elif request_type == "end_live_stream":
+            return self.end_live_stream(session_id=request["session_id"])
         elif request_type == "add_prompt":
             return self.add_prompt(
                 session_id=request["session_id"],
@@ -80,6 +137,8 @@ class Sam3VideoPredictor:
             )
         elif request_type == "reset_session":
             return self.reset_session(session_id=request["session_id"])
+        elif request_type == "warm_text_cache":
+            return self.warm_text_cache(prompts=request["prompts"])
         elif request_type == "close_session":
             return self.close_session(session_id=request["session_id"])
         else:
@@ -88,6 +147,7 @@ class Sam3VideoPredictor:
     @torch.inference_mode()
     def handle_stream_request(self, request):
         """Dispatch a stream request based on its type."""
+        self._enforce_session_limits(request)
         request_type = request["type"]
         if request_type == "propagate_in_video":
             yield from self.propagate_in_video(
@@ -99,21 +159,68 @@ class Sam3VideoPredictor:
         else:
             raise RuntimeError(f"invalid request type: {request_type}")
 
-    def start_session(self, resource_path, session_id=None):
+    def _plan_session_eviction(self, request):
+        """Plan which sessions to close or offload before handling `request`."""
+        num_new_sessions = int(
+            request["type"] in ["start_session", "start_live_session"]
+        )
+        return self._ALL_INFERENCE_STATES.plan_eviction(
+            active_session_id=request.get("session_id", None),
+            num_new_sessions=num_new_sessions,
+        )
+
+    def _enforce_session_limits(self, request):
+        """
+        Close idle sessions and close or offload the least recently used sessions
+        beyond the session limits, before handling `request`.
+        """
+        # (a multi-GPU predictor makes the plan on rank 0 and sends it to all ranks)
+        # (read without removing it: the request may still be pickled for other ranks)
+        plan = request.get("session_eviction_plan", None)
+        if plan is None:
+            plan = self._plan_session_eviction(request)
+        self._ALL_INFERENCE_STATES.apply_eviction(plan)
+
+    def start_session(
+        self, resource_path, session_id=None, frame_stride=1, target_fps=None
+    ):
         """
         Start a new inference session on an image or a video. Here `resource_path`
         can be either a path to an image file (for image inference) or an MP4 file
-        or directory with JPEG video frames (for video inference).
+        or directory with JPEG video frames (for video inference). It can also be a
+        list of already-decoded frames (PIL images or uint8 RGB numpy arrays), which
+        avoids decoding the video again when the caller already holds its frames.
 
         If `session_id` is defined, it will be used as identifier for the
         session. If it is not defined, the start_session function will create
         a session id and return it.
+
+        With `frame_stride > 1` (or a `target_fps` below the frame rate of the video,
+        from which the stride is derived), the model only runs on every
+        `frame_stride`-th frame and the other frames are never decoded. Frame indices
+        in requests and outputs still refer to the frames of the full video: prompts
+        are added on the nearest processed frame, and propagation yields every frame,
+        where the frames in between processed ones carry the outputs of the last
+        processed frame before them (marked by `"is_inferred": False` in the output).
         """
+        if target_fps is not None:
+            _, fps = get_video_frame_count_and_fps(resource_path)
+            if fps is None:
+                raise ValueError(
+                    f"cannot get the frame rate of {resource_path}; "
+                    "please specify `frame_stride` instead of `target_fps`"
+                )
+            frame_stride = max(1, round(fps / target_fps))
+        if frame_stride < 1:
+            raise ValueError(f"frame_stride must be at least 1, got {frame_stride}")
         # get an initial inference_state from the model
         inference_state = self.model.init_state(
             resource_path=resource_path,
             async_loading_frames=self.async_loading_frames,
             video_loader_type=self.video_loader_type,
+            frame_cache_dir=self.frame_cache_dir,
+            shard_frames_across_ranks=self.shard_frames_across_ranks,
+            frame_stride=frame_stride,
         )
         if not session_id:
             session_id = str(uuid.uuid4())
@@ -128,18 +235,97 @@ class Sam3VideoPredictor:
         )
         return {"session_id": session_id}
 
+    def start_live_session(self, session_id=None):
+        """
+        Start a new inference session on a live video stream (e.g. a camera feed),
+        whose frames are appended one at a time with `append_frame` requests. Prompts
+        are added with `add_prompt` requests on any of the recent frames of the stream.
+
+        Only a window of the most recent frames is kept in the session (see
+        `live_state_window` in `Sam3VideoInference`), so its memory usage doesn't grow
+        with the length of the stream.
+        """
+        inference_state = self.model.init_live_state()
+        if not session_id:
+            session_id = str(uuid.uuid4())
+        self._ALL_INFERENCE_STATES[session_id] = {
+            "state": inference_state,
+            "session_id": session_id,
+            "start_time": time.time(),
+        }
+        logger.debug(
+            f"started new live session {session_id}; {self._get_session_stats()}"
+        )
+        return {"session_id": session_id}
+
+    def append_frame(self, session_id, frame):
+        """
+        Append a frame (an image path, a PIL image or a uint8 RGB numpy array in
+        (H, W, 3) layout) to a live session and run inference on it. The outputs are
+        delayed by the hotstart buffer of the model, so the returned "results" hold
+        the outputs of the earlier frames that became final (possibly none).
+        """
+        session = self._get_session(session_id)
+        inference_state = session["state"]
+        if "live_stream" not in inference_state:
+            raise RuntimeError(f"session {session_id} is not a live session")
+        frame_idx = self.model.add_live_frame(inference_state, frame)
+        results = [
+            {"frame_index": t, "outputs": outputs}
+            for t, outputs in self.model.propagate_live(inference_state)
+        ]
+        return {"frame_index": frame_idx, "results": results}
+
+    def end_live_stream(self, session_id):
+        """
+        Mark the end of the stream of a live session and return the outputs of the
+        remaining frames held in the hotstart buffer. The session stays open (e.g. to
+        add prompts on its recent frames) until it's closed with `close_session`.
+        """
+        session = self._get_session(session_id)
+        inference_state = session["state"]
+        if "live_stream" not in inference_state:
+            raise RuntimeError(f"session {session_id} is not a live session")
+        results = [
+            {"frame_index": t, "outputs": outputs}
+            for t, outputs in self.model.propagate_live(
+                inference_state, end_of_stream=True
+            )
+        ]
+        return {"results": results}
+
+    def stream_live_source(self, session_id, source):
+        """
+        Read the frames of a local video source (a camera index, a stream URL such as
+        "rtsp://..." or a video file, see `iter_video_source_frames`) or of an
+        iterable of frames into a live session as they arrive, and yield the
+        `{"frame_index": ..., "outputs": ...}` results of each frame once final.
+        """
+        for frame in iter_video_source_frames(source):
+            response = self.handle_request(
+                {"type": "append_frame", "session_id": session_id, "frame": frame}
+            )
+            yield from response["results"]
+        response = self.handle_request(
+            {"type": "end_live_stream", "session_id": session_id}
+        )
+        yield from response["results"]
+
     def add_prompt(
         self,
         session_id: str,
         frame_idx: int,
-        text: Optional[str] = None,
+        text: Optional[Union[str, List[str]]] = None,
         points: Optional[List[List[float]]] = None,
         point_labels: Optional[List[int]] = None,
         bounding_boxes: Optional[List[List[float]]] = None,
         bounding_box_labels: Optional[List[int]] = None,
         obj_id: Optional[int] = None,
     ):
-        """Add text, box and/or point prompt on a specific video frame."""
+        """
+        Add text, box and/or point prompt on a specific video frame. `text` can be
+        a list of prompts to detect them together with one backbone pass per frame.
+        """
         logger.debug(
             f"add prompt on frame {frame_idx} in session {session_id}: "
             f"{text=}, {points=}, {point_labels=}, "
@@ -150,7 +336,7 @@ class Sam3VideoPredictor:
 
         frame_idx, outputs = self.model.add_prompt(
             inference_state=inference_state,
-            frame_idx=frame_idx,
+            frame_idx=self._to_session_frame_idx(inference_state, frame_idx),
             text_str=text,
             points=points,
             point_labels=point_labels,
@@ -158,6 +344,7 @@ class Sam3VideoPredictor:
             box_labels=bounding_box_labels,
             obj_id=obj_id,
         )
+        frame_idx *= inference_state.get("frame_stride", 1)
         return {"frame_index": frame_idx, "outputs": outputs}
 
     def remove_object(
@@ -195,10 +382,22 @@ class Sam3VideoPredictor:
         try:
             session = self._get_session(session_id)
             inference_state = session["state"]
+            if "live_stream" in inference_state:
+                raise RuntimeError(
+                    f"session {session_id} is a live session; its outputs are "
+                    "returned by `append_frame` requests"
+                )
             if propagation_direction not in ["both", "forward", "backward"]:
                 raise ValueError(
                     f"invalid propagation direction: {propagation_direction}"
                 )
+            frame_stride = inference_state.get("frame_stride", 1)
+            if start_frame_idx is not None:
+                start_frame_idx = self._to_session_frame_idx(
+                    inference_state, start_frame_idx
+                )
+            if max_frame_num_to_track is not None:
+                max_frame_num_to_track = -(-max_frame_num_to_track // frame_stride)
 
             # First doing the forward propagation
             if propagation_direction in ["both", "forward"]:
@@ -208,7 +407,9 @@ class Sam3VideoPredictor:
                     max_frame_num_to_track=max_frame_num_to_track,
                     reverse=False,
                 ):
-                    yield {"frame_index": frame_idx, "outputs": outputs}
+                    yield from self._get_frame_responses(
+                        inference_state, frame_idx, outputs, reverse=False
+                    )
             # Then doing the backward propagation (reverse in time)
             if propagation_direction in ["both", "backward"]:
                 for frame_idx, outputs in self.model.propagate_in_video(
@@ -217,7 +418,9 @@ class Sam3VideoPredictor:
                     max_frame_num_to_track=max_frame_num_to_track,
                     reverse=True,
                 ):
-                    yield {"frame_index": frame_idx, "outputs": outputs}
+                    yield from self._get_frame_responses(
+                        inference_state, frame_idx, outputs, reverse=True
+                    )
         finally:
             # Log upon completion (so that e.g. we can see if two propagations happen in parallel).
             # Using `finally` here to log even when the tracking is aborted with GeneratorExit.
@@ -225,6 +428,40 @@ class Sam3VideoPredictor:
                 f"propagation ended in session {session_id}; {self._get_session_stats()}"
             )
 
+    def _to_session_frame_idx(self, inference_state, frame_idx):
+        """Map a video frame index to the nearest frame processed in the session."""
+        frame_stride = inference_state.get("frame_stride", 1)
+        if frame_stride == 1:
+            return frame_idx
+        session_frame_idx = (frame_idx + frame_stride // 2) // frame_stride
+        return min(session_frame_idx, inference_state["num_frames"] - 1)
+
+    def _get_frame_responses(self, inference_state, frame_idx, outputs, reverse):
+        """
+        Get the propagation responses for session frame `frame_idx`. With a frame
+        stride, these also include the skipped video frames up to the next processed
+        frame, which carry the outputs of this frame (the responses are in the order
+        of propagation, i.e. in reverse with `reverse=True`).
+        """
+        frame_stride = inference_state.get("frame_stride", 1)
+        video_frame_idx = frame_idx * frame_stride
+        responses = [
+            {"frame_index": video_frame_idx, "outputs": outputs, "is_inferred": True}
+        ]
+        end_frame_idx = min(
+            video_frame_idx + frame_stride, inference_state["num_source_frames"]
+        )
+        for carried_frame_idx in range(video_frame_idx + 1, end_frame_idx):
+            responses.append(
+                {
+                    "frame_index": carried_frame_idx,
+                    "outputs": outputs,
+                    "is_inferred": False,
+                    "inferred_frame_index": video_frame_idx,
+                }
+            )
+        return reversed(responses) if reverse else responses
+
     def reset_session(self, session_id):
         """Reset the session to its initial state (as when it's initial opened)."""
         logger.debug(f"reset session {session_id}")
@@ -250,6 +487,17 @@ class Sam3VideoPredictor:
             logger.info(f"removed session {session_id}; {self._get_session_stats()}")
         return {"is_success": True}
 
+    def warm_text_cache(self, prompts: List[str]):
+        """
+        Encode a list of text prompts ahead of time into the process-wide text
+        embedding cache, so that the first requests using them skip the text encoder.
+        """
+        from sam3.model.text_embedding_cache import get_text_embedding_cache
+
+        text_cache = get_text_embedding_cache()
+        text_cache.warm(self.model.detector.backbone, prompts, device=self.model.device)
+        return {"num_prompts": len(prompts), **text_cache.get_stats()}
+
     def _get_session(self, session_id):
         session = self._ALL_INFERENCE_STATES.get(session_id, None)
         if session is None:
@@ -260,13 +508,43 @@ class Sam3VideoPredictor:
 
     def _get_session_stats(self):
         """Get a statistics string for live sessions and their GPU usage."""
-        # print both the session ids and their video frame numbers
-        live_session_strs = [
-            f"'{session_id}' ({session['state']['num_frames']} frames)"
-            for session_id, session in self._ALL_INFERENCE_STATES.items()
-        ]
+        # print the session ids, their video frame numbers and cached mask sizes
+        live_session_strs = []
+        for session_id, session in self._ALL_INFERENCE_STATES.items():
+            inference_state = session["state"]
+            session_str = f"'{session_id}' ({inference_state['num_frames']} frames"
+            memory_stats = get_inference_state_memory(inference_state)
+            idle_sec = time.time() - session["last_access_time"]
+            session_str += (
+                f", {memory_stats['gpu_bytes'] / 1024**2:.1f} MiB on GPU"
+                f" ({memory_stats['frames_gpu_bytes'] / 1024**2:.1f} MiB frames,"
+                f" {memory_stats['tracker_gpu_bytes'] / 1024**2:.1f} MiB tracker states)"
+                f", idle for {idle_sec:.0f}s"
+            )
+            if session["is_offloaded"]:
+                session_str += ", offloaded"
+            cached_frame_outputs = inference_state.get("cached_frame_outputs")
+            if hasattr(cached_frame_outputs, "get_memory_stats"):
+                mask_stats = cached_frame_outputs.get_memory_stats()
+                session_str += (
+                    f", {mask_stats['encoded_bytes'] / 1024**2:.1f} MiB cached masks"
+                    f" ({mask_stats['bytes_per_frame'] / 1024:.1f} KiB/frame)"
+                )
+            feature_cache = inference_state.get("feature_cache")
+            if hasattr(feature_cache, "get_stats"):
+                cache_stats = feature_cache.get_stats()
+                session_str += (
+                    f", {cache_stats['num_frames']} frames of features cached"
+                    f" ({cache_stats['device_bytes'] / 1024**2:.1f} MiB,"
+                    f" {cache_stats['num_hits']} hits /"
+                    f" {cache_stats['num_misses']} misses)"
+                )
+            live_session_strs.append(session_str + ")")
+        manager_stats = self._ALL_INFERENCE_STATES.get_stats()
         session_stats_str = (
-            f"live sessions: [{', '.join(live_session_strs)}], GPU memory: "
+            f"live sessions: [{', '.join(live_session_strs)}] "
+            f"({manager_stats['num_expired']} expired, {manager_stats['num_evicted']} "
+            f"evicted, {manager_stats['num_offloaded']} offloaded so far), GPU memory: "
             f"{torch.cuda.memory_allocated() // 1024**2} MiB used and "
             f"{torch.cuda.memory_reserved() // 1024**2} MiB reserved"
             f" (max over time: {torch.cuda.max_memory_allocated() // 1024**2} MiB used "
@@ -339,12 +617,18 @@ class Sam3VideoPredictorMultiGPU(Sam3VideoPredictor):
 
         # when starting a session, we need to create a session id before dispatching
         # the request to the workers
-        if request["type"] == "start_session" and request.get("session_id") is None:
+        if (
+            request["type"] in ["start_session", "start_live_session"]
+            and request.get("session_id") is None
+        ):
             request["session_id"] = str(uuid.uuid4())
         # dispatch the request to all worker processes
         if self.world_size > 1 and self.rank == 0:
+            # all ranks close or offload the same sessions, as planned on rank 0
+            # (each rank gets its own copy, as the queue pickles it asynchronously)
+            request["session_eviction_plan"] = self._plan_session_eviction(request)
             for rank in range(1, self.world_size):
-                self.command_queues[rank].put((request, False))
+                self.command_queues[rank].put((dict(request), False))
 
         response = super().handle_request(request)
 
@@ -362,8 +646,11 @@ class Sam3VideoPredictorMultiGPU(Sam3VideoPredictor):
 
         # dispatch the request to all worker processes
         if self.world_size > 1 and self.rank == 0:
+            # all ranks close or offload the same sessions, as planned on rank 0
+            # (each rank gets its own copy, as the queue pickles it asynchronously)
+            request["session_eviction_plan"] = self._plan_session_eviction(request)
             for rank in range(1, self.world_size):
-                self.command_queues[rank].put((request, True))
+                self.command_queues[rank].put((dict(request), True))
 
         yield from super().handle_stream_request(request)
 
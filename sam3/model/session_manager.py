@@ -0,0 +1,296 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
+
+"""
+Lifecycle management of the inference sessions of a video predictor.
+
+Interactive deployments keep many sessions open, and each one holds its video
+frames, backbone features, tracker states and cached masks (mostly on GPU) until
+it's closed. `SessionManager` holds the sessions of a predictor and bounds them by:
+- an idle TTL: sessions that haven't been used for `idle_ttl_sec` are closed
+- a maximum number of sessions: the least recently used sessions are closed
+- a GPU memory budget (summed over all sessions): the least recently used
+  sessions are first offloaded (their frames are moved to CPU memory and their
+  cached features are evicted, see `offload_inference_state`) and then closed
+
+The manager only plans which sessions to offload or close (`plan_eviction`) and
+applies the plan separately (`apply_eviction`), so that in multi-GPU inference the
+plan made on rank 0 can be applied by all ranks alike.
+"""
+
+import gc
+import time
+from collections import OrderedDict
+
+import torch
+
+from sam3.logger import get_logger
+from sam3.model.feature_cache import FrameFeatureCache
+from sam3.model.frame_prefetcher import FramePrefetcher
+from sam3.model.live_stream import PerFrameList
+
+logger = get_logger(__name__)
+
+EVICTION_POLICIES = ("offload", "close")
+
+
+def _tensor_nbytes(obj, seen):
+    """
+    Total size of the GPU and CPU tensors in a nested dict/list/tuple structure,
+    counting each tensor storage once (across calls sharing `seen`).
+    """
+    if isinstance(obj, torch.Tensor):
+        key = (obj.device, obj.untyped_storage().data_ptr())
+        if key in seen:
+            return 0, 0
+        seen.add(key)
+        nbytes = obj.untyped_storage().nbytes()
+        return (nbytes, 0) if obj.is_cuda else (0, nbytes)
+    gpu_nbytes, cpu_nbytes = 0, 0
+    if isinstance(obj, dict):
+        obj = list(obj.values())
+    if isinstance(obj, (list, tuple)):
+        for v in obj:
+            gpu, cpu = _tensor_nbytes(v, seen)
+            gpu_nbytes += gpu
+            cpu_nbytes += cpu
+    return gpu_nbytes, cpu_nbytes
+
+
+def get_inference_state_memory(inference_state):
+    """
+    Get the memory held by an inference state of `Sam3VideoInference`, as a dict
+    of GPU and CPU bytes for its video frames, cached backbone features, tracker
+    states (memories and outputs) and cached masks, and their GPU total.
+    Frames decoded lazily by an async loader are not counted.
+    """
+    seen = set()
+    stats = {}
+
+    img_batch = inference_state["input_batch"].img_batch
+    if isinstance(img_batch, FramePrefetcher):
+        img_batch = img_batch.frames
+    if isinstance(img_batch, torch.Tensor):
+        frames = img_batch
+    elif isinstance(img_batch, PerFrameList):
+        frames = list(img_batch)  # the frames held by a live stream
+    else:
+        frames = []
+    stats["frames_gpu_bytes"], stats["frames_cpu_bytes"] = _tensor_nbytes(frames, seen)
+
+    feature_cache = inference_state["feature_cache"]
+    if isinstance(feature_cache, FrameFeatureCache):
+        cache_stats = feature_cache.get_stats()
+        stats["features_gpu_bytes"] = cache_stats["device_bytes"]
+        stats["features_cpu_bytes"] = cache_stats["cpu_bytes"]
+    else:
+        stats["features_gpu_bytes"], stats["features_cpu_bytes"] = 0, 0
+
+    tracker_gpu_nbytes, tracker_cpu_nbytes = 0, 0
+    for tracker_state in inference_state["tracker_inference_states"]:
+        gpu, cpu = _tensor_nbytes(tracker_state["output_dict"], seen)
+        tracker_gpu_nbytes += gpu
+        tracker_cpu_nbytes += cpu
+    stats["tracker_gpu_bytes"] = tracker_gpu_nbytes
+    stats["tracker_cpu_bytes"] = tracker_cpu_nbytes
+
+    cached_frame_outputs = inference_state["cached_frame_outputs"]
+    masks_nbytes = 0
+    if hasattr(cached_frame_outputs, "get_memory_stats"):
+        mask_stats = cached_frame_outputs.get_memory_stats()
+        masks_nbytes = mask_stats["encoded_bytes"]
+        masks_on_gpu = mask_stats["offload"] is None and torch.cuda.is_available()
+    else:
+        masks_on_gpu = False
+    stats["masks_gpu_bytes"] = masks_nbytes if masks_on_gpu else 0
+    stats["masks_cpu_bytes"] = 0 if masks_on_gpu else masks_nbytes
+
+    stats["gpu_bytes"] = sum(v for k, v in stats.items() if k.endswith("_gpu_bytes"))
+    return stats
+
+
+def offload_inference_state(inference_state):
+    """
+    Free the GPU memory of an idle inference state of `Sam3VideoInference` that
+    can be restored on demand: its video frames are moved to CPU memory (and then
+    prefetched to GPU during propagation, see `FramePrefetcher`) and its cached
+    backbone features are evicted (spilled to CPU memory if the cache does so, or
+    recomputed on the next access). The session remains fully usable.
+    """
+    input_batch = inference_state["input_batch"]
+    img_batch = input_batch.img_batch
+    if isinstance(img_batch, torch.Tensor) and img_batch.is_cuda:
+        input_batch.img_batch = FramePrefetcher(
+            img_batch.cpu(), device=img_batch.device
+        )
+    feature_cache = inference_state["feature_cache"]
+    if isinstance(feature_cache, FrameFeatureCache):
+        feature_cache.evict_frames()
+
+
+class SessionManager:
+    """
+    A `session_id -> session` mapping (where each session is a dict holding the
+    inference state in "state") in least recently used order, with an idle TTL, a
+    maximum number of sessions and a GPU memory budget (see the module docstring).
+    A limit set to None is disabled.
+
+    Args:
+        idle_ttl_sec: close sessions that haven't been accessed for this long
+        max_sessions: maximum number of open sessions
+        max_gpu_bytes: GPU memory budget of all sessions together
+        eviction_policy: what to do first with the least recently used sessions
+            when the GPU memory budget is exceeded, "offload" (and then close them
+            if still over budget) or "close"
+    """
+
+    def __init__(
+        self,
+        idle_ttl_sec=None,
+        max_sessions=None,
+        max_gpu_bytes=None,
+        eviction_policy="offload",
+    ):
+        assert eviction_policy in EVICTION_POLICIES, f"{eviction_policy=}"
+        assert max_sessions is None or max_sessions > 0
+        self.idle_ttl_sec = idle_ttl_sec
+        self.max_sessions = max_sessions
+        self.max_gpu_bytes = max_gpu_bytes
+        self.eviction_policy = eviction_policy
+        self._sessions = OrderedDict()  # session_id -> session, LRU first
+        self.num_expired = 0
+        self.num_evicted = 0
+        self.num_offloaded = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def __setitem__(self, session_id, session):
+        session.setdefault("last_access_time", time.time())
+        session.setdefault("is_offloaded", False)
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+
+    def get(self, session_id, default=None):
+        """Get a session and mark it as the most recently used one."""
+        session = self._sessions.get(session_id, None)
+        if session is None:
+            return default
+        session["last_access_time"] = time.time()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def pop(self, session_id, default=None):
+        return self._sessions.pop(session_id, default)
+
+    def items(self):
+        return self._sessions.items()
+
+    def clear(self):
+        self._sessions.clear()
+
+    def plan_eviction(self, active_session_id=None, num_new_sessions=0):
+        """
+        Plan which sessions to close and to offload to enforce the limits, before
+        handling a request on `active_session_id` (which is never evicted) that
+        opens `num_new_sessions` sessions. Returns a dict with the lists of session
+        ids to close ("close") and to offload ("offload"), for `apply_eviction`.
+        """
+        to_close, to_offload = [], []
+        now = time.time()
+        # candidates in least recently used order
+        candidates = [
+            session_id
+            for session_id in self._sessions
+            if session_id != active_session_id
+        ]
+        if self.idle_ttl_sec is not None:
+            for session_id in candidates:
+                idle_sec = now - self._sessions[session_id]["last_access_time"]
+                if idle_sec > self.idle_ttl_sec:
+                    to_close.append(session_id)
+        candidates = [s for s in candidates if s not in to_close]
+
+        if self.max_sessions is not None:
+            num_sessions = len(self._sessions) - len(to_close) + num_new_sessions
+            num_excess = max(num_sessions - self.max_sessions, 0)
+            to_close.extend(candidates[:num_excess])
+            candidates = candidates[num_excess:]
+
+        if self.max_gpu_bytes is not None:
+            memory_stats = {
+                session_id: get_inference_state_memory(session["state"])
+                for session_id, session in self._sessions.items()
+                if session_id not in to_close
+            }
+            gpu_bytes = {k: v["gpu_bytes"] for k, v in memory_stats.items()}
+            total_gpu_bytes = sum(gpu_bytes.values())
+            if self.eviction_policy == "offload":
+                for session_id in candidates:
+                    if total_gpu_bytes <= self.max_gpu_bytes:
+                        break
+                    if self._sessions[session_id]["is_offloaded"]:
+                        continue
+                    to_offload.append(session_id)
+                    # offloading frees the frames and features but not the tracker
+                    # states and masks of a session
+                    freed_bytes = (
+                        memory_stats[session_id]["frames_gpu_bytes"]
+                        + memory_stats[session_id]["features_gpu_bytes"]
+                    )
+                    gpu_bytes[session_id] -= freed_bytes
+                    total_gpu_bytes -= freed_bytes
+            for session_id in candidates:
+                if total_gpu_bytes <= self.max_gpu_bytes:
+                    break
+                to_close.append(session_id)
+                total_gpu_bytes -= gpu_bytes[session_id]
+            to_offload = [s for s in to_offload if s not in to_close]
+        return {"close": to_close, "offload": to_offload}
+
+    def apply_eviction(self, plan):
+        """Close and offload the sessions in a plan from `plan_eviction`."""
+        for session_id in plan["offload"]:
+            session = self._sessions.get(session_id, None)
+            if session is None or session["is_offloaded"]:
+                continue
+            offload_inference_state(session["state"])
+            session["is_offloaded"] = True
+            self.num_offloaded += 1
+            logger.info(f"offloaded least recently used session {session_id}")
+        now = time.time()
+        for session_id in plan["close"]:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                continue
+            idle_sec = now - session["last_access_time"]
+            if self.idle_ttl_sec is not None and idle_sec > self.idle_ttl_sec:
+                self.num_expired += 1
+                logger.info(f"closed session {session_id} after {idle_sec:.0f}s idle")
+            else:
+                self.num_evicted += 1
+                logger.info(f"closed least recently used session {session_id}")
+            del session
+        if len(plan["close"]) > 0:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def get_stats(self):
+        """Get the number of sessions, their GPU memory and the eviction counters."""
+        gpu_bytes = sum(
+            get_inference_state_memory(session["state"])["gpu_bytes"]
+            for session in self._sessions.values()
+        )
+        return {
+            "num_sessions": len(self._sessions),
+            "num_offloaded_sessions": sum(
+                session["is_offloaded"] for session in self._sessions.values()
+            ),
+            "gpu_bytes": gpu_bytes,
+            "num_expired": self.num_expired,
+            "num_evicted": self.num_evicted,
+            "num_offloaded": self.num_offloaded,
+        }
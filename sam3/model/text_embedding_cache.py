@@ -0,0 +1,167 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
+
+"""
+Process-wide cache of text prompt embeddings (the outputs of
+`SAM3VLBackbone.forward_text`).
+
+Text prompts are typically drawn from a small set ("dog", "person", ...), so we
+encode each prompt once per backbone and device and reuse its embeddings across
+images, videos, sessions and API requests. Since the text encoder pads every
+prompt to a fixed context length and encodes prompts independently, a batch of
+prompts can be assembled from per-prompt cache entries.
+"""
+
+import threading
+import weakref
+from collections import OrderedDict
+
+import torch
+
+from sam3.logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_TEXT_EMBEDDING_CACHE_SIZE = 1024
+
+# the outputs of `forward_text` and the dimension that indexes the prompts in each
+_TEXT_OUTPUT_BATCH_DIMS = {
+    "language_features": 1,  # [seq_len, num_prompts, d_model]
+    "language_mask": 0,  # [num_prompts, seq_len]
+    "language_embeds": 1,  # [seq_len, num_prompts, d_embed]
+}
+
+
+class TextEmbeddingCache:
+    """
+    A thread-safe LRU cache of per-prompt text embeddings, keyed by the text
+    backbone, the normalized prompt string and the device.
+
+    Args:
+        max_entries: the maximum number of cached (backbone, prompt, device)
+            entries; 0 disables caching
+    """
+
+    def __init__(self, max_entries=DEFAULT_TEXT_EMBEDDING_CACHE_SIZE):
+        self.max_entries = max_entries
+        # (reentrant since purging a garbage-collected backbone may happen under the lock)
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # (id(backbone), prompt, device) -> outputs
+        self._backbone_refs = {}  # id(backbone) -> weakref to purge its entries
+        self.num_hits = 0
+        self.num_misses = 0
+
+    @staticmethod
+    def normalize_prompt(backbone, prompt):
+        """
+        Normalize a prompt with the tokenizer's own cleaning function (e.g. white
+        space and lower case), so that all prompts that tokenize the same way
+        share an entry.
+        """
+        language_backbone = getattr(backbone, "language_backbone", None)
+        tokenizer = getattr(language_backbone, "tokenizer", None)
+        clean_fn = getattr(tokenizer, "clean_fn", None)
+        if clean_fn is not None:
+            return clean_fn(prompt)
+        return " ".join(prompt.split())
+
+    def _key(self, backbone, prompt, device):
+        return (id(backbone), self.normalize_prompt(backbone, prompt), str(device))
+
+    def _track_backbone(self, backbone):
+        backbone_id = id(backbone)
+        if backbone_id not in self._backbone_refs:
+            self._backbone_refs[backbone_id] = weakref.ref(
+                backbone, lambda _: self._purge_backbone(backbone_id)
+            )
+
+    def _purge_backbone(self, backbone_id):
+        with self._lock:
+            self._backbone_refs.pop(backbone_id, None)
+            for key in [k for k in self._entries if k[0] == backbone_id]:
+                del self._entries[key]
+
+    def encode(self, backbone, prompts, device):
+        """
+        Get the `forward_text` outputs of a list of prompts, only running the
+        text encoder on prompts that are not cached yet (in a single batch).
+
+        Returns a dict with the same keys and shapes as
+        `backbone.forward_text(prompts, device=device)`.
+        """
+        if self.max_entries <= 0 or backbone.training:
+            # no caching in training, where we need gradients through the encoder
+            return backbone.forward_text(prompts, device=device)
+
+        keys = [self._key(backbone, prompt, device) for prompt in prompts]
+        with self._lock:
+            cached = {}
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    cached[key] = self._entries[key]
+            num_cached = sum(key in cached for key in keys)
+            self.num_hits += num_cached
+            self.num_misses += len(keys) - num_cached
+        # encode each missing prompt once, even if it appears several times
+        missing = list(OrderedDict.fromkeys(k for k in keys if k not in cached))
+
+        if len(missing) > 0:
+            text_outputs = backbone.forward_text(
+                [prompt for _, prompt, _ in missing], device=device
+            )
+            # clone the slices so that each entry holds its own storage
+            computed = {
+                key: {
+                    name: text_outputs[name].narrow(dim, i, 1).clone()
+                    for name, dim in _TEXT_OUTPUT_BATCH_DIMS.items()
+                }
+                for i, key in enumerate(missing)
+            }
+            cached.update(computed)
+            with self._lock:
+                self._track_backbone(backbone)
+                self._entries.update(computed)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        # assemble the batch (`torch.cat` also gives the caller its own copy)
+        return {
+            name: torch.cat([cached[key][name] for key in keys], dim=dim)
+            for name, dim in _TEXT_OUTPUT_BATCH_DIMS.items()
+        }
+
+    def warm(self, backbone, prompts, device, batch_size=64):
+        """Encode and cache a list of prompts ahead of time (e.g. at startup)."""
+        prompts = list(prompts)
+        for i in range(0, len(prompts), batch_size):
+            self.encode(backbone, prompts[i : i + batch_size], device)
+        logger.info(f"warmed the text embedding cache with {len(prompts)} prompts")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """Get the cache hit/miss counters and the number of cached prompts."""
+        with self._lock:
+            num_lookups = self.num_hits + self.num_misses
+            return {
+                "num_entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "num_hits": self.num_hits,
+                "num_misses": self.num_misses,
+                "hit_rate": self.num_hits / max(num_lookups, 1),
+            }
+
+
+_TEXT_EMBEDDING_CACHE = TextEmbeddingCache()
+
+
+def get_text_embedding_cache():
+    """Get the process-wide text embedding cache."""
+    return _TEXT_EMBEDDING_CACHE
+
+
+def encode_text_cached(backbone, prompts, device):
+    """`backbone.forward_text(prompts, device=device)` through the process-wide cache."""
+    return _TEXT_EMBEDDING_CACHE.encode(backbone, prompts, device)
@@ -431,11 +431,18 @@ def _create_tracker_transformer():
 
 
 def build_tracker(
-    apply_temporal_disambiguation: bool, with_backbone: bool = False, compile_mode=None
+    apply_temporal_disambiguation: bool,
+    with_backbone: bool = False,
+    compile_mode=None,
+    non_cond_mem_eviction: Optional[str] = None,
 ) -> Sam3TrackerPredictor:
     """
     Build the SAM3 Tracker module for video tracking.
 
+    Args:
+        non_cond_mem_eviction: None, "offload" or "evict", how to bound the memory of
+            non-conditioning frame outputs outside the memory attention window
+
     Returns:
         Sam3TrackerPredictor: Wrapped SAM3 Tracker module
     """
@@ -480,6 +487,7 @@ def build_tracker(
         clear_non_cond_mem_around_input=True,
         fill_hole_area=0,
         use_memory_selection=apply_temporal_disambiguation,
+        non_cond_mem_eviction=non_cond_mem_eviction,
     )
 
     return model
@@ -659,6 +667,7 @@ def build_sam3_video_model(
     apply_temporal_disambiguation: bool = True,
     device="cuda" if torch.cuda.is_available() else "cpu",
     compile=False,
+    non_cond_mem_eviction: Optional[str] = None,
 ) -> Sam3VideoInferenceWithInstanceInteractivity:
     """
     Build SAM3 dense tracking model.
@@ -666,6 +675,8 @@ def build_sam3_video_model(
     Args:
         checkpoint_path: Optional path to checkpoint file
         bpe_path: Path to the BPE tokenizer file
+        non_cond_mem_eviction: None, "offload" or "evict" to keep the tracker memory
+            bounded on long videos (see `Sam3TrackerPredictor`)
 
     Returns:
         Sam3VideoInferenceWithInstanceInteractivity: The instantiated dense tracking model
@@ -676,7 +687,10 @@ def build_sam3_video_model(
         )
 
     # Build Tracker module
-    tracker = build_tracker(apply_temporal_disambiguation=apply_temporal_disambiguation)
+    tracker = build_tracker(
+        apply_temporal_disambiguation=apply_temporal_disambiguation,
+        non_cond_mem_eviction=non_cond_mem_eviction,
+    )
 
     # Build Detector components
     visual_neck = _create_vision_backbone()
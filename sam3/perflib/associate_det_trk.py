@@ -1,13 +1,145 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
 
 from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional
 
+import numpy as np
+import numpy.typing as npt
 import torch
 import torch.nn.functional as F
 from sam3.perflib.masks_ops import mask_iou
 from scipy.optimize import linear_sum_assignment
 
 
+@dataclass
+class DetTrkMatch:
+    """
+    Result of `match_det_trk` for N detections and M tracks, as numpy arrays.
+
+    The tracks matched by each detection (with an IoU above `iou_threshold`) are in
+    CSR format: the track indices matched by detection `d` are
+    `det_to_trk_indices[det_to_trk_indptr[d] : det_to_trk_indptr[d + 1]]`, in
+    increasing order.
+    """
+
+    ious: npt.NDArray  # (N, M) float IoUs
+    det_to_trk_indptr: npt.NDArray  # (N + 1,) int64
+    det_to_trk_indices: npt.NDArray  # (num_matches,) int64
+    # one-to-one Hungarian assignment maximizing the IoUs (empty if disabled)
+    hungarian_det_inds: npt.NDArray  # (K,) int64
+    hungarian_trk_inds: npt.NDArray  # (K,) int64
+    # tracks matched to a detection above `iou_threshold_trk` (by the Hungarian
+    # assignment if enabled, by any detection otherwise)
+    trk_is_matched: npt.NDArray  # (M,) bool
+    trk_is_nonempty: npt.NDArray  # (M,) bool
+    det_scores: Optional[npt.NDArray] = None  # (N,) float, if given
+
+    @property
+    def det_has_match(self):
+        """(N,) bool, whether each detection matches any track above `iou_threshold`."""
+        return np.diff(self.det_to_trk_indptr) > 0
+
+    def det_to_matched_trk(self, trk_ids=None):
+        """
+        The list of tracks matched by each detection, as arrays of track indices
+        (or of `trk_ids[track index]` if given).
+        """
+        matched = self.det_to_trk_indices
+        if trk_ids is not None:
+            matched = np.asarray(trk_ids)[matched]
+        return np.split(matched, self.det_to_trk_indptr[1:-1])
+
+
+def _resize_to_smaller(det_masks, trk_masks):
+    """Resize the larger of the two sets of masks to the size of the smaller one."""
+    if det_masks.shape[-2:] == trk_masks.shape[-2:]:
+        return det_masks, trk_masks
+
+    def _resize(masks, size):
+        return F.interpolate(
+            masks.unsqueeze(1).float(),
+            size=size,
+            mode="bilinear",
+            align_corners=False,
+        ).squeeze(1)
+
+    # resize to the smaller size to save GPU memory
+    if np.prod(det_masks.shape[-2:]) < np.prod(trk_masks.shape[-2:]):
+        trk_masks = _resize(trk_masks, det_masks.shape[-2:])
+    else:
+        det_masks = _resize(det_masks, trk_masks.shape[-2:])
+    return det_masks, trk_masks
+
+
+def match_det_trk(
+    det_masks: torch.Tensor,
+    trk_masks: torch.Tensor,
+    iou_threshold: float = 0.5,
+    iou_threshold_trk: float = 0.5,
+    det_scores: Optional[torch.Tensor] = None,
+    hungarian: bool = True,
+) -> DetTrkMatch:
+    """
+    Vectorized matching of detections and tracks by mask IoU, with a single DtoH sync
+    (of the IoUs, the track emptiness and the detection scores together).
+
+    Args:
+        det_masks: (N, H, W) tensor of detection masks (mask logits or binary masks)
+        trk_masks: (M, H', W') tensor of track masks (mask logits or binary masks),
+            masks of different sizes are resized to the smaller one
+        iou_threshold: IoU threshold of the many-to-one detection -> track matches
+        iou_threshold_trk: IoU threshold for a track to be matched
+        det_scores: optional (N,) tensor of detection scores, returned as numpy
+        hungarian: whether tracks are matched by a one-to-one Hungarian assignment
+            (instead of by any detection)
+
+    Returns:
+        a `DetTrkMatch`
+    """
+    with torch.autograd.profiler.record_function("perflib: match_det_trk"):
+        N, M = det_masks.size(0), trk_masks.size(0)
+        det_masks, trk_masks = _resize_to_smaller(det_masks, trk_masks)
+        det_masks_binary = det_masks if det_masks.dtype == torch.bool else det_masks > 0
+        trk_masks_binary = trk_masks if trk_masks.dtype == torch.bool else trk_masks > 0
+
+        ious = mask_iou(det_masks_binary, trk_masks_binary)  # (N, M)
+        trk_is_nonempty = trk_masks_binary.flatten(1).any(dim=1)
+        to_host = [ious.flatten(), trk_is_nonempty.float()]
+        if det_scores is not None:
+            to_host.append(det_scores.to(ious.device).float())
+        host = torch.cat(to_host).cpu().numpy()  # the only DtoH sync
+        ious_np = host[: N * M].reshape(N, M)
+        trk_is_nonempty_np = host[N * M : N * M + M] > 0
+        det_scores_np = host[N * M + M :] if det_scores is not None else None
+
+        # det -> matched tracks in CSR format (np.nonzero is in row-major order)
+        det_inds, trk_inds = np.nonzero(ious_np >= iou_threshold)
+        det_to_trk_indptr = np.zeros(N + 1, dtype=np.int64)
+        np.cumsum(np.bincount(det_inds, minlength=N), out=det_to_trk_indptr[1:])
+
+        if hungarian and N > 0 and M > 0:
+            # Hungarian solves for minimum cost
+            row_ind, col_ind = linear_sum_assignment(1 - ious_np)
+            trk_is_matched = np.zeros(M, dtype=bool)
+            is_above = ious_np[row_ind, col_ind] >= iou_threshold_trk
+            trk_is_matched[col_ind[is_above]] = True
+        else:
+            row_ind = col_ind = np.zeros(0, dtype=np.int64)
+            trk_is_matched = (ious_np >= iou_threshold_trk).any(axis=0)
+
+        return DetTrkMatch(
+            ious=ious_np,
+            det_to_trk_indptr=det_to_trk_indptr,
+            det_to_trk_indices=trk_inds.astype(np.int64),
+            hungarian_det_inds=row_ind.astype(np.int64),
+            hungarian_trk_inds=col_ind.astype(np.int64),
+            trk_is_matched=trk_is_matched,
+            trk_is_nonempty=trk_is_nonempty_np,
+            det_scores=det_scores_np,
+        )
+
+
 def associate_det_trk(
     det_masks,
     track_masks,
@@ -17,7 +149,7 @@ def associate_det_trk(
     new_det_thresh=0.0,
 ):
     """
-    Optimized implementation of detection <-> track association that minimizes DtoH syncs.
+    Detection <-> track association on top of `match_det_trk` (one DtoH sync).
 
     Args:
         det_masks: (N, H, W) tensor of predicted masks
@@ -26,6 +158,10 @@ def associate_det_trk(
     Returns:
         new_det_indices: list of indices in det_masks considered 'new'
         unmatched_trk_indices: list of indices in track_masks considered 'unmatched'
+        det_to_matched_trk: dict from detection indices to the list of the track
+            indices they matched (only for detections with a match)
+        matched_det_scores: dict from the track indices in the Hungarian assignment
+            to [det_score, det_score * iou] of their assigned detection
     """
     with torch.autograd.profiler.record_function("perflib: associate_det_trk"):
         assert isinstance(det_masks, torch.Tensor), "det_masks should be a tensor"
@@ -33,105 +169,42 @@ def associate_det_trk(
         if det_masks.size(0) == 0 or track_masks.size(0) == 0:
             return list(range(det_masks.size(0))), [], {}, {}  # all detections are new
 
-        if list(det_masks.shape[-2:]) != list(track_masks.shape[-2:]):
-            # resize to the smaller size to save GPU memory
-            if torch.numel(det_masks[-2:]) < torch.numel(track_masks[-2:]):
-                track_masks = (
-                    F.interpolate(
-                        track_masks.unsqueeze(1).float(),
-                        size=det_masks.shape[-2:],
-                        mode="bilinear",
-                        align_corners=False,
-                    ).squeeze(1)
-                    > 0
-                )
-            else:
-                # resize detections to track size
-                det_masks = (
-                    F.interpolate(
-                        det_masks.unsqueeze(1).float(),
-                        size=track_masks.shape[-2:],
-                        mode="bilinear",
-                        align_corners=False,
-                    ).squeeze(1)
-                    > 0
-                )
-
-        det_masks = det_masks > 0
-        track_masks = track_masks > 0
-
-        iou = mask_iou(det_masks, track_masks)  # (N, M)
-        igeit = iou >= iou_threshold
-        igeit_any_dim_1 = igeit.any(dim=1)
-        igeit_trk = iou >= iou_threshold_trk
-
-        iou_list = iou.cpu().numpy().tolist()
-        igeit_list = igeit.cpu().numpy().tolist()
-        igeit_any_dim_1_list = igeit_any_dim_1.cpu().numpy().tolist()
-        igeit_trk_list = igeit_trk.cpu().numpy().tolist()
-
-        det_scores_list = (
-            det_scores
-            if det_scores is None
-            else det_scores.cpu().float().numpy().tolist()
+        match = match_det_trk(
+            det_masks,
+            track_masks,
+            iou_threshold=iou_threshold,
+            iou_threshold_trk=iou_threshold_trk,
+            det_scores=det_scores,
         )
 
         # Hungarian matching for tracks (one-to-one: each track matches at most one detection)
-        # For detections: allow many tracks to match to the same detection (many-to-one)
+        # Tracks not matched by Hungarian assignment above threshold are unmatched
+        unmatched_trk_indices = np.nonzero(~match.trk_is_matched)[0].tolist()
+        matched_det_scores = {}  # track index -> [det_score, det_score * iou]
+        if match.det_scores is not None:
+            d, t = match.hungarian_det_inds, match.hungarian_trk_inds
+            scores = match.det_scores[d].astype(np.float64)
+            for t_, score, score_iou in zip(
+                t.tolist(), scores.tolist(), (scores * match.ious[d, t]).tolist()
+            ):
+                matched_det_scores[t_] = [score, score_iou]
 
-        # If either is empty, return all detections as new
-        if det_masks.size(0) == 0 or track_masks.size(0) == 0:
-            return list(range(det_masks.size(0))), [], {}
-
-        # Hungarian matching: maximize IoU for tracks
-        cost_matrix = 1 - iou.cpu().numpy()  # Hungarian solves for minimum cost
-        row_ind, col_ind = linear_sum_assignment(cost_matrix)
-
-        def branchy_hungarian_better_uses_the_cpu(
-            cost_matrix, row_ind, col_ind, iou_list, det_masks, track_masks
-        ):
-            matched_trk = set()
-            matched_det = set()
-            matched_det_scores = {}  # track index -> [det_score, det_score * iou] det score of matched detection mask
-            for d, t in zip(row_ind, col_ind):
-                matched_det_scores[t] = [
-                    det_scores_list[d],
-                    det_scores_list[d] * iou_list[d][t],
-                ]
-                if igeit_trk_list[d][t]:
-                    matched_trk.add(t)
-                    matched_det.add(d)
-
-            # Tracks not matched by Hungarian assignment above threshold are unmatched
-            unmatched_trk_indices = [
-                t for t in range(track_masks.size(0)) if t not in matched_trk
-            ]
-
-            # For detections: allow many tracks to match to the same detection (many-to-one)
-            # So, a detection is 'new' if it does not match any track above threshold
-            assert track_masks.size(0) == igeit.size(
-                1
-            )  # Needed for loop optimizaiton below
-            new_det_indices = []
-            for d in range(det_masks.size(0)):
-                if not igeit_any_dim_1_list[d]:
-                    if det_scores is not None and det_scores[d] >= new_det_thresh:
-                        new_det_indices.append(d)
-
-            # for each detection, which tracks it matched to (above threshold)
-            det_to_matched_trk = defaultdict(list)
-            for d in range(det_masks.size(0)):
-                for t in range(track_masks.size(0)):
-                    if igeit_list[d][t]:
-                        det_to_matched_trk[d].append(t)
-
-            return (
-                new_det_indices,
-                unmatched_trk_indices,
-                det_to_matched_trk,
-                matched_det_scores,
-            )
-
-        return (branchy_hungarian_better_uses_the_cpu)(
-            cost_matrix, row_ind, col_ind, iou_list, det_masks, track_masks
+        # For detections: allow many tracks to match to the same detection (many-to-one)
+        # So, a detection is 'new' if it does not match any track above threshold
+        new_det_indices = []
+        if match.det_scores is not None:
+            is_new_det = ~match.det_has_match & (match.det_scores >= new_det_thresh)
+            new_det_indices = np.nonzero(is_new_det)[0].tolist()
+
+        # for each detection, which tracks it matched to (above threshold)
+        det_to_matched_trk = defaultdict(list)
+        for d, matched_trk_inds in enumerate(match.det_to_matched_trk()):
+            if len(matched_trk_inds) > 0:
+                det_to_matched_trk[d] = matched_trk_inds.tolist()
+
+        return (
+            new_det_indices,
+            unmatched_trk_indices,
+            det_to_matched_trk,
+            matched_det_scores,
         )
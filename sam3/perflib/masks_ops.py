@@ -45,9 +45,72 @@ def masks_to_boxes(masks: torch.Tensor, obj_ids: list[int]):
         return bounding_boxes
 
 
+# fp16 represents integers exactly up to 2048, so the per-tile intersection counts
+# of fp16 matmuls over tiles of at most 2048 pixels are exact
+_FP16_EXACT_TILE_PIXELS = 2048
+# number of pixels of the masks processed at a time (bounds the memory footprint)
+_MAX_CHUNK_PIXELS = 64 * _FP16_EXACT_TILE_PIXELS
+
+
+def mask_intersection(
+    masks1: torch.Tensor,
+    masks2: torch.Tensor,
+    max_chunk_pixels: int = _MAX_CHUNK_PIXELS,
+) -> torch.Tensor:
+    """
+    Compute the number of pixels in the intersection of each pair of masks, as a
+    matmul of the flattened masks, over chunks of at most `max_chunk_pixels` pixels
+    (instead of materializing an (N, M, H*W) boolean tensor).
+
+    On GPU, each chunk is multiplied in fp16 over tiles of 2048 pixels, which
+    keeps the counts exact, and the tile counts are summed in fp32.
+    Args:
+      - masks1: (N, H, W) bool Tensor
+      - masks2: (M, H, W) bool Tensor
+    Returns:
+      - intersection: (N, M) float Tensor, containing the intersection areas
+    """
+    assert masks1.dtype == masks2.dtype == torch.bool
+    N, H, W = masks1.shape
+    M, _, _ = masks2.shape
+    num_pixels = H * W
+    flat1 = masks1.reshape(N, num_pixels)
+    flat2 = masks2.reshape(M, num_pixels)
+    intersection = torch.zeros(N, M, device=masks1.device, dtype=torch.float)
+    if N == 0 or M == 0:
+        return intersection
+
+    use_fp16_tiles = masks1.is_cuda
+    tile = _FP16_EXACT_TILE_PIXELS
+    if use_fp16_tiles:
+        max_chunk_pixels = max(max_chunk_pixels // tile, 1) * tile  # whole tiles
+    # autocast would run the matmuls in a precision where the counts are inexact
+    with torch.autocast(device_type=masks1.device.type, enabled=False):
+        for start in range(0, num_pixels, max_chunk_pixels):
+            end = min(start + max_chunk_pixels, num_pixels)
+            if use_fp16_tiles:
+                # pad the chunk to whole tiles and sum the per-tile counts in fp32
+                num_tiles = -(-(end - start) // tile)
+                chunk1 = flat1.new_zeros(N, num_tiles * tile, dtype=torch.float16)
+                chunk2 = flat2.new_zeros(M, num_tiles * tile, dtype=torch.float16)
+                chunk1[:, : end - start] = flat1[:, start:end]
+                chunk2[:, : end - start] = flat2[:, start:end]
+                chunk1 = chunk1.view(N, num_tiles, tile).transpose(0, 1)
+                chunk2 = chunk2.view(M, num_tiles, tile).permute(1, 2, 0)
+                tile_counts = torch.bmm(chunk1, chunk2)  # (num_tiles, N, M)
+                intersection += tile_counts.sum(dim=0, dtype=torch.float)
+            else:
+                chunk1 = flat1[:, start:end].float()
+                chunk2 = flat2[:, start:end].float()
+                intersection += chunk1 @ chunk2.t()
+    return intersection
+
+
 def mask_iou(pred_masks: torch.Tensor, gt_masks: torch.Tensor) -> torch.Tensor:
     """
     Compute the IoU (Intersection over Union) between predicted masks and ground truth masks.
+    The intersections are computed with `mask_intersection` and the unions from the
+    mask areas, which is O(N*M*H*W) multiply-adds with a bounded memory footprint.
     Args:
       - pred_masks: (N, H, W) bool Tensor, containing binary predicted segmentation masks
       - gt_masks: (M, H, W) bool Tensor, containing binary ground truth segmentation masks
@@ -58,6 +121,25 @@ def mask_iou(pred_masks: torch.Tensor, gt_masks: torch.Tensor) -> torch.Tensor:
     N, H, W = pred_masks.shape
     M, _, _ = gt_masks.shape
 
+    intersection = mask_intersection(pred_masks, gt_masks)
+    pred_areas = pred_masks.reshape(N, H * W).sum(dim=1).float()
+    gt_areas = gt_masks.reshape(M, H * W).sum(dim=1).float()
+    union = pred_areas[:, None] + gt_areas[None, :] - intersection
+    ious = intersection / union.clamp(min=1)
+    return ious  # shape: (N, M)
+
+
+def mask_iou_broadcast(
+    pred_masks: torch.Tensor, gt_masks: torch.Tensor
+) -> torch.Tensor:
+    """
+    Reference implementation of `mask_iou` that broadcasts the masks against each
+    other, materializing (N, M, H*W) boolean tensors.
+    """
+    assert pred_masks.dtype == gt_masks.dtype == torch.bool
+    N, H, W = pred_masks.shape
+    M, _, _ = gt_masks.shape
+
     # Flatten masks: (N, 1, H*W) and (1, M, H*W)
     pred_flat = pred_masks.view(N, 1, H * W)
     gt_flat = gt_masks.view(1, M, H * W)
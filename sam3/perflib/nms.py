@@ -1,6 +1,7 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
 
 import logging
+from typing import Optional
 
 import numpy as np
 import torch
@@ -76,16 +77,167 @@ def generic_nms_cpu(
 ) -> torch.Tensor:
     """
     A generic version of `torchvision.ops.nms` that takes a pairwise IoU matrix. (CPU implementation
-    based on https://github.com/jwyang/faster-rcnn.pytorch/blob/master/lib/model/nms/nms_cpu.py)
+    with `batched_greedy_nms_np`, the kept indices are sorted by decreasing score)
     """
     ious_np = ious.float().detach().cpu().numpy()
     scores_np = scores.float().detach().cpu().numpy()
-    order = scores_np.argsort()[::-1]
-    kept_inds = []
-    while order.size > 0:
-        i = order.item(0)
-        kept_inds.append(i)
-        inds = np.where(ious_np[i, order[1:]] <= iou_threshold)[0]
-        order = order[inds + 1]
-
-    return torch.tensor(kept_inds, dtype=torch.int64, device=scores.device)
+    order, keep_sorted = _batched_greedy_nms_sorted(
+        ious_np[None], scores_np[None], iou_threshold
+    )
+    kept_inds = order[0][keep_sorted[0]]
+    return torch.from_numpy(kept_inds).to(dtype=torch.int64, device=scores.device)
+
+
+# number of boxes resolved together in the blocked greedy NMS
+_NMS_BLOCK_SIZE = 128
+# number of elements of the (rows, T, F) arrays in `track_box_iou_np`
+_MAX_TRACK_IOU_ELEMS = 1 << 22
+
+
+def _batched_greedy_nms_sorted(
+    ious, scores, iou_threshold, valid=None, suppress_equal=False
+):
+    """
+    Greedy NMS on each group of a (G, K, K) IoU array. Returns the (G, K) order of
+    decreasing scores and whether each entry in this order is kept.
+    """
+    G, K = scores.shape
+    if valid is None:
+        valid = np.ones((G, K), dtype=bool)
+    if suppress_equal:
+        suppresses = ious >= iou_threshold
+    else:
+        suppresses = ious > iou_threshold
+    # sort each group by decreasing score (invalid entries are never kept, so they
+    # don't suppress any other entry)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    identity = np.arange(K)
+    for g in range(G):
+        if not np.array_equal(order[g], identity):
+            suppresses[g] = suppresses[g].take(order[g], axis=0).take(order[g], axis=1)
+    keep_sorted = np.take_along_axis(valid, order, axis=1)
+
+    for start in range(0, K, _NMS_BLOCK_SIZE):
+        end = min(start + _NMS_BLOCK_SIZE, K)
+        candidates = keep_sorted[:, start:end]
+        if start > 0:
+            # suppression by the boxes kept in the previous blocks
+            prev_keep = keep_sorted[:, None, :start].astype(np.float32)
+            prev_suppresses = suppresses[:, :start, start:end].astype(np.float32)
+            candidates = candidates & ~((prev_keep @ prev_suppresses)[:, 0] > 0)
+        # within the block, iterate `keep[i] = not any(keep[j] and suppresses[j, i])`
+        # over the boxes j with a higher score than i, from all candidates kept: the
+        # first t entries are final after t iterations, and the fixed point is the
+        # greedy NMS result (as in Cluster-NMS)
+        block_suppresses = suppresses[:, start:end, start:end] & np.triu(
+            np.ones((end - start, end - start), dtype=bool), k=1
+        )
+        block_suppresses = block_suppresses.astype(np.float32)  # for BLAS matmuls
+        block_keep = candidates
+        while True:
+            block_keep_f = block_keep[:, None, :].astype(np.float32)
+            suppressed = (block_keep_f @ block_suppresses)[:, 0] > 0
+            new_block_keep = candidates & ~suppressed
+            if np.array_equal(new_block_keep, block_keep):
+                break
+            block_keep = new_block_keep
+        keep_sorted[:, start:end] = block_keep
+    return order, keep_sorted
+
+
+def batched_greedy_nms_np(
+    ious: np.ndarray,
+    scores: np.ndarray,
+    iou_threshold: float,
+    valid: Optional[np.ndarray] = None,
+    suppress_equal: bool = False,
+) -> np.ndarray:
+    """
+    Greedy NMS from pairwise IoUs on CPU, over many independent groups at once (e.g.
+    the frames of a video, or the prompts of an image), where boxes or masks in
+    different groups never suppress each other.
+
+    Rather than picking the boxes one at a time, the boxes are processed in blocks
+    (in decreasing score order): each block is first suppressed by the boxes kept in
+    the previous blocks with a matmul, and then resolved with a few matmul iterations
+    within the block, for all groups together. The result is the same as for greedy
+    NMS.
+
+    Args:
+      - ious: (G, K, K) float array, containing the pairwise IoUs within each group
+      - scores: (G, K) float array, containing the score of each box
+      - iou_threshold: float, a box overlapping a kept box with a higher score by an
+        IoU above `iou_threshold` (or equal to it if `suppress_equal`) is suppressed
+      - valid: optional (G, K) bool array, False for the padding of groups with
+        fewer than K boxes (which are never kept)
+
+    Returns:
+      - keep: (G, K) bool array, indicating whether each box is kept after NMS
+    """
+    assert ious.ndim == 3 and ious.shape[1] == ious.shape[2]
+    assert scores.shape == ious.shape[:2]
+    order, keep_sorted = _batched_greedy_nms_sorted(
+        ious, scores, iou_threshold, valid=valid, suppress_equal=suppress_equal
+    )
+    keep = np.zeros_like(keep_sorted)
+    np.put_along_axis(keep, order, keep_sorted, axis=1)
+    return keep
+
+
+def box_iou_np(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """
+    Pairwise IoUs between (..., N, 4) and (..., M, 4) arrays of boxes in the
+    (x1, y1, x2, y2) format, as an (..., N, M) float32 array (0 where the union is 0).
+    """
+    x11, y11, x12, y12 = np.moveaxis(boxes1.astype(np.float32), -1, 0)
+    x21, y21, x22, y22 = np.moveaxis(boxes2.astype(np.float32), -1, 0)
+    w = np.minimum(x12[..., :, None], x22[..., None, :])
+    w -= np.maximum(x11[..., :, None], x21[..., None, :])
+    h = np.minimum(y12[..., :, None], y22[..., None, :])
+    h -= np.maximum(y11[..., :, None], y21[..., None, :])
+    inter = np.clip(w, 0, None, out=w)
+    inter *= np.clip(h, 0, None, out=h)
+    area1 = (x12 - x11) * (y12 - y11)
+    area2 = (x22 - x21) * (y22 - y21)
+    union = area1[..., :, None] + area2[..., None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def track_box_iou_np(bboxes: np.ndarray) -> np.ndarray:
+    """
+    Pairwise IoUs between box tracks, where the IoU of two tracks is the sum of their
+    box intersections over the sum of their box unions, on the frames where both of
+    them have a box (0 if there is no such frame, and on the diagonal).
+
+    Args:
+      - bboxes: (T, F, 4) float array, containing the (x1, y1, x2, y2) boxes of each
+        track on each frame, NaN on the frames where a track has no box
+
+    Returns:
+      - ious: (T, T) float32 array
+    """
+    T, F = bboxes.shape[:2]
+    valid = ~np.isnan(bboxes).any(axis=2)  # (T, F)
+    boxes = np.where(valid[..., None], bboxes, 0).astype(np.float32)
+    x1, y1, x2, y2 = np.moveaxis(boxes, -1, 0)  # (T, F) each
+    areas = (x2 - x1) * (y2 - y1)
+    inter_sum = np.zeros((T, T))
+    union_sum = np.zeros((T, T))
+    # the pairwise per-frame arrays are computed for chunks of rows to bound memory
+    chunk_size = max(_MAX_TRACK_IOU_ELEMS // max(T * F, 1), 1)
+    for start in range(0, T, chunk_size):
+        rows = slice(start, min(start + chunk_size, T))
+        w = np.minimum(x2[rows, None], x2[None]) - np.maximum(x1[rows, None], x1[None])
+        h = np.minimum(y2[rows, None], y2[None]) - np.maximum(y1[rows, None], y1[None])
+        inter = np.clip(w, 0, None, out=w)
+        inter *= np.clip(h, 0, None, out=h)
+        both_valid = valid[rows, None] & valid[None]  # (rows, T, F)
+        inter *= both_valid
+        union = (areas[rows, None] + areas[None]) * both_valid - inter
+        inter_sum[rows] = inter.sum(axis=2, dtype=np.float64)
+        union_sum[rows] = union.sum(axis=2, dtype=np.float64)
+    ious = np.divide(
+        inter_sum, union_sum, out=np.zeros_like(inter_sum), where=union_sum > 0
+    )
+    np.fill_diagonal(ious, 0)
+    return ious.astype(np.float32)
@@ -0,0 +1,289 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
+
+"""
+COCO RLE encoding and decoding of batches of masks.
+
+Masks are encoded on their device (GPU or CPU) with a single host transfer for the
+whole batch, and the run lengths of all masks are converted to COCO counts strings
+together (in C, by pycocotools). Counts strings are decoded back to run lengths in
+a vectorized way, and from there to dense masks on any device. Areas and bounding
+boxes can be computed from RLEs without decoding them.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+from pycocotools import mask as mask_util
+
+
+def rle_run_lengths(masks: torch.Tensor):
+    """
+    Run lengths of the COCO RLEs of (N, H, W) bool masks, on their device. Returns
+    the run lengths of all masks concatenated and the number of runs of each mask.
+    The runs alternate between background and foreground, starting with background
+    (the first run is 0 if the first pixel is foreground).
+    """
+    # COCO RLEs are in Fortran order
+    flat_masks = masks.transpose(1, 2).reshape(masks.size(0), -1)
+    # the run boundaries: the first pixel if it's foreground (the first run is then
+    # an empty background run), each change of value, and the end of the mask
+    is_boundary = torch.ones(
+        flat_masks.size(0),
+        flat_masks.size(1) + 1,
+        device=masks.device,
+        dtype=torch.bool,
+    )
+    is_boundary[:, 0] = flat_masks[:, 0]
+    is_boundary[:, 1:-1] = flat_masks[:, :-1] != flat_masks[:, 1:]
+    mask_inds, boundaries = torch.nonzero(is_boundary, as_tuple=True)
+    # each mask has at least one boundary (its end), so its first boundary is where
+    # the mask index changes, and its first run length is the boundary itself
+    run_lengths = boundaries.clone()
+    run_lengths[1:] -= boundaries[:-1]
+    is_first = torch.ones_like(mask_inds, dtype=torch.bool)
+    is_first[1:] = mask_inds[1:] != mask_inds[:-1]
+    run_lengths[is_first] = boundaries[is_first]
+    num_runs = is_boundary.sum(dim=1)
+    return run_lengths, num_runs
+
+
+def _segmented_cumsum(values, segment_ids):
+    """Cumulative sum of `values` restarting at each change of (sorted) `segment_ids`."""
+    if values.size == 0:
+        return values
+    cumsum = np.cumsum(values)
+    is_first = np.ones(values.size, dtype=bool)
+    is_first[1:] = segment_ids[1:] != segment_ids[:-1]
+    first_inds = np.nonzero(is_first)[0]
+    segment_offsets = cumsum[first_inds] - values[first_inds]
+    segment_sizes = np.diff(np.append(first_inds, values.size))
+    return cumsum - np.repeat(segment_offsets, segment_sizes)
+
+
+def counts_to_strings(counts: List[np.ndarray], h: int, w: int) -> List[str]:
+    """Convert the run lengths of masks of size (h, w) to COCO counts strings."""
+    if len(counts) == 0:
+        return []
+    # a single pycocotools call for all masks
+    rles = mask_util.frPyObjects([{"counts": c, "size": [h, w]} for c in counts], h, w)
+    return [rle["counts"].decode("utf-8") for rle in rles]
+
+
+def strings_to_counts(strings: List) -> List[np.ndarray]:
+    """
+    Convert COCO counts strings (or bytes) to run lengths, for all strings at once.
+
+    Each run length is stored in 5-bit chunks of a character (+48), with a
+    continuation bit (0x20) and a sign bit (0x10) in its last chunk, and starting
+    from the fourth run, as the difference with the run length two runs earlier.
+    """
+    if len(strings) == 0:
+        return []
+    encoded = [s.encode("utf-8") if isinstance(s, str) else s for s in strings]
+    chars = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.int64) - 48
+    if chars.size == 0:
+        return [np.zeros(0, dtype=np.int64) for _ in strings]
+
+    # split the characters into the runs (each ending with a chunk without
+    # continuation bit) and accumulate their 5-bit chunks
+    is_last_chunk = (chars & 0x20) == 0
+    last_chunk_inds = np.nonzero(is_last_chunk)[0]
+    first_chunk_inds = np.concatenate([[0], last_chunk_inds[:-1] + 1])
+    chunk_pos = np.arange(chars.size) - np.repeat(
+        first_chunk_inds, last_chunk_inds - first_chunk_inds + 1
+    )
+    values = np.add.reduceat((chars & 0x1F) << (5 * chunk_pos), first_chunk_inds)
+    # sign extension
+    num_chunks = last_chunk_inds - first_chunk_inds + 1
+    is_negative = (chars[last_chunk_inds] & 0x10) != 0
+    values[is_negative] -= np.left_shift(1, 5 * num_chunks[is_negative])
+
+    # undo the delta coding within each mask, separately for the runs at odd and at
+    # even positions (from the second and the third run respectively)
+    num_chars = np.array([len(s) for s in encoded])
+    char_mask_inds = np.repeat(np.arange(len(encoded)), num_chars)
+    num_runs = np.bincount(char_mask_inds[last_chunk_inds], minlength=len(encoded))
+    run_starts = np.concatenate([[0], np.cumsum(num_runs)[:-1]])
+    run_pos = np.arange(values.size) - np.repeat(run_starts, num_runs)
+    run_mask_inds = np.repeat(np.arange(len(encoded)), num_runs)
+    for parity in (1, 0):
+        inds = np.nonzero((run_pos % 2 == parity) & (run_pos > 0))[0]
+        values[inds] = _segmented_cumsum(values[inds], run_mask_inds[inds])
+    return np.split(values, np.cumsum(num_runs)[:-1])
+
+
+@torch.no_grad()
+def rle_encode(orig_mask, return_areas=False):
+    """Encodes a collection of masks in RLE format
+
+    This function emulates the behavior of the COCO API's encode function, but
+    is executed on the device of the masks (e.g. GPU), with a single transfer to
+    the host for the whole batch, and the strings of all masks are converted in one
+    pycocotools call.
+
+    Args:
+        mask (torch.Tensor): A mask of shape (N, H, W) with dtype=torch.bool
+        return_areas (bool): If True, add the areas of the masks as a part of
+            the RLE output dict under the "area" key. Default is False.
+
+    Returns:
+        list[dict]: The RLE encoded masks
+    """
+    assert orig_mask.ndim == 3, "Mask must be of shape (N, H, W)"
+    assert orig_mask.dtype == torch.bool, "Mask must have dtype=torch.bool"
+
+    if orig_mask.numel() == 0:
+        return []
+
+    N, h, w = orig_mask.shape
+    run_lengths, num_runs = rle_run_lengths(orig_mask)
+    to_host = [num_runs, run_lengths]
+    if return_areas:
+        to_host.append(orig_mask.reshape(N, -1).sum(dim=1))
+    # the only transfer to the host
+    to_host = torch.cat(to_host).cpu().numpy()
+    num_runs, to_host = to_host[:N], to_host[N:]
+    run_lengths = to_host[: num_runs.sum()]
+    counts = np.split(run_lengths, np.cumsum(num_runs)[:-1])
+
+    batch_rles = [
+        {"size": [h, w], "counts": s} for s in counts_to_strings(counts, h, w)
+    ]
+    if return_areas:
+        for rle, area in zip(batch_rles, to_host[-N:].tolist()):
+            rle["area"] = area
+    return batch_rles
+
+
+def robust_rle_encode(masks):
+    """Encodes a collection of masks in RLE format. Uses the gpu version fist, falls back to the cpu version if it fails"""
+
+    assert masks.ndim == 3, "Mask must be of shape (N, H, W)"
+    assert masks.dtype == torch.bool, "Mask must have dtype=torch.bool"
+
+    try:
+        return rle_encode(masks)
+    except RuntimeError as _:
+        return rle_encode(masks.cpu())
+
+
+def _get_counts(rle: Dict):
+    counts = rle["counts"]
+    if isinstance(counts, (str, bytes)):
+        return None
+    return np.asarray(counts, dtype=np.int64)
+
+
+def expand_run_lengths(counts: List, h: int, w: int, device) -> torch.Tensor:
+    """
+    Expand the run lengths (numpy arrays or tensors) of masks of size (h, w) to an
+    (N, H, W) bool tensor on `device`.
+    """
+    num_runs = torch.tensor([len(c) for c in counts], device=device)
+    run_lengths = torch.cat(
+        [torch.as_tensor(c, dtype=torch.int64).to(device) for c in counts]
+    )
+    # the runs at odd positions within each mask are foreground
+    run_starts = torch.cumsum(num_runs, dim=0) - num_runs
+    run_pos = torch.arange(run_lengths.numel(), device=device)
+    run_pos -= torch.repeat_interleave(run_starts, num_runs)
+    is_foreground = run_pos % 2 == 1
+    # since each mask has h * w pixels, the runs of all masks concatenated are the
+    # runs of the flattened batch of masks
+    run_ends = torch.cumsum(run_lengths, dim=0)
+    changes = torch.zeros(len(counts) * h * w + 1, dtype=torch.int32, device=device)
+    ones = torch.ones_like(run_ends[is_foreground], dtype=torch.int32)
+    changes.index_add_(0, (run_ends - run_lengths)[is_foreground], ones)
+    changes.index_add_(0, run_ends[is_foreground], -ones)
+    masks = torch.cumsum(changes[:-1], dim=0, dtype=torch.int32) > 0
+    # COCO RLEs are in Fortran order
+    return masks.view(len(counts), w, h).transpose(1, 2)
+
+
+def rle_decode(rles: List[Dict], device: Optional[torch.device] = None) -> torch.Tensor:
+    """
+    Decode COCO RLEs (with counts strings or uncompressed counts lists) of masks of
+    the same size into an (N, H, W) bool tensor on `device` (CPU by default).
+
+    On CPU, all masks are decoded in one pycocotools call. On other devices, only
+    the run lengths are transferred and the masks are expanded from them on the
+    device for the whole batch.
+    """
+    device = torch.device("cpu") if device is None else torch.device(device)
+    if len(rles) == 0:
+        return torch.zeros(0, 0, 0, dtype=torch.bool, device=device)
+    h, w = rles[0]["size"]
+    assert all(list(rle["size"]) == [h, w] for rle in rles), "masks of different sizes"
+    if device.type == "cpu":
+        rles = [
+            mask_util.frPyObjects(rle, h, w) if _get_counts(rle) is not None else rle
+            for rle in rles
+        ]
+        masks = mask_util.decode(_to_bytes_rles(rles))  # (H, W, N)
+        return torch.from_numpy(masks).permute(2, 0, 1).bool()
+
+    counts = [_get_counts(rle) for rle in rles]
+    string_inds = [i for i, c in enumerate(counts) if c is None]
+    if len(string_inds) > 0:
+        string_counts = strings_to_counts([rles[i]["counts"] for i in string_inds])
+        for i, c in zip(string_inds, string_counts):
+            counts[i] = c
+
+    return expand_run_lengths(counts, h, w, device)
+
+
+def rle_area(rles: List[Dict]) -> np.ndarray:
+    """Areas of COCO RLEs (with counts strings), without decoding them."""
+    if len(rles) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return mask_util.area(_to_bytes_rles(rles)).astype(np.int64)
+
+
+def rle_to_bbox(rles: List[Dict]) -> np.ndarray:
+    """(x, y, w, h) bounding boxes of COCO RLEs (with counts strings), without decoding them."""
+    if len(rles) == 0:
+        return np.zeros((0, 4), dtype=np.float64)
+    return mask_util.toBbox(_to_bytes_rles(rles))
+
+
+def _to_bytes_rles(rles: List[Dict]) -> List[Dict]:
+    """COCO RLEs with their counts strings as bytes, as expected by pycocotools."""
+    return [
+        {
+            "size": rle["size"],
+            "counts": (
+                rle["counts"].encode("utf-8")
+                if isinstance(rle["counts"], str)
+                else rle["counts"]
+            ),
+        }
+        for rle in rles
+    ]
+
+
+def ann_to_rle(segm, im_info: Dict) -> Dict:
+    """
+    Convert annotation which can be polygons or uncompressed RLE to RLE.
+
+    Args:
+        segm: Segmentation data (polygon list or RLE dict)
+        im_info (dict): Image info containing 'height' and 'width'
+
+    Returns:
+        RLE encoded segmentation
+    """
+    h, w = im_info["height"], im_info["width"]
+
+    if isinstance(segm, list):
+        # Polygon - merge all parts into one mask RLE code
+        rles = mask_util.frPyObjects(segm, h, w)
+        rle = mask_util.merge(rles)
+    elif isinstance(segm["counts"], list):
+        # Uncompressed RLE
+        rle = mask_util.frPyObjects(segm, h, w)
+    else:
+        # Already RLE
+        rle = segm
+
+    return rle
@@ -0,0 +1,266 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
+
+"""
+Microbenchmarks of perflib kernels against the implementations they replace.
+
+python3 sam3/perflib/tests/benchmarks.py
+"""
+
+import argparse
+import time
+
+import numpy as np
+import torch
+
+
+def time_fn(fn, repeats):
+    """Best time (in ms) of `fn()` over `repeats` runs (after a warm-up run)."""
+    fn()
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return 1000.0 * best
+
+
+def make_blob_masks(batch_size, height, width, num_blobs, seed=0):
+    """Random boolean masks, each made of `num_blobs` random disks."""
+    generator = torch.Generator().manual_seed(seed)
+    ys = torch.arange(height).view(1, height, 1)
+    xs = torch.arange(width).view(1, 1, width)
+    max_radius = max(min(height, width) // 16, 2)
+    masks = torch.zeros(batch_size, height, width, dtype=torch.bool)
+    for _ in range(num_blobs):
+        cy = torch.randint(0, height, (batch_size, 1, 1), generator=generator)
+        cx = torch.randint(0, width, (batch_size, 1, 1), generator=generator)
+        r = torch.randint(1, max_radius, (batch_size, 1, 1), generator=generator)
+        masks |= (ys - cy) ** 2 + (xs - cx) ** 2 <= r**2
+    return masks
+
+
+def benchmark_connected_components(repeats):
+    from sam3.perflib.connected_components import (
+        connected_components_cpu,
+        connected_components_cpu_batched,
+    )
+
+    print("\nconnected components on CPU (B, H, W; ~blobs per mask)")
+    for batch_size, size, num_blobs in [(1, 256, 8), (8, 256, 64), (16, 1008, 128)]:
+        masks = make_blob_masks(batch_size, size, size, num_blobs).unsqueeze(1)
+        per_image_ms = time_fn(lambda: connected_components_cpu(masks), repeats)
+        batched_ms = time_fn(lambda: connected_components_cpu_batched(masks), repeats)
+        print(
+            f"  ({batch_size}, {size}, {size}; {num_blobs:3d})"
+            f"  skimage + per-component loop: {per_image_ms:8.2f} ms"
+            f"  batched scipy + bincount: {batched_ms:8.2f} ms"
+            f"  ({per_image_ms / batched_ms:.1f}x)"
+        )
+
+
+def benchmark_mask_iou(repeats):
+    from sam3.perflib.masks_ops import mask_iou, mask_iou_broadcast
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"\nmask IoU on {device} (detections x tracks, H x W)")
+    for num_dets, num_tracks, size in [(50, 20, 288), (200, 50, 288)]:
+        masks = make_blob_masks(num_dets + num_tracks, size, size, 4).to(device)
+        det_masks, trk_masks = masks[:num_dets], masks[num_dets:]
+
+        def run(fn):
+            fn(det_masks, trk_masks)
+            if device == "cuda":
+                torch.cuda.synchronize()
+
+        matmul_ms = time_fn(lambda: run(mask_iou), repeats)
+        try:
+            broadcast_ms = time_fn(lambda: run(mask_iou_broadcast), repeats)
+            broadcast_str = f"{broadcast_ms:8.2f} ms  ({broadcast_ms / matmul_ms:.1f}x)"
+        except RuntimeError:  # the (N, M, H*W) tensors don't fit in memory
+            broadcast_str = "out of memory"
+        print(
+            f"  ({num_dets:3d} x {num_tracks:2d}, {size} x {size})"
+            f"  chunked matmul: {matmul_ms:8.2f} ms"
+            f"  boolean broadcast: {broadcast_str}"
+        )
+
+
+def _associate_with_loops(ious, iou_threshold=0.5):
+    """The former host-side association over Python lists (for reference)."""
+    from scipy.optimize import linear_sum_assignment
+
+    iou_list = ious.tolist()
+    igeit_list = (ious >= iou_threshold).tolist()
+    row_ind, col_ind = linear_sum_assignment(1 - ious)
+    matched_trk = set()
+    for d, t in zip(row_ind, col_ind):
+        if iou_list[d][t] >= iou_threshold:
+            matched_trk.add(t)
+    unmatched_trk_indices = [t for t in range(len(ious[0])) if t not in matched_trk]
+    det_to_matched_trk = {}
+    for d in range(len(ious)):
+        for t in range(len(ious[0])):
+            if igeit_list[d][t]:
+                det_to_matched_trk.setdefault(d, []).append(t)
+    return unmatched_trk_indices, det_to_matched_trk
+
+
+def benchmark_associate_det_trk(repeats):
+    from sam3.perflib.associate_det_trk import associate_det_trk, match_det_trk
+    from sam3.perflib.masks_ops import mask_iou
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"\ndet-track association on {device} (objects, 128 x 128 masks)")
+    for num_objects in [10, 100, 500]:
+        # detections that overlap the tracks, plus as many new objects
+        trk_masks = make_blob_masks(num_objects, 128, 128, 2, seed=0).to(device)
+        new_masks = make_blob_masks(num_objects, 128, 128, 2, seed=1).to(device)
+        det_masks = torch.cat([trk_masks, new_masks])
+        det_scores = torch.rand(2 * num_objects, device=device)
+
+        def run(fn):
+            fn(det_masks, trk_masks, det_scores=det_scores)
+            if device == "cuda":
+                torch.cuda.synchronize()
+
+        iou_ms = time_fn(lambda: mask_iou(det_masks, trk_masks).cpu(), repeats)
+        match_ms = time_fn(lambda: run(match_det_trk), repeats)
+        associate_ms = time_fn(lambda: run(associate_det_trk), repeats)
+        ious = match_det_trk(det_masks, trk_masks).ious
+        loops_ms = time_fn(lambda: _associate_with_loops(ious), repeats)
+        print(
+            f"  ({num_objects:3d} tracks, {2 * num_objects:4d} detections)"
+            f"  mask_iou alone: {iou_ms:8.2f} ms"
+            f"  match_det_trk: {match_ms:8.2f} ms"
+            f"  associate_det_trk: {associate_ms:8.2f} ms"
+            f"  former host-side loops alone: {loops_ms:8.2f} ms"
+        )
+
+
+def _generic_nms_loop(ious, scores, iou_threshold):
+    """The former CPU greedy NMS, picking one box at a time (for reference)."""
+    ious_np, scores_np = ious.numpy(), scores.numpy()
+    order = scores_np.argsort()[::-1]
+    kept_inds = []
+    while order.size > 0:
+        i = order.item(0)
+        kept_inds.append(i)
+        inds = np.where(ious_np[i, order[1:]] <= iou_threshold)[0]
+        order = order[inds + 1]
+    return kept_inds
+
+
+def benchmark_nms(repeats):
+    from sam3.perflib.nms import box_iou_np, generic_nms_cpu
+    from sam3.train.nms_helper import process_frame_level_nms
+
+    print("\ngreedy NMS on CPU (boxes, IoU threshold 0.5)")
+    rng = np.random.default_rng(0)
+    for num_boxes in [100, 1000, 4000]:
+        boxes = rng.uniform(0, 1000, size=(num_boxes, 4)).astype(np.float32)
+        boxes[:, 2:] = boxes[:, :2] + rng.uniform(20, 200, size=(num_boxes, 2))
+        ious = torch.from_numpy(box_iou_np(boxes, boxes))
+        scores = torch.rand(num_boxes)
+        loop_ms = time_fn(lambda: _generic_nms_loop(ious, scores, 0.5), repeats)
+        blocked_ms = time_fn(lambda: generic_nms_cpu(ious, scores, 0.5), repeats)
+        print(
+            f"  ({num_boxes:4d})  one box at a time: {loop_ms:8.2f} ms"
+            f"  blocked matrix NMS: {blocked_ms:8.2f} ms"
+            f"  ({loop_ms / blocked_ms:.1f}x)"
+        )
+
+    print("\nframe-level NMS of eval predictions (videos x tracks x frames)")
+    for num_videos, num_tracks, num_frames in [(100, 20, 50), (10, 200, 100)]:
+        bboxes = rng.uniform(0, 100, size=(num_videos, num_tracks, num_frames, 4))
+        bboxes[..., 2:] = rng.uniform(5, 60, size=bboxes[..., 2:].shape)
+        video_groups = {
+            v: [
+                {"bboxes": bboxes[v, t].tolist(), "score": rng.uniform()}
+                for t in range(num_tracks)
+            ]
+            for v in range(num_videos)
+        }
+        nms_ms = time_fn(lambda: process_frame_level_nms(video_groups, 0.5), 1)
+        print(
+            f"  ({num_videos:3d} x {num_tracks:3d} x {num_frames:3d})"
+            f"  process_frame_level_nms: {nms_ms:8.2f} ms"
+        )
+
+
+def _rle_encode_per_mask(masks):
+    """The former encoding, delta-coding and converting each mask separately (for reference)."""
+    from pycocotools import mask as mask_util
+
+    flat_mask = masks.transpose(1, 2).reshape(masks.shape[0], -1)
+    differences = torch.ones(
+        masks.shape[0], flat_mask.shape[1] + 1, device=masks.device, dtype=torch.bool
+    )
+    differences[:, 1:-1] = flat_mask[:, :-1] != flat_mask[:, 1:]
+    differences[:, 0] = flat_mask[:, 0]
+    _, change_indices = torch.where(differences)
+    boundaries = torch.cumsum(differences.sum(-1), 0).cpu()
+    change_indices_clone = change_indices.clone()
+    for i in range(masks.shape[0]):
+        beg = 0 if i == 0 else boundaries[i - 1].item()
+        end = boundaries[i].item()
+        change_indices[beg + 1 : end] -= change_indices_clone[beg : end - 1]
+    change_indices = change_indices.tolist()
+    batch_rles = []
+    for i in range(masks.shape[0]):
+        beg = 0 if i == 0 else boundaries[i - 1].item()
+        end = boundaries[i].item()
+        h, w = masks.shape[1:]
+        rle = mask_util.frPyObjects(
+            {"counts": change_indices[beg:end], "size": [h, w]}, h, w
+        )
+        rle["counts"] = rle["counts"].decode("utf-8")
+        batch_rles.append(rle)
+    return batch_rles
+
+
+def benchmark_rle(repeats):
+    from sam3.perflib.rle import rle_decode, rle_encode, strings_to_counts
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"\nRLE encoding and decoding on {device} (masks, H x W)")
+    for num_masks, size in [(16, 1008), (200, 288), (1000, 64)]:
+        masks = make_blob_masks(num_masks, size, size, 4).to(device)
+        per_mask_ms = time_fn(lambda: _rle_encode_per_mask(masks), repeats)
+        batched_ms = time_fn(lambda: rle_encode(masks), repeats)
+        rles = rle_encode(masks)
+        strings = [rle["counts"] for rle in rles]
+        counts_ms = time_fn(lambda: strings_to_counts(strings), repeats)
+        decode_ms = time_fn(lambda: rle_decode(rles, device=device), repeats)
+        print(
+            f"  ({num_masks:4d}, {size:4d} x {size:4d})"
+            f"  per-mask encode: {per_mask_ms:8.2f} ms"
+            f"  batched encode: {batched_ms:8.2f} ms"
+            f"  ({per_mask_ms / batched_ms:.1f}x)"
+            f"  strings -> counts: {counts_ms:8.2f} ms"
+            f"  decode: {decode_ms:8.2f} ms"
+        )
+
+
+BENCHMARKS = {
+    "associate_det_trk": benchmark_associate_det_trk,
+    "connected_components": benchmark_connected_components,
+    "mask_iou": benchmark_mask_iou,
+    "nms": benchmark_nms,
+    "rle": benchmark_rle,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser("perflib microbenchmarks")
+    parser.add_argument(
+        "--benchmarks", nargs="+", default=list(BENCHMARKS), choices=list(BENCHMARKS)
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    torch.set_grad_enabled(False)
+    for name in args.benchmarks:
+        BENCHMARKS[name](args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -57,3 +57,228 @@ class TestMasksToBoxes:
             )
             masks = _create_masks(image, masks)
             masks_box_check(masks, expected)
+
+
+class TestConnectedComponents:
+    def test_cpu_batched_matches_per_image_labeling(self):
+        from sam3.perflib.connected_components import (
+            connected_components_cpu,
+            connected_components_cpu_batched,
+        )
+
+        generator = torch.Generator().manual_seed(0)
+        for shape in [(4, 1, 64, 48), (3, 32, 32), (1, 1, 16, 16)]:
+            masks = torch.rand(shape, generator=generator) > 0.55
+            masks[0] = False  # an image without any component
+            labels, counts = connected_components_cpu_batched(masks)
+            expected_labels, expected_counts = connected_components_cpu(masks)
+            assert labels.shape == counts.shape == masks.shape
+            torch.testing.assert_close(labels, expected_labels, check_dtype=False)
+            torch.testing.assert_close(counts, expected_counts, check_dtype=False)
+
+
+class TestMaskIoU:
+    def test_matmul_matches_broadcast(self):
+        from sam3.perflib.masks_ops import (
+            mask_intersection,
+            mask_iou,
+            mask_iou_broadcast,
+        )
+
+        generator = torch.Generator().manual_seed(0)
+        for num_masks1, num_masks2 in [(7, 5), (0, 3), (3, 0)]:
+            masks1 = torch.rand((num_masks1, 37, 29), generator=generator) > 0.5
+            masks2 = torch.rand((num_masks2, 37, 29), generator=generator) > 0.3
+            if num_masks1 > 0:
+                masks1[0] = False  # an empty mask
+            ious = mask_iou(masks1, masks2)
+            assert ious.shape == (num_masks1, num_masks2)
+            torch.testing.assert_close(ious, mask_iou_broadcast(masks1, masks2))
+            # chunking over pixels gives the same intersections
+            torch.testing.assert_close(
+                mask_intersection(masks1, masks2, max_chunk_pixels=100),
+                mask_intersection(masks1, masks2),
+            )
+
+
+class TestAssociateDetTrk:
+    def test_match_det_trk(self):
+        from sam3.perflib.associate_det_trk import match_det_trk
+        from sam3.perflib.masks_ops import mask_iou_broadcast
+
+        generator = torch.Generator().manual_seed(0)
+        trk_masks = torch.rand((6, 32, 32), generator=generator) > 0.5
+        trk_masks[-1] = False  # an empty track
+        det_masks = torch.cat([trk_masks[:3], trk_masks[:1], trk_masks[3:4] == 0])
+        match = match_det_trk(det_masks, trk_masks, det_scores=torch.rand(5))
+
+        ious = mask_iou_broadcast(det_masks, trk_masks).numpy()
+        np.testing.assert_allclose(match.ious, ious)
+        for d, matched_trk_inds in enumerate(match.det_to_matched_trk()):
+            np.testing.assert_array_equal(
+                matched_trk_inds, np.nonzero(ious[d] >= 0.5)[0]
+            )
+        np.testing.assert_array_equal(match.det_has_match, [1, 1, 1, 1, 0])
+        # two detections overlap track 0 but it's assigned to only one of them
+        np.testing.assert_array_equal(match.trk_is_matched, [1, 1, 1, 0, 0, 0])
+        np.testing.assert_array_equal(match.trk_is_nonempty, [1, 1, 1, 1, 1, 0])
+        assert match.det_scores.shape == (5,)
+
+
+class TestNMS:
+    @staticmethod
+    def _greedy_nms_loop(ious, scores, iou_threshold):
+        order = np.argsort(-scores, kind="stable")
+        keep = np.zeros(len(scores), dtype=bool)
+        for i in order:
+            keep[i] = not (ious[keep, i] > iou_threshold).any()
+        return keep
+
+    def test_batched_greedy_nms_matches_loop(self):
+        from sam3.perflib.nms import batched_greedy_nms_np, box_iou_np
+
+        rng = np.random.default_rng(0)
+        # more boxes than an NMS block, in groups with padding
+        boxes = rng.uniform(0, 100, size=(3, 300, 4)).astype(np.float32)
+        boxes[..., 2:] = boxes[..., :2] + rng.uniform(5, 40, size=(3, 300, 2))
+        scores = rng.uniform(size=(3, 300)).astype(np.float32)
+        valid = np.ones((3, 300), dtype=bool)
+        valid[1, 250:] = False
+        valid[2] = False
+        ious = box_iou_np(boxes, boxes)
+        keep = batched_greedy_nms_np(ious, scores, 0.3, valid=valid)
+        for g in range(3):
+            num_valid = valid[g].sum()
+            expected = self._greedy_nms_loop(
+                ious[g, :num_valid, :num_valid], scores[g, :num_valid], 0.3
+            )
+            np.testing.assert_array_equal(keep[g, :num_valid], expected)
+            assert not keep[g, num_valid:].any()
+
+    def test_track_box_iou(self):
+        from sam3.perflib.nms import box_iou_np, track_box_iou_np
+
+        rng = np.random.default_rng(0)
+        bboxes = rng.uniform(0, 50, size=(5, 7, 4))
+        bboxes[..., 2:] += bboxes[..., :2]
+        bboxes[rng.uniform(size=(5, 7)) < 0.3] = np.nan
+        bboxes[4] = np.nan  # a track without any box
+        ious = track_box_iou_np(bboxes)
+        for i in range(5):
+            for j in range(5):
+                both_valid = ~np.isnan(bboxes[i, :, 0] + bboxes[j, :, 0])
+                if i == j or not both_valid.any():
+                    assert ious[i, j] == 0
+                    continue
+                boxes_i, boxes_j = bboxes[i, both_valid], bboxes[j, both_valid]
+                frame_ious = np.diagonal(box_iou_np(boxes_i, boxes_j))
+                areas_i = np.prod(boxes_i[:, 2:] - boxes_i[:, :2], axis=1)
+                areas_j = np.prod(boxes_j[:, 2:] - boxes_j[:, :2], axis=1)
+                inter = frame_ious * (areas_i + areas_j) / (1 + frame_ious)
+                expected = inter.sum() / (areas_i + areas_j - inter).sum()
+                np.testing.assert_allclose(ious[i, j], expected, rtol=1e-4)
+
+
+class TestRLE:
+    def test_encode_decode_roundtrip(self):
+        from pycocotools import mask as mask_util
+        from sam3.perflib.rle import (
+            expand_run_lengths,
+            rle_area,
+            rle_decode,
+            rle_encode,
+            rle_to_bbox,
+            strings_to_counts,
+        )
+
+        generator = torch.Generator().manual_seed(0)
+        masks = torch.rand((6, 37, 29), generator=generator) > 0.6
+        masks[0] = False  # an empty mask
+        masks[1] = True  # a mask starting with foreground
+        rles = rle_encode(masks, return_areas=True)
+        for rle, mask in zip(rles, masks.numpy()):
+            expected = mask_util.encode(np.asfortranarray(mask.astype(np.uint8)))
+            assert rle["counts"] == expected["counts"].decode("utf-8")
+            assert rle["size"] == [37, 29]
+            assert rle["area"] == mask.sum()
+        torch.testing.assert_close(rle_decode(rles), masks)
+
+        counts = strings_to_counts([rle["counts"] for rle in rles])
+        for c, rle in zip(counts, rles):
+            assert c.sum() == 37 * 29
+            uncompressed = mask_util.frPyObjects(
+                {"counts": c, "size": [37, 29]}, 37, 29
+            )
+            assert uncompressed["counts"].decode("utf-8") == rle["counts"]
+        torch.testing.assert_close(expand_run_lengths(counts, 37, 29, "cpu"), masks)
+
+        np.testing.assert_array_equal(rle_area(rles), masks.sum(dim=(1, 2)).numpy())
+        boxes = rle_to_bbox(rles)
+        assert boxes.shape == (6, 4)
+        np.testing.assert_array_equal(boxes[1], [0, 0, 29, 37])
+
+
+class TestMaskStore:
+    @staticmethod
+    def _masks():
+        generator = torch.Generator().manual_seed(0)
+        # a size that isn't a multiple of 8 pixels, to exercise the bitpack padding
+        masks = torch.rand((4, 3, 19, 23), generator=generator) > 0.7
+        masks[0] = False  # an empty mask
+        masks[1] = True  # a mask starting with foreground
+        masks[2, :, :, 0] = True  # a mask ending with background
+        return masks
+
+    def test_codec_roundtrip(self):
+        from sam3.model.mask_store import (
+            bitpack_decode,
+            bitpack_encode,
+            rle_decode_mask,
+            rle_encode_mask,
+        )
+
+        for mask in self._masks():
+            packed = bitpack_encode(mask)
+            assert packed.dtype == torch.uint8
+            assert packed.numel() == (mask.numel() + 7) // 8
+            torch.testing.assert_close(bitpack_decode(packed, mask.shape), mask)
+
+            counts = rle_encode_mask(mask)
+            assert counts.dtype == torch.int32
+            assert counts.sum() == mask.numel()
+            torch.testing.assert_close(rle_decode_mask(counts, mask.shape), mask)
+
+    def test_store_roundtrip(self, monkeypatch):
+        from sam3.model.mask_store import FrameMaskStore, MASK_CODECS
+
+        masks = self._masks()
+        for codec in MASK_CODECS:
+            for offload in (None, "cpu", "disk"):
+                store = FrameMaskStore(codec=codec, offload=offload)
+                store[0] = {obj_id: mask for obj_id, mask in enumerate(masks)}
+                store[1] = {7: masks[3]}
+                del store[0][2]
+                assert sorted(store[0]) == [0, 1, 3]
+
+                num_loads = 0
+                torch_load = torch.load
+
+                def counting_load(*args, **kwargs):
+                    nonlocal num_loads
+                    num_loads += 1
+                    return torch_load(*args, **kwargs)
+
+                monkeypatch.setattr(torch, "load", counting_load)
+                for frame_idx, obj_ids in ((0, [0, 1, 3]), (1, [7]), (0, [0, 1, 3])):
+                    decoded = store[frame_idx].copy()
+                    assert sorted(decoded) == obj_ids
+                    for obj_id in obj_ids:
+                        expected = masks[3] if frame_idx == 1 else masks[obj_id]
+                        torch.testing.assert_close(decoded[obj_id], expected)
+                monkeypatch.setattr(torch, "load", torch_load)
+                # the file of a frame is loaded once for all its masks
+                assert num_loads == (2 if offload == "disk" else 0)
+
+                stats = store.get_memory_stats()
+                assert stats["num_frames"] == 2 and stats["num_masks"] == 4
+                assert stats["dense_bytes"] == 4 * masks[0].numel()
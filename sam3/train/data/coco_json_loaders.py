@@ -5,7 +5,7 @@ from collections import defaultdict
 from typing import Dict, List, Tuple
 
 import torch
-from pycocotools import mask as mask_util
+from sam3.perflib.rle import ann_to_rle
 
 
 # ============================================================================
@@ -67,33 +67,6 @@ def load_coco_and_group_by_image(json_path: str) -> Tuple[List[Dict], Dict[int,
     return grouped, cat_id_to_name
 
 
-def ann_to_rle(segm, im_info: Dict) -> Dict:
-    """
-    Convert annotation which can be polygons or uncompressed RLE to RLE.
-
-    Args:
-        segm: Segmentation data (polygon list or RLE dict)
-        im_info (dict): Image info containing 'height' and 'width'
-
-    Returns:
-        RLE encoded segmentation
-    """
-    h, w = im_info["height"], im_info["width"]
-
-    if isinstance(segm, list):
-        # Polygon - merge all parts into one mask RLE code
-        rles = mask_util.frPyObjects(segm, h, w)
-        rle = mask_util.merge(rles)
-    elif isinstance(segm["counts"], list):
-        # Uncompressed RLE
-        rle = mask_util.frPyObjects(segm, h, w)
-    else:
-        # Already RLE
-        rle = segm
-
-    return rle
-
-
 # ============================================================================
 # COCO Training API
 # ============================================================================
@@ -0,0 +1,195 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates. All Rights Reserved
+
+"""This script benchmarks the per-frame cost of decoding video frames for SAM 3"""
+
+"""
+Compares decoding frames at full resolution and then resizing them to the model
+input size against letting the decoder output reduced-resolution frames:
+- video files: OpenCV (`cap.read()` + `cv2.resize`) vs. the ffmpeg scale filter
+  (and TorchCodec with and without decoder-side resizing, if it is installed)
+- JPEG folders: full decode + `TF.resize` vs. JPEG DCT scaling with PIL `draft()`
+
+python3 scripts/benchmark_frame_decoding.py --resolutions 1080p 4k --num_frames 32
+
+Synthetic test videos are generated with ffmpeg unless `--video` / `--image_folder`
+are given.
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+import torch
+import torchvision.transforms.functional as TF
+
+from sam3.model.io_utils import (
+    _decode_img_as_uint8_tensor,
+    _decode_img_for_image_size,
+    _list_image_folder_frames,
+    load_video_frames_from_video_file_using_cv2,
+    load_video_frames_from_video_file_using_ffmpeg,
+)
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080), "4k": (3840, 2160)}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("SAM 3 frame decoding benchmark")
+    parser.add_argument(
+        "--resolutions",
+        nargs="+",
+        default=["1080p", "4k"],
+        choices=sorted(RESOLUTIONS),
+        help="resolutions of the generated test videos",
+    )
+    parser.add_argument("--num_frames", type=int, default=32)
+    parser.add_argument("--image_size", type=int, default=1008)
+    parser.add_argument("--video", default=None, help="benchmark this video file")
+    parser.add_argument(
+        "--image_folder", default=None, help="benchmark this folder of JPEG frames"
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    return parser.parse_args()
+
+
+def generate_inputs(out_dir, resolution, num_frames):
+    """Generate an H.264 video and a folder of JPEG frames with ffmpeg's test source."""
+    width, height = RESOLUTIONS[resolution]
+    source = f"testsrc2=size={width}x{height}:rate=24"
+    video_path = os.path.join(out_dir, f"{resolution}.mp4")
+    image_folder = os.path.join(out_dir, f"{resolution}_frames")
+    os.makedirs(image_folder, exist_ok=True)
+    common = ["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", source]
+    subprocess.run(
+        common
+        + ["-frames:v", str(num_frames), "-c:v", "libx264", "-pix_fmt", "yuv420p"]
+        + [video_path],
+        check=True,
+    )
+    subprocess.run(
+        common
+        + ["-frames:v", str(num_frames), "-q:v", "2", "-start_number", "0"]
+        + [os.path.join(image_folder, "%d.jpg")],
+        check=True,
+    )
+    return video_path, image_folder
+
+
+def time_per_frame(fn, num_frames, repeats):
+    """Best time per frame (in ms) of `fn` over `repeats` runs."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return 1000.0 * best / num_frames
+
+
+def benchmark_video(video_path, image_size, repeats):
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    kwargs = dict(
+        video_path=video_path,
+        image_size=image_size,
+        offload_video_to_cpu=True,
+    )
+    results = {
+        "OpenCV full-res decode + resize": time_per_frame(
+            lambda: load_video_frames_from_video_file_using_cv2(**kwargs),
+            num_frames,
+            repeats,
+        ),
+        "ffmpeg decode + scale filter": time_per_frame(
+            lambda: load_video_frames_from_video_file_using_ffmpeg(**kwargs),
+            num_frames,
+            repeats,
+        ),
+    }
+    try:
+        import torchcodec  # noqa: F401
+    except ImportError:
+        return results
+
+    from sam3.model.io_utils import TorchCodecDecoder
+
+    def _decode_torchcodec(output_size):
+        decoder = TorchCodecDecoder(video_path, output_size=output_size)
+        for idx in range(len(decoder)):
+            frame = decoder[idx].float()
+            if frame.shape[-2:] != (image_size, image_size):
+                frame = torch.nn.functional.interpolate(
+                    frame[None], size=(image_size, image_size), mode="bicubic"
+                )
+
+    results["TorchCodec full-res decode + resize"] = time_per_frame(
+        lambda: _decode_torchcodec(None), num_frames, repeats
+    )
+    results["TorchCodec decoder-side resize"] = time_per_frame(
+        lambda: _decode_torchcodec((image_size, image_size)), num_frames, repeats
+    )
+    return results
+
+
+def benchmark_image_folder(image_folder, image_size, repeats):
+    img_paths = _list_image_folder_frames(image_folder)
+
+    def _full_res_decode():
+        for img_path in img_paths:
+            img = _decode_img_as_uint8_tensor(img_path)
+            TF.resize(img, size=(image_size, image_size), antialias=True)
+
+    def _reduced_res_decode():
+        for img_path in img_paths:
+            img, _, _ = _decode_img_for_image_size(img_path, image_size)
+            TF.resize(img, size=(image_size, image_size), antialias=True)
+
+    return {
+        "JPEG full-res decode + resize": time_per_frame(
+            _full_res_decode, len(img_paths), repeats
+        ),
+        "JPEG DCT-scaled decode (PIL draft) + resize": time_per_frame(
+            _reduced_res_decode, len(img_paths), repeats
+        ),
+    }
+
+
+def print_results(title, results):
+    print(f"\n{title}")
+    for name, ms_per_frame in results.items():
+        print(f"  {name:<48s} {ms_per_frame:8.2f} ms/frame")
+
+
+def main():
+    args = parse_args()
+    torch.set_grad_enabled(False)
+    if args.video is not None or args.image_folder is not None:
+        if args.video is not None:
+            results = benchmark_video(args.video, args.image_size, args.repeats)
+            print_results(args.video, results)
+        if args.image_folder is not None:
+            results = benchmark_image_folder(
+                args.image_folder, args.image_size, args.repeats
+            )
+            print_results(args.image_folder, results)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for resolution in args.resolutions:
+            video_path, image_folder = generate_inputs(
+                tmp_dir, resolution, args.num_frames
+            )
+            results = benchmark_video(video_path, args.image_size, args.repeats)
+            results.update(
+                benchmark_image_folder(image_folder, args.image_size, args.repeats)
+            )
+            print_results(
+                f"{resolution} -> {args.image_size}x{args.image_size}", results
+            )
+
+
+if __name__ == "__main__":
+    main()